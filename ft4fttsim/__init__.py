@@ -3,3 +3,5 @@
 ft4fttsim is a simulator whose development is used to design FT4FTT.
 
 """
+
+__version__ = "0.1.0"
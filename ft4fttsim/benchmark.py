@@ -0,0 +1,561 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Benchmarks of the speed and memory use of simulations.
+
+The benchmark suite simulates a set of canonical scenarios, each for a range
+of topology sizes, and measures for each of them:
+
+    - the number of frames received per second of wall-clock time,
+    - the number of events processed per second of wall-clock time,
+    - the wall-clock time per second of simulated time, and
+    - the peak memory allocated while building and simulating the network
+      (measured with tracemalloc in a separate run, since tracing slows the
+      simulation down).
+
+The results are written as JSON, so that the results of different commits
+can be compared:
+
+    python -m ft4fttsim.benchmark --output before.json
+    ... change the code ...
+    python -m ft4fttsim.benchmark --output after.json --compare before.json
+
+or, from the root directory of the project, make benchmark (with
+BASELINE=before.json to compare).
+
+A scenario is a function that builds a network of a given size in an
+environment and returns the devices whose received messages are counted as
+frames. The scenarios of the suite are listed in SCENARIOS.
+
+The scenarios of PARALLEL_SCENARIOS are also simulated in parallel (see
+ft4fttsim.parallel) when the number of partitions is given, e.g.,
+--partitions 2 --partitions 4, to measure the speedup of the parallel
+simulation over a sequential simulation.
+
+"""
+
+import argparse
+from collections import namedtuple
+import functools
+import json
+import logging
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+import simpy
+
+import ft4fttsim.kernel as kernel
+import ft4fttsim.timebase as timebase
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.ft4ftt import FT4FTTSwitch, Master, RecordingSlave
+from ft4fttsim.networking import (
+    Link, Message, MessageRecordingDevice, MulticastGroup, NetworkDevice,
+    Switch)
+from ft4fttsim.parallel import ParallelSimulation
+
+
+# Environments in which the scenarios can be simulated.
+ENVIRONMENTS = {
+    "simpy": simpy.Environment,
+    "kernel": kernel.Environment,
+}
+
+
+# Size of the messages transmitted by the players of the scenarios.
+MESSAGE_SIZE_BYTES = 1000
+
+# Time between consecutive messages of a player, in microseconds. The
+# messages take about 83 us to transmit on the 100 Mbps links of the
+# scenarios.
+MESSAGE_PERIOD_US = 100
+
+
+# A benchmark scenario. build is a function called with an environment, a
+# size and the duration of the simulation (in the time base of the
+# environment) that builds the network and returns the devices whose
+# received messages are counted, sizes are the topology sizes of the scaling
+# curve and duration_us is the simulated time of each run.
+Scenario = namedtuple("Scenario", "build, sizes, duration_us")
+
+
+# Measurements of a scenario of a given size. wall_time_s is the wall-clock
+# time of the simulation, not counting the time to build the network
+# (build_time_s). peak_memory_bytes is None if memory was not measured.
+BenchmarkResult = namedtuple(
+    "BenchmarkResult",
+    "scenario, environment, size, simulated_time_us, "
+    "build_time_s, wall_time_s, num_events, num_frames, frames_per_s, "
+    "events_per_s, wall_time_per_simulated_s, peak_memory_bytes")
+
+
+# A parallel benchmark scenario. build is a function called with an
+# environment, a size and the duration of the simulation that builds the
+# network and returns a (devices, links) tuple of lists, as needed by
+# ParallelSimulation.
+ParallelScenario = namedtuple("ParallelScenario", "build, size, duration_us")
+
+
+# Measurements of a parallel scenario. The wall-clock times include building
+# the network, and in the parallel simulation starting the worker
+# processes. speedup is sequential_wall_time_s / parallel_wall_time_s and
+# num_windows the number of windows the workers were synchronized in.
+ParallelBenchmarkResult = namedtuple(
+    "ParallelBenchmarkResult",
+    "scenario, size, num_partitions, simulated_time_us, num_frames, "
+    "sequential_wall_time_s, parallel_wall_time_s, speedup, num_windows")
+
+
+def _transmit_periodically(env, player, destinations, duration):
+    """
+    Simpy process that makes player transmit a message every
+    MESSAGE_PERIOD_US microseconds until duration, to each of destinations in
+    turn.
+
+    """
+    period = timebase.get_time_base(env).from_us(MESSAGE_PERIOD_US)
+    num_messages = 0
+    while env.now < duration:
+        destination = destinations[num_messages % len(destinations)]
+        message = Message(env, player, destination, MESSAGE_SIZE_BYTES,
+                          "benchmark", num_messages)
+        player.start_process(
+            player.instruct_transmission(message, player.ports[0]))
+        num_messages += 1
+        yield env.timeout(period)
+
+
+def _build_fan_out(env, size, duration, destinations_of):
+    player = NetworkDevice(env, "player", 1)
+    switch = Switch(env, "switch", size + 1)
+    recorders = [MessageRecordingDevice(env, "recorder{}".format(i), 1)
+                 for i in range(size)]
+    Link(env, player.ports[0], switch.ports[0], 100, 1)
+    for i, recorder in enumerate(recorders):
+        Link(env, switch.ports[i + 1], recorder.ports[0], 100, 1)
+        switch.forwarding_table[recorder] = [switch.ports[i + 1]]
+    player.start_process(_transmit_periodically(
+        env, player, destinations_of(recorders), duration))
+    return recorders
+
+
+def _build_player_to_recorder(env, size, duration):
+    devices = []
+    links = []
+    for i in range(size):
+        player = NetworkDevice(env, "player{}".format(i), 1)
+        recorder = MessageRecordingDevice(env, "recorder{}".format(i), 1)
+        links.append(Link(env, player.ports[0], recorder.ports[0], 100, 1))
+        player.start_process(
+            _transmit_periodically(env, player, [recorder], duration))
+        devices.extend([player, recorder])
+    return devices, links
+
+
+def player_to_recorder(env, size, duration):
+    """
+    Scenario with size players, each connected to its own recorder.
+
+    """
+    devices, _ = _build_player_to_recorder(env, size, duration)
+    return devices[1::2]
+
+
+def switch_fan_out(env, size, duration):
+    """
+    Scenario with a player connected to a switch that is connected to size
+    recorders. The player transmits to each recorder in turn.
+
+    """
+    return _build_fan_out(env, size, duration, lambda recorders: recorders)
+
+
+def multicast(env, size, duration):
+    """
+    Scenario with a player connected to a switch that is connected to size
+    recorders. The player transmits every message to a multicast group of all
+    the recorders.
+
+    """
+    return _build_fan_out(
+        env, size, duration,
+        lambda recorders: [MulticastGroup("all recorders", recorders)])
+
+
+def _build_switch_chain(env, size, duration):
+    player = NetworkDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    switches = [Switch(env, "switch{}".format(i), 2) for i in range(size)]
+    links = [Link(env, player.ports[0], switches[0].ports[0], 100, 1)]
+    for switch, next_switch in zip(switches, switches[1:]):
+        links.append(Link(env, switch.ports[1], next_switch.ports[0], 100, 1))
+    links.append(Link(env, switches[-1].ports[1], recorder.ports[0], 100, 1))
+    for switch in switches:
+        switch.forwarding_table[recorder] = [switch.ports[1]]
+    player.start_process(
+        _transmit_periodically(env, player, [recorder], duration))
+    return [player, recorder] + switches, links
+
+
+def switch_chain(env, size, duration):
+    """
+    Scenario with a player connected to a recorder through a chain of size
+    switches.
+
+    """
+    devices, _ = _build_switch_chain(env, size, duration)
+    return [devices[1]]
+
+
+def ft4ftt_fan_out(env, size, duration):
+    """
+    Scenario with an FT4FTT switch with an embedded master that is connected
+    to size slaves. The master broadcasts two trigger messages per
+    elementary cycle of 1000 us.
+
+    """
+    slaves = [RecordingSlave(env, "slave{}".format(i)) for i in range(size)]
+    master = Master(env, "master", 1, slaves, 1000, num_tms_per_ec=2)
+    switch = FT4FTTSwitch(env, "FT4FTT switch", size, master)
+    for i, slave in enumerate(slaves):
+        Link(env, switch.ports[i], slave.ports[0], 100, 1)
+    return slaves
+
+
+# The scenarios of the benchmark suite.
+SCENARIOS = {
+    "player_to_recorder": Scenario(player_to_recorder, [1, 4, 16, 64],
+                                   10000),
+    "switch_fan_out": Scenario(switch_fan_out, [4, 16, 64, 256], 20000),
+    "switch_chain": Scenario(switch_chain, [1, 4, 16, 64], 20000),
+    "ft4ftt_fan_out": Scenario(ft4ftt_fan_out, [4, 16, 64, 256], 100000),
+    "multicast": Scenario(multicast, [4, 16, 64, 256], 10000),
+}
+
+
+# The scenarios simulated in parallel. In player_to_recorder no message
+# crosses partitions, and in switch_chain the messages cross them in one
+# direction only.
+PARALLEL_SCENARIOS = {
+    "player_to_recorder": ParallelScenario(_build_player_to_recorder, 64,
+                                           10000),
+    "switch_chain": ParallelScenario(_build_switch_chain, 64, 20000),
+}
+
+
+def _count_frames(recorders):
+    return sum(len(messages) for recorder in recorders
+               for messages in recorder.reception_records.values())
+
+
+def _simulate(scenario, environment, size, duration_us):
+    """
+    Build and simulate a scenario.
+
+    Returns:
+        A (build time, wall time, number of events, number of frames)
+        tuple.
+
+    """
+    start = time.perf_counter()
+    env = ENVIRONMENTS[environment]()
+    duration = timebase.get_time_base(env).from_us(duration_us)
+    recorders = scenario.build(env, size, duration)
+    build_time_s = time.perf_counter() - start
+    # The events processed are those scheduled minus those still pending,
+    # as counted by the event ids of simpy and of the kernel, and minus the
+    # event that stops the run.
+    first_event_id = next(env._eid)
+    num_pending = len(env._queue)
+    start = time.perf_counter()
+    env.run(until=duration)
+    wall_time_s = time.perf_counter() - start
+    num_scheduled = next(env._eid) - first_event_id - 1
+    num_events = num_scheduled - (len(env._queue) - num_pending) - 1
+    return build_time_s, wall_time_s, num_events, _count_frames(recorders)
+
+
+def run_benchmark(name, environment="simpy", size=None, duration_us=None,
+                  measure_memory=True):
+    """
+    Run one benchmark.
+
+    Arguments:
+        name: The name of a scenario of SCENARIOS.
+        environment: The name of an environment of ENVIRONMENTS.
+        size: The topology size, by default the largest size of the
+            scenario.
+        duration_us: The simulated time, by default the duration of the
+            scenario.
+        measure_memory: If True, the scenario is simulated a second time
+            with tracemalloc to measure its peak memory.
+
+    Returns:
+        A BenchmarkResult instance.
+
+    Raises:
+        FT4FTTSimException: If the scenario or the environment do not exist.
+
+    """
+    if name not in SCENARIOS:
+        raise FT4FTTSimException("Unknown scenario {}".format(name))
+    if environment not in ENVIRONMENTS:
+        raise FT4FTTSimException("Unknown environment {}".format(environment))
+    scenario = SCENARIOS[name]
+    if size is None:
+        size = scenario.sizes[-1]
+    if duration_us is None:
+        duration_us = scenario.duration_us
+    build_time_s, wall_time_s, num_events, num_frames = _simulate(
+        scenario, environment, size, duration_us)
+    peak_memory_bytes = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            _simulate(scenario, environment, size, duration_us)
+            peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    wall_time_s = max(wall_time_s, 1e-9)
+    return BenchmarkResult(
+        name, environment, size, duration_us, build_time_s,
+        wall_time_s, num_events, num_frames, num_frames / wall_time_s,
+        num_events / wall_time_s, wall_time_s / (duration_us * 1e-6),
+        peak_memory_bytes)
+
+
+def _build_parallel_scenario(name, size, duration_us, env):
+    duration = timebase.get_time_base(env).from_us(duration_us)
+    return PARALLEL_SCENARIOS[name].build(env, size, duration)
+
+
+def run_parallel_benchmark(name, num_partitions, size=None,
+                           duration_us=None):
+    """
+    Simulate a scenario sequentially and in parallel and compare the
+    wall-clock times.
+
+    Arguments:
+        name: The name of a scenario of PARALLEL_SCENARIOS.
+        num_partitions: The number of partitions of the parallel simulation.
+        size: The topology size, by default the size of the scenario.
+        duration_us: The simulated time, by default the duration of the
+            scenario.
+
+    Returns:
+        A ParallelBenchmarkResult instance.
+
+    Raises:
+        FT4FTTSimException: If the scenario does not exist or if the
+            parallel simulation does not receive the same number of frames
+            as the sequential one.
+
+    """
+    if name not in PARALLEL_SCENARIOS:
+        raise FT4FTTSimException("Unknown parallel scenario {}".format(name))
+    scenario = PARALLEL_SCENARIOS[name]
+    if size is None:
+        size = scenario.size
+    if duration_us is None:
+        duration_us = scenario.duration_us
+    # a module level function, so that the workers can unpickle it
+    build_network = functools.partial(
+        _build_parallel_scenario, name, size, duration_us)
+    until = timebase.MICROSECONDS.from_us(duration_us)
+
+    start = time.perf_counter()
+    env = simpy.Environment()
+    devices, _ = build_network(env)
+    env.run(until=until)
+    sequential_wall_time_s = time.perf_counter() - start
+    num_frames = _count_frames(
+        [device for device in devices if hasattr(device, "reception_records")])
+
+    start = time.perf_counter()
+    simulation = ParallelSimulation(build_network, num_partitions)
+    summaries = simulation.run(until)
+    parallel_wall_time_s = time.perf_counter() - start
+    num_parallel_frames = sum(
+        len(records) for summary in summaries.values() if summary is not None
+        for records in summary.values())
+    if num_parallel_frames != num_frames:
+        raise FT4FTTSimException(
+            "The parallel simulation of {} received {} frames instead of "
+            "{}.".format(name, num_parallel_frames, num_frames))
+    return ParallelBenchmarkResult(
+        name, size, num_partitions, duration_us, num_frames,
+        sequential_wall_time_s, parallel_wall_time_s,
+        sequential_wall_time_s / max(parallel_wall_time_s, 1e-9),
+        simulation.num_windows)
+
+
+def scaling_exponent(sizes, times):
+    """
+    Return the exponent k of the power law time = c * size ** k that best
+    fits the measurements, i.e., the slope of the least squares line through
+    the points in log-log scale.
+
+    >>> round(scaling_exponent([1, 10, 100], [2.0, 20.0, 200.0]), 6)
+    1.0
+
+    """
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(t, 1e-12)) for t in times]
+    mean_x = math.fsum(xs) / len(xs)
+    mean_y = math.fsum(ys) / len(ys)
+    variance = math.fsum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        return None
+    return math.fsum(
+        (x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+def run_suite(names=None, environments=("simpy",), sizes=None,
+              measure_memory=True, progress=None):
+    """
+    Run the scenarios of the benchmark suite for all their sizes.
+
+    Arguments:
+        names: The names of the scenarios to run, by default all of them.
+        environments: The names of the environments to run them in.
+        sizes: If given, the sizes to run every scenario with instead of the
+            sizes of the scenarios.
+        measure_memory: Whether to measure the peak memory.
+        progress: An optional function called with each BenchmarkResult.
+
+    Returns:
+        A dictionary that can be dumped as JSON, with the results under
+        "results" and, under "scaling", the scaling exponents of the wall
+        time per simulated second with respect to the size of each scenario
+        and environment (see scaling_exponent()).
+
+    """
+    if names is None:
+        names = sorted(SCENARIOS)
+    results = []
+    scaling = {}
+    for name in names:
+        for environment in environments:
+            curve = []
+            for size in sizes or SCENARIOS[name].sizes:
+                result = run_benchmark(name, environment, size,
+                                       measure_memory=measure_memory)
+                if progress is not None:
+                    progress(result)
+                results.append(result._asdict())
+                curve.append(result)
+            if len(curve) > 1:
+                scaling["{}/{}".format(name, environment)] = scaling_exponent(
+                    [result.size for result in curve],
+                    [result.wall_time_per_simulated_s for result in curve])
+    return {
+        "python": platform.python_version(),
+        "simpy": simpy.__version__,
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+        "scaling": scaling,
+    }
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Compare the results of two benchmark runs, as returned by run_suite().
+
+    Arguments:
+        baseline: The results to compare with.
+        current: The new results.
+        tolerance: The relative slowdown or memory increase that is not
+            considered a regression.
+
+    Returns:
+        A list of (scenario, environment, size, metric, baseline value,
+        current value) tuples, one for each regression.
+
+    """
+    def key(result):
+        return result["scenario"], result["environment"], result["size"]
+    baseline_results = dict(
+        (key(result), result) for result in baseline["results"])
+    regressions = []
+    for result in current["results"]:
+        old = baseline_results.get(key(result))
+        if old is None:
+            continue
+        if result["events_per_s"] < old["events_per_s"] * (1 - tolerance):
+            regressions.append(
+                key(result) + ("events_per_s", old["events_per_s"],
+                               result["events_per_s"]))
+        if (result["peak_memory_bytes"] is not None and
+                old["peak_memory_bytes"] is not None and
+                result["peak_memory_bytes"] >
+                old["peak_memory_bytes"] * (1 + tolerance)):
+            regressions.append(
+                key(result) + ("peak_memory_bytes", old["peak_memory_bytes"],
+                               result["peak_memory_bytes"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the speed and memory use of ft4fttsim.")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="file to write the JSON results to")
+    parser.add_argument("--scenario", action="append",
+                        choices=sorted(SCENARIOS),
+                        help="scenario to run (default: all)")
+    parser.add_argument("--environment", action="append",
+                        choices=sorted(ENVIRONMENTS),
+                        help="environment to run in (default: simpy)")
+    parser.add_argument("--size", action="append", type=int,
+                        help="topology size (default: those of the scenario)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="do not measure the peak memory")
+    parser.add_argument("--partitions", action="append", type=int,
+                        help="also simulate the parallel scenarios with "
+                        "this number of partitions")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="JSON results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown tolerated by --compare")
+    args = parser.parse_args(argv)
+    # The debug messages of the simulation would dominate the measurements.
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+
+    def progress(result):
+        print("{:>20} {:>6} {:>5}: {:>10.0f} events/s {:>10.0f} frames/s "
+              "{:>8.3f} s/simulated s".format(
+                  result.scenario, result.environment, result.size,
+                  result.events_per_s, result.frames_per_s,
+                  result.wall_time_per_simulated_s))
+    results = run_suite(args.scenario, args.environment or ["simpy"],
+                        args.size, not args.no_memory, progress)
+    if args.partitions:
+        results["parallel"] = []
+        for name in sorted(PARALLEL_SCENARIOS):
+            for num_partitions in args.partitions:
+                result = run_parallel_benchmark(name, num_partitions)
+                print("{:>20} {:>5} {:>2} partitions: {:>6.2f}x speedup "
+                      "({:.3f} s sequential, {:.3f} s parallel, {} "
+                      "windows)".format(
+                          result.scenario, result.size,
+                          result.num_partitions, result.speedup,
+                          result.sequential_wall_time_s,
+                          result.parallel_wall_time_s, result.num_windows))
+                results["parallel"].append(result._asdict())
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
+    if args.compare is None:
+        return 0
+    with open(args.compare) as baseline_file:
+        regressions = compare(json.load(baseline_file), results,
+                              args.tolerance)
+    for scenario, environment, size, metric, old, new in regressions:
+        print("Regression in {} ({}, size {}): {} went from {} to {}".format(
+            scenario, environment, size, metric, old, new))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+On-disk cache of simulation results keyed by the content of the scenario.
+
+The key of a result is the SHA-256 hash of a canonical representation of
+everything that determines it: the scenario function, its parameters (the
+topology, link parameters, SyncStreamConfigs, traffic, seed, etc.), the
+instant of time until which it is simulated and the version of ft4fttsim.
+Each result is pickled into its own file in the cache directory. When the
+cache grows beyond its maximum size, the least recently used results are
+evicted.
+
+"""
+
+from collections import namedtuple
+import hashlib
+import os
+import pickle
+import tempfile
+
+import ft4fttsim
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.simlogging import log
+
+
+_RESULT_SUFFIX = ".pickle"
+
+
+# Number of lookups that found a result, number of lookups that did not and
+# number of results evicted.
+CacheStats = namedtuple("CacheStats", "hits, misses, evictions")
+
+
+def canonical_repr(value):
+    """
+    Return a representation of value that does not depend on the order of
+    dictionary keys or set elements.
+
+    Raises:
+        FT4FTTSimException: If value contains an object whose representation
+            depends on its memory address.
+
+    >>> canonical_repr({"b": [1, 2.5], "a": {3, 1}})
+    "{'a': {1, 3}, 'b': [1, 2.5]}"
+    >>> canonical_repr(canonical_repr)
+    'ft4fttsim.cache.canonical_repr'
+
+    """
+    if isinstance(value, dict):
+        items = sorted((canonical_repr(key), canonical_repr(item))
+                       for key, item in value.items())
+        return "{" + ", ".join(
+            "{}: {}".format(key, item) for key, item in items) + "}"
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(
+            sorted(canonical_repr(element) for element in value)) + "}"
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        return "{}({})".format(type(value).__name__, ", ".join(
+            "{}={}".format(field, canonical_repr(item))
+            for field, item in zip(value._fields, value)))
+    if isinstance(value, (list, tuple)):
+        elements = ", ".join(canonical_repr(element) for element in value)
+        if isinstance(value, list):
+            return "[" + elements + "]"
+        return "(" + elements + ("," if len(value) == 1 else "") + ")"
+    if callable(value) and hasattr(value, "__qualname__"):
+        return "{}.{}".format(value.__module__, value.__qualname__)
+    representation = repr(value)
+    if " at 0x" in representation:
+        raise FT4FTTSimException(
+            "{} has no canonical representation.".format(representation))
+    return representation
+
+
+def content_key(spec):
+    """
+    Return the key of a result determined by spec and by the version of
+    ft4fttsim.
+
+    """
+    spec = {"spec": spec, "version": ft4fttsim.__version__}
+    return hashlib.sha256(
+        canonical_repr(spec).encode("utf-8")).hexdigest()
+
+
+def scenario_key(scenario, params, until):
+    """
+    Return the key of the result of simulating scenario with params until
+    the given instant of time.
+
+    """
+    return content_key(
+        {"scenario": scenario, "params": params, "until": until})
+
+
+class ResultCache(object):
+    """
+    Content-addressed cache of picklable results stored in a directory.
+
+    """
+
+    def __init__(self, directory, max_size_bytes=None):
+        """
+        Create a new instance of class ResultCache.
+
+        Arguments:
+            directory: The directory where results are stored. It is created
+                if it does not exist.
+            max_size_bytes: The maximum total size of the stored results.
+                None means no maximum.
+
+        """
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def stats(self):
+        return CacheStats(self.hits, self.misses, self.evictions)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _RESULT_SUFFIX)
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key, default=None):
+        """
+        Return the result stored with key, or default if there is none.
+
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as result_file:
+                value = pickle.load(result_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return default
+        # The modification time records when the result was last used.
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Store value with key and evict results if the cache is too large.
+
+        """
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as result_file:
+            pickle.dump(value, result_file, pickle.HIGHEST_PROTOCOL)
+        # Replacing the file atomically ensures that an interrupted sweep
+        # never leaves a truncated result behind.
+        os.replace(temporary_path, self._path(key))
+        self.evict(keep=key)
+
+    def _entries(self):
+        """
+        Return a list of (last use time, size, path) tuples of the results.
+
+        """
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(_RESULT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, file_name)
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+        return entries
+
+    def size_bytes(self):
+        """
+        Return the total size of the stored results.
+
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used results until the cache is not too large.
+
+        Arguments:
+            keep: The key of a result that is never evicted.
+
+        """
+        if self.max_size_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+        keep_path = None if keep is None else self._path(keep)
+        for _, size, path in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            self.evictions += 1
+            log.debug("evicted %s from result cache", path)
+
+    def clear(self):
+        """
+        Remove all the stored results.
+
+        """
+        for _, _, path in self._entries():
+            os.remove(path)
@@ -0,0 +1,164 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Checkpoints of simulated networks, to warm-start and fork simulations.
+
+A checkpoint captures the dynamic state of a network at an instant of time:
+the messages in the queues of the ports, the frames in flight on the links,
+the elementary cycles of FTT masters and slaves, the receptions recorded so
+far, etc. It is picklable, so it can be saved to disk, and it can be restored
+into a newly built copy of the network in a fresh environment whose
+simulated time starts at the time of the checkpoint. A warmed-up network can
+thus be forked into many what-if variants without repeating the warm-up for
+each of them:
+
+    env = simpy.Environment()
+    devices, links = build_network(env)
+    env.run(until=warm_up_time)
+    checkpoint = take_checkpoint(env, devices, links)
+    for variant in variants:
+        env = simpy.Environment(initial_time=checkpoint.time)
+        devices, links = build_network(env)
+        variant(devices)
+        restore_checkpoint(checkpoint, env, devices, links)
+        env.run(until=end_time)
+
+The network is described by a function that builds it, as for
+ft4fttsim.parallel.ParallelSimulation, and network devices are matched by
+their names. Each kind of network device saves and restores its own state
+through its get_state() and set_state() methods (see NetworkDevice). Static
+configuration, e.g., forwarding tables or the transmission commands of
+playback devices, is not part of a checkpoint: it is rebuilt by the function
+that builds the network.
+
+The events of the links are rescheduled in their original order, and the
+processes of network devices, e.g., of playback devices and masters, are
+restarted and resume waiting from the time of the checkpoint, so that a
+restored simulation continues like the original one.
+
+"""
+
+from collections import namedtuple
+import heapq
+import pickle
+
+from ft4fttsim.exceptions import FT4FTTSimException
+import ft4fttsim.timebase as timebase
+
+
+class Checkpoint(namedtuple(
+        "Checkpoint", "time, ticks_per_us, devices, sublinks")):
+    """
+    The state of a network at an instant of time.
+
+    time is the instant of time of the checkpoint and ticks_per_us the time
+    base of its environment (see ft4fttsim.timebase). devices is a
+    dictionary whose keys are the names of the network devices and whose
+    values are their states, and sublinks a dictionary whose keys are the
+    names of the directional sublinks of the links (e.g.,
+    "player-port0->switch-port0") and whose values are their states.
+
+    """
+
+    def save(self, path):
+        """
+        Save the checkpoint to a file.
+
+        """
+        with open(path, "wb") as checkpoint_file:
+            pickle.dump(self, checkpoint_file, pickle.HIGHEST_PROTOCOL)
+
+
+def load_checkpoint(path):
+    """
+    Load a checkpoint saved with Checkpoint.save().
+
+    """
+    with open(path, "rb") as checkpoint_file:
+        return pickle.load(checkpoint_file)
+
+
+def _sublinks(links):
+    return dict((str(sublink), sublink)
+                for link in links for sublink in link.sublink)
+
+
+def take_checkpoint(env, devices, links):
+    """
+    Return a checkpoint of a network.
+
+    The checkpoint has to be taken between two calls to env.run() (or
+    env.step()), i.e., not from within a process or a callback, so that the
+    effects of the events processed so far are complete.
+
+    Arguments:
+        env: The environment in which the network is simulated.
+        devices: All the network devices of the network.
+        links: All the links of the network.
+
+    Returns:
+        A Checkpoint instance.
+
+    """
+    queue_keys = dict(
+        (event, (time, priority, event_id))
+        for time, priority, event_id, event in env._queue)
+    return Checkpoint(
+        env.now,
+        timebase.get_time_base(env).ticks_per_us,
+        dict((device.name, device.get_state()) for device in devices),
+        dict((name, sublink.get_state(queue_keys))
+             for name, sublink in _sublinks(links).items()))
+
+
+def restore_checkpoint(checkpoint, env, devices, links):
+    """
+    Restore a checkpoint into a newly built network.
+
+    Arguments:
+        checkpoint: A Checkpoint instance.
+        env: A fresh environment whose current time is the time of the
+            checkpoint, with the time base the checkpoint was taken with.
+        devices: All the network devices of the network, built in env by the
+            same function as the network of the checkpoint.
+        links: All the links of the network.
+
+    Raises:
+        FT4FTTSimException: If env or the network do not match the
+            checkpoint.
+
+    """
+    if env.now != checkpoint.time:
+        raise FT4FTTSimException(
+            "The environment starts at {} instead of at the time of the "
+            "checkpoint ({})".format(env.now, checkpoint.time))
+    if timebase.get_time_base(env).ticks_per_us != checkpoint.ticks_per_us:
+        raise FT4FTTSimException(
+            "The environment does not have the time base of the checkpoint")
+    devices_by_name = dict((device.name, device) for device in devices)
+    sublinks = _sublinks(links)
+    if (set(devices_by_name) != set(checkpoint.devices) or
+            set(sublinks) != set(checkpoint.sublinks)):
+        raise FT4FTTSimException(
+            "The network does not match the network of the checkpoint")
+    # events to schedule, as (key, event, value) tuples
+    pending = []
+
+    def schedule(key, callback, value=None):
+        event = env.event()
+        event.callbacks.append(callback)
+        pending.append((key, event, value))
+        return event
+
+    # The links are restored first, so that busy sublinks do not take the
+    # messages restored into the output queues of the devices.
+    for name, sublink in sublinks.items():
+        sublink.set_state(checkpoint.sublinks[name], devices_by_name, schedule)
+    for name, device in devices_by_name.items():
+        device.set_state(checkpoint.devices[name], devices_by_name)
+    pending.sort(key=lambda item: item[0])
+    for (time, priority, _), event, value in pending:
+        event._ok = True
+        event._value = value
+        # scheduled at exactly the original time, like
+        # ft4fttsim.parallel._PartitionEnvironment.timeout_at()
+        heapq.heappush(env._queue, (time, priority, next(env._eid), event))
@@ -0,0 +1,312 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Fluid model of background traffic.
+
+Simulating best-effort background load frame by frame costs as many events
+as frames, even if the individual background frames are never looked at. A
+FluidModel instead describes background flows by their rates: each flow is
+routed through the network once, following the forwarding tables of the
+switches, and adds its rate to the load of the links it crosses. Only the
+foreground messages, e.g., trigger messages and synchronous messages, are
+simulated as discrete messages:
+
+    fluid = FluidModel(env, devices, links)
+    fluid.add_flow("backup", server, storage, megabits_per_second=30)
+    ...
+    fluid.set_rate("backup", 60)
+
+Before the transmission of a foreground message starts on a loaded link, the
+message waits for the background frames ahead of it. The wait is the mean
+waiting time of an M/G/1 queue (Pollaczek-Khinchine formula) whose arrivals
+are the frames of the background flows of the link, which are assumed to be
+Poisson processes of frames of fixed sizes. With a single flow this is the
+waiting time of an M/D/1 queue:
+
+    W = rho * S / (2 * (1 - rho))
+
+where rho is the utilization of the link by the flow and S the transmission
+time of one of its frames. The rates of the flows may be changed at any time
+during the simulation, and messages transmitted afterwards wait according to
+the new rates.
+
+"""
+
+from collections import namedtuple
+
+import ft4fttsim.ethernet as ethernet
+import ft4fttsim.timebase as timebase
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import find_output_ports
+
+
+# A background flow. source_ports is the tuple of the ports of source
+# through which the flow leaves it and sublinks the tuple of the
+# directional sublinks the flow crosses (see ft4fttsim.networking.Link).
+FluidFlow = namedtuple(
+    "FluidFlow",
+    "name, source, source_ports, destination, megabits_per_second, "
+    "frame_size_bytes, sublinks")
+
+
+# Bytes that a frame occupies on a link besides the frame itself.
+_OVERHEAD_BYTES = (ethernet.PREAMBLE_SIZE_BYTES + ethernet.SFD_SIZE_BYTES +
+                   ethernet.IFG_SIZE_BYTES)
+
+
+class FluidModel(object):
+    """
+    Background flows of a network and the load they put on its links.
+
+    """
+
+    def __init__(self, env, devices, links):
+        """
+        Arguments:
+            env: The simpy.Environment instance of the network.
+            devices: All the network devices of the network.
+            links: All the links of the network.
+
+        """
+        self.env = env
+        self.time_base = timebase.get_time_base(env)
+        self._device_of_port = dict(
+            (port, device) for device in devices for port in device.ports)
+        self._sublink_of_port = dict(
+            (sublink.transmitter_port, sublink)
+            for link in links for sublink in link.sublink)
+        # Dictionary whose keys are the names of the flows and whose values
+        # are FluidFlow instances.
+        self.flows = {}
+        # Dictionary whose keys are sublinks and whose values are
+        # (utilization, arrival rate * second moment of the service time)
+        # tuples of the background traffic on the sublinks, in microseconds.
+        self._moments = {}
+
+    @staticmethod
+    def _source_ports(source, source_ports):
+        """
+        Return a tuple of the ports through which a flow leaves source.
+
+        Raises:
+            FT4FTTSimException: If source_ports is None and source does not
+                have exactly one connected port, or if a port of
+                source_ports does not belong to source.
+
+        """
+        if source_ports is None:
+            if len(source.connected_ports) != 1:
+                raise FT4FTTSimException(
+                    "{} has {} connected ports, the source ports of the flow "
+                    "must be given.".format(
+                        source, len(source.connected_ports)))
+            return tuple(source.connected_ports)
+        if not hasattr(source_ports, "__iter__"):
+            source_ports = [source_ports]
+        for port in source_ports:
+            if port not in source.ports:
+                raise FT4FTTSimException(
+                    "{} is not a port of {}".format(port, source))
+        return tuple(source_ports)
+
+    def route(self, source, destination, source_ports=None):
+        """
+        Return the sublinks through which messages from source reach
+        destination, following the forwarding tables of the switches.
+
+        Arguments:
+            source: The network device where the flow starts.
+            destination: A network device, a multicast group or a list of
+                network devices.
+            source_ports: The port or the list of ports of source through
+                which the messages leave it. Only needed if source has more
+                than one connected port.
+
+        Returns:
+            A tuple of sublinks.
+
+        Raises:
+            FT4FTTSimException: If source_ports is not given and source does
+                not have exactly one connected port, or if source_ports are
+                not ports of source.
+
+        """
+        if hasattr(destination, "__iter__"):
+            destinations = set(destination)
+        else:
+            destinations = {destination}
+        sublinks = []
+        visited = set()
+        to_visit = [self._sublink_of_port[port]
+                    for port in self._source_ports(source, source_ports)
+                    if port in self._sublink_of_port]
+        while to_visit:
+            sublink = to_visit.pop()
+            if sublink in visited:
+                continue
+            visited.add(sublink)
+            sublinks.append(sublink)
+            device = self._device_of_port[sublink.receiver_port]
+            forwarding_table = getattr(device, "forwarding_table", None)
+            if device in destinations or forwarding_table is None:
+                continue
+            output_ports = find_output_ports(
+                forwarding_table, destination,
+                getattr(device, "external_ports", device.ports))
+            output_ports.discard(sublink.receiver_port)
+            to_visit.extend(self._sublink_of_port[port]
+                            for port in output_ports
+                            if port in self._sublink_of_port)
+        return tuple(sublinks)
+
+    def add_flow(self, name, source, destination, megabits_per_second,
+                 frame_size_bytes=ethernet.MAX_FRAME_SIZE_BYTES,
+                 source_ports=None):
+        """
+        Add a background flow from source to destination.
+
+        Arguments:
+            name: A string used to identify the flow.
+            source: The network device where the flow starts.
+            destination: A network device, a multicast group or a list of
+                network devices.
+            megabits_per_second: The rate of the flow, counting the bytes of
+                its frames.
+            frame_size_bytes: The size of the frames of the flow.
+            source_ports: The port or the list of ports of source through
+                which the flow leaves it (see route()). The full rate of the
+                flow is charged on each of them.
+
+        Returns:
+            The new FluidFlow instance.
+
+        Raises:
+            FT4FTTSimException: If there is already a flow with the same
+                name, if the source ports are missing or invalid (see
+                route()), or if the flow overloads a link.
+
+        """
+        if name in self.flows:
+            raise FT4FTTSimException("Duplicate flow name {}".format(name))
+        if not (ethernet.MIN_FRAME_SIZE_BYTES <= frame_size_bytes <=
+                ethernet.MAX_FRAME_SIZE_BYTES):
+            raise FT4FTTSimException(
+                "Invalid frame size {}".format(frame_size_bytes))
+        source_ports = self._source_ports(source, source_ports)
+        flow = FluidFlow(name, source, source_ports, destination, 0,
+                         frame_size_bytes,
+                         self.route(source, destination, source_ports))
+        self.flows[name] = flow
+        for sublink in flow.sublinks:
+            sublink.background_wait = self.waiting_time
+        try:
+            self.set_rate(name, megabits_per_second)
+        except FT4FTTSimException:
+            del self.flows[name]
+            self._release_sublinks(flow)
+            raise
+        return self.flows[name]
+
+    def set_rate(self, name, megabits_per_second):
+        """
+        Change the rate of a flow.
+
+        Raises:
+            FT4FTTSimException: If the new rate overloads a link. The rate of
+                the flow is not changed then.
+
+        """
+        if megabits_per_second < 0:
+            raise FT4FTTSimException("Flow rates cannot be negative.")
+        flow = self.flows[name]
+        flows = dict(self.flows)
+        flows[name] = flow._replace(megabits_per_second=megabits_per_second)
+        new_moments = {}
+        for sublink in flow.sublinks:
+            # The moments are summed over all the flows of the sublink rather
+            # than updated, so that they do not accumulate rounding errors.
+            utilization = second_moment = 0.0
+            for other in flows.values():
+                if sublink in other.sublinks:
+                    moments = self._flow_moments(
+                        sublink, other.frame_size_bytes,
+                        other.megabits_per_second)
+                    utilization += moments[0]
+                    second_moment += moments[1]
+            if utilization >= 1:
+                raise FT4FTTSimException(
+                    "Flow {} overloads {}".format(name, sublink))
+            new_moments[sublink] = (utilization, second_moment)
+        self._moments.update(new_moments)
+        self.flows = flows
+
+    def remove_flow(self, name):
+        """
+        Remove a flow from the network.
+
+        """
+        self.set_rate(name, 0)
+        flow = self.flows.pop(name)
+        self._release_sublinks(flow)
+
+    def _release_sublinks(self, flow):
+        """
+        Stop delaying the messages of the sublinks of flow that no other flow
+        crosses.
+
+        """
+        for sublink in flow.sublinks:
+            if any(sublink in other.sublinks
+                   for other in self.flows.values()):
+                continue
+            self._moments.pop(sublink, None)
+            if sublink.background_wait == self.waiting_time:
+                sublink.background_wait = None
+
+    @staticmethod
+    def _flow_moments(sublink, frame_size_bytes, megabits_per_second):
+        """
+        Return the utilization of sublink by a flow and the product of the
+        arrival rate of its frames and the second moment of their
+        transmission times, in microseconds.
+
+        """
+        link_mbps = sublink.link.megabits_per_second
+        # frames per microsecond
+        arrival_rate = megabits_per_second / (8.0 * frame_size_bytes)
+        service_time_us = (
+            (frame_size_bytes + _OVERHEAD_BYTES) * 8.0 / link_mbps)
+        return (arrival_rate * service_time_us,
+                arrival_rate * service_time_us ** 2)
+
+    def utilization(self, sublink):
+        """
+        Return the fraction of the capacity of sublink used by background
+        traffic.
+
+        """
+        return self._moments.get(sublink, (0.0, 0.0))[0]
+
+    def waiting_time_us(self, sublink):
+        """
+        Return the mean time in microseconds that a message waits for the
+        background traffic of sublink.
+
+        """
+        utilization, second_moment = self._moments.get(sublink, (0.0, 0.0))
+        if utilization <= 0:
+            return 0.0
+        return second_moment / (2 * (1 - utilization))
+
+    def waiting_time(self, sublink, message):
+        """
+        Return the time message waits for the background traffic of sublink,
+        in units of the time base of the environment.
+
+        This method is meant to be used as the background_wait function of
+        sublinks.
+
+        """
+        waiting_time_us = self.waiting_time_us(sublink)
+        if not self.time_base.is_integer:
+            return waiting_time_us
+        return int(round(waiting_time_us * self.time_base.ticks_per_us))
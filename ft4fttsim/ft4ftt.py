@@ -1,11 +1,15 @@
 # author: David Gessner <davidges@gmail.com>
 
-from collections import namedtuple
+from collections import namedtuple, Counter
+from types import MappingProxyType
 
 from ft4fttsim.simlogging import log
 from ft4fttsim.networking import NetworkDevice, Port, Link, Message
+from ft4fttsim.networking import MessageRecordingDevice
+from ft4fttsim.networking import find_output_ports
 from ft4fttsim.exceptions import FT4FTTSimException
 import ft4fttsim.ethernet as ethernet
+import ft4fttsim.timebase as timebase
 
 
 class MessageType(object):
@@ -30,16 +34,180 @@ class MessageType(object):
     """
     TRIGGER_MESSAGE = "TM"
     UPDATE_REQUEST = "Update Req."
+    # The data of a synchronous message is the identifier of its synchronous
+    # stream.
+    SYNCHRONOUS_MESSAGE = "Sync."
+
+
+class TMContent(object):
+    """
+    Class used as an enumeration type for the ways in which the schedule of an
+    elementary cycle can be distributed among its trigger messages.
+
+    """
+    # Each trigger message carries a copy of the whole schedule.
+    REDUNDANT = "redundant"
+    # Each trigger message carries a different slice of the schedule.
+    SPLIT = "split"
+
+
+# Size in bytes of the FTT header of a trigger message, which carries the EC
+# number, the index of the trigger message within the EC, the number of
+# trigger messages of the EC and whether they are redundant copies.
+TM_HEADER_SIZE_BYTES = 8
+# Size in bytes of each schedule entry of a trigger message, i.e., of the
+# identifier of a scheduled synchronous stream.
+TM_ENTRY_SIZE_BYTES = 4
+# Maximum number of schedule entries that fit into a trigger message
+MAX_TM_ENTRIES = (
+    (ethernet.MAX_PAYLOAD_SIZE_BYTES - TM_HEADER_SIZE_BYTES) //
+    TM_ENTRY_SIZE_BYTES)
+
+
+# Data carried by a trigger message. The stream_ids parameter is a tuple of
+# the identifiers of the synchronous streams in the slice of the schedule
+# carried by the trigger message.
+TriggerMessageData = namedtuple(
+    'TriggerMessageData',
+    'ec_number, tm_index, num_tms, redundant, stream_ids'
+)
+
+
+def trigger_message_size_bytes(tm_data):
+    """
+    Return the size in bytes of a trigger message carrying tm_data.
+
+    Example:
+
+    >>> trigger_message_size_bytes(
+    ...     TriggerMessageData(1, 0, 1, True, stream_ids=()))
+    64
+    >>> trigger_message_size_bytes(
+    ...     TriggerMessageData(1, 0, 1, True, stream_ids=tuple(range(100))))
+    426
+
+    """
+    payload_size_bytes = (TM_HEADER_SIZE_BYTES +
+                          len(tm_data.stream_ids) * TM_ENTRY_SIZE_BYTES)
+    return (2 * ethernet.MAC_ADDRESS_SIZE_BYTES +
+            ethernet.ETHERTYPE_SIZE_BYTES +
+            max(payload_size_bytes, ethernet.MIN_PAYLOAD_SIZE_BYTES) +
+            ethernet.FCS_SIZE_BYTES)
+
+
+class PolicingViolation(object):
+    """
+    Class used as an enumeration type for the violations detected by the
+    traffic policing of FT4FTT switches.
+
+    """
+    # synchronous message of a stream not scheduled in the current EC
+    UNSCHEDULED = "unscheduled"
+    # synchronous message larger than allowed for its stream
+    OVERSIZED = "oversized"
 
 
 SyncStreamConfig = namedtuple(
     'SyncStreamConfig',
-    # The SyncStreamConfig parameters are expressed as integer multiples of the
-    # Elementary Cycle duration.
-    'transmission_time_ecs, deadline_ecs, period_ecs, offset_ecs'
+    # The SyncStreamConfig parameters except max_size_bytes are expressed as
+    # integer multiples of the Elementary Cycle duration. The max_size_bytes
+    # parameter is the size in bytes of the largest message the stream may
+    # transmit.
+    'transmission_time_ecs, deadline_ecs, period_ecs, offset_ecs, '
+    'max_size_bytes'
+)
+SyncStreamConfig.__new__.__defaults__ = (ethernet.MAX_FRAME_SIZE_BYTES,)
+
+
+# Number of update requests applied and rejected at the start of an EC.
+UpdateCounts = namedtuple('UpdateCounts', 'applied, rejected')
+
+
+ECLayout = namedtuple(
+    'ECLayout',
+    # The ECLayout parameters are expressed in microseconds. The windows
+    # follow each other in the listed order starting at the beginning of the
+    # Elementary Cycle. Any time left after the asynchronous window until the
+    # end of the Elementary Cycle is idle.
+    'tm_window_us, sync_window_us, async_window_us'
 )
 
 
+def _window_offsets(ec_layout, message):
+    """
+    Return the window of the elementary cycle in which message may be
+    transmitted.
+
+    Returns:
+        A (start, end) tuple with the offsets of the window relative to the
+        start of the elementary cycle, in the units of ec_layout, or None if
+        message is a trigger message. Trigger messages define the elementary
+        cycle and are therefore never held back.
+
+    """
+    if message.message_type == MessageType.TRIGGER_MESSAGE:
+        return None
+    sync_window_start = ec_layout.tm_window_us
+    async_window_start = sync_window_start + ec_layout.sync_window_us
+    if message.message_type == MessageType.SYNCHRONOUS_MESSAGE:
+        return (sync_window_start, async_window_start)
+    return (async_window_start,
+            async_window_start + ec_layout.async_window_us)
+
+
+def _ec_layout_in_time_base(ec_layout, time_base):
+    """
+    Return ec_layout with its windows converted from microseconds to the
+    given ft4fttsim.timebase.TimeBase, or None if ec_layout is None.
+
+    """
+    if ec_layout is None:
+        return None
+    return ECLayout(*[time_base.from_us(window) for window in ec_layout])
+
+
+def _window_hold_time(
+        ec_layout, ec_duration, ec_start_time, now, message, link):
+    """
+    Return how long message has to be held back before its transmission on
+    link can start without crossing a window boundary.
+
+    Arguments:
+        ec_layout: The ECLayout instance of the elementary cycles, with its
+            windows expressed in the time base of the environment.
+        ec_duration: Duration of the elementary cycles in the time base of
+            the environment.
+        ec_start_time: Instant of time when the current elementary cycle
+            started.
+        now: The current instant of time.
+        message: The message to be transmitted.
+        link: The link on which the message is to be transmitted.
+
+    Returns:
+        The time to hold back message, or None if message does not fit into
+        its window and can therefore never be transmitted.
+
+    """
+    window = _window_offsets(ec_layout, message)
+    if window is None:
+        return 0
+    window_start, window_end = window
+    bytes_to_transmit = (ethernet.PREAMBLE_SIZE_BYTES +
+                         ethernet.SFD_SIZE_BYTES +
+                         message.size_bytes)
+    transmission_time = link.transmission_time(bytes_to_transmit)
+    if transmission_time > window_end - window_start:
+        return None
+    ecs_elapsed = (now - ec_start_time) // ec_duration
+    current_ec_start = ec_start_time + ecs_elapsed * ec_duration
+    # The message either fits into the rest of the window of the current
+    # elementary cycle, or it has to wait for the window of the next one.
+    for ec_start in (current_ec_start, current_ec_start + ec_duration):
+        transmission_start = max(now, ec_start + window_start)
+        if transmission_start + transmission_time <= ec_start + window_end:
+            return transmission_start - now
+
+
 class Master(NetworkDevice):
     """
     Class for FTT masters.
@@ -48,7 +216,8 @@ class Master(NetworkDevice):
 
     def __init__(
             self, env, name, num_ports, slaves, ec_duration_us,
-            num_tms_per_ec=1, sync_requirements=None):
+            num_tms_per_ec=1, sync_requirements=None, ec_layout=None,
+            tm_content=TMContent.REDUNDANT):
         """
         Constructor for FTT masters.
 
@@ -65,27 +234,131 @@ class Master(NetworkDevice):
             sync_requirements: A dictionary whose keys identify synchronous
                 stream configurations (i.e., instances of SyncStreamConfig) and
                 whose values are synchronous streams.
+            ec_layout: An ECLayout instance with the windows of the elementary
+                cycles, or None if the windows should not be enforced.
+            tm_content: One of the attributes of TMContent. It indicates how
+                the schedule of an elementary cycle is distributed among its
+                trigger messages.
+
+        Raises:
+            FT4FTTSimException: error if the windows of ec_layout do not fit
+                into an elementary cycle.
 
         """
         assert isinstance(num_tms_per_ec, int)
+        assert tm_content in (TMContent.REDUNDANT, TMContent.SPLIT)
+        if ec_layout is not None and sum(ec_layout) > ec_duration_us:
+            raise FT4FTTSimException(
+                "The windows of the EC layout exceed the EC duration.")
         NetworkDevice.__init__(self, env, name, num_ports)
-        self.proc = env.process(self.run())
+        self.proc = self.start_process(self.run())
         self.slaves = slaves
         self.ec_duration_us = ec_duration_us
+        time_base = timebase.get_time_base(env)
+        # duration of the elementary cycles in the time base of env
+        self.ec_duration = time_base.from_us(ec_duration_us)
         self.num_tms_per_ec = num_tms_per_ec
+        self.tm_content = tm_content
         if sync_requirements is None:
             self.sync_requirements = {}
         else:
             self.sync_requirements = sync_requirements
+        # Update request messages received during the current elementary
+        # cycle. They are applied at the start of the next one.
+        self.pending_update_requests = []
+        # Dictionary whose keys are elementary cycle numbers and whose values
+        # are UpdateCounts instances for the update requests applied at the
+        # start of those elementary cycles.
+        self.update_counts = {}
+        self.ec_layout = ec_layout
+        self._ec_layout = _ec_layout_in_time_base(ec_layout, time_base)
         # This counter is incremented after each successive elementary cycle
         self.ec_count = 0
-        self.env.process(
-            self.listen_for_messages(self.process_received_messages))
+        # Instant of time when the current elementary cycle started
+        self.ec_start_time = None
+        # Dictionary whose keys identify the synchronous streams scheduled for
+        # the current elementary cycle and whose values are their
+        # configurations.
+        self.ec_schedule = {}
+        self.listen_for_messages(self.process_received_messages)
+
+    @property
+    def sync_requirements(self):
+        """
+        A read-only mapping whose keys identify synchronous streams and whose
+        values are their configurations (i.e., instances of SyncStreamConfig).
+
+        The mapping cannot be modified in place, since the schedule table
+        used by compute_ec_schedule() has to be rebuilt whenever it changes.
+        Assign a new dictionary instead, or let update requests modify it
+        (see apply_pending_update_requests()).
 
-    def passes_admission_control(self, update_request_message):
+        """
+        return MappingProxyType(self._sync_requirements)
+
+    @sync_requirements.setter
+    def sync_requirements(self, sync_requirements):
+        self._sync_requirements = dict(sync_requirements)
+        self._schedule_table = None
+
+    def build_schedule_table(self):
+        """
+        Return a table of the synchronous streams to be used by
+        compute_ec_schedule().
+
+        Returns:
+            A dictionary whose keys are the periods of the synchronous streams.
+            Its values are dictionaries whose keys are phases, i.e., offsets
+            modulo the period, and whose values are lists of (stream_id,
+            config) tuples of the streams with that period and phase.
+
+        """
+        table = {}
+        for stream_id, config in self.sync_requirements.items():
+            phases = table.setdefault(config.period_ecs, {})
+            phase = config.offset_ecs % config.period_ecs
+            phases.setdefault(phase, []).append((stream_id, config))
+        return table
+
+    def compute_ec_schedule(self):
+        """
+        Return the synchronous streams to be transmitted in the current
+        elementary cycle.
+
+        A synchronous stream is to be transmitted in the elementary cycles
+        offset_ecs, offset_ecs + period_ecs, offset_ecs + 2 * period_ecs, etc.
+        counting from elementary cycle 0.
+
+        The streams are looked up in a table that is only rebuilt when the
+        synchronous requirements change, so that the cost of this method does
+        not depend on the number of streams that are not scheduled.
+
+        Returns:
+            A dictionary whose keys identify the scheduled synchronous streams
+            and whose values are their configurations.
+
+        """
+        if self._schedule_table is None:
+            self._schedule_table = self.build_schedule_table()
+        ec_number = self.ec_count - 1
+        schedule = {}
+        for period_ecs, phases in self._schedule_table.items():
+            for stream_id, config in phases.get(ec_number % period_ecs, ()):
+                if ec_number >= config.offset_ecs:
+                    schedule[stream_id] = config
+        return schedule
+
+    def passes_admission_control(self, update_request_message,
+                                 sync_requirements):
         """
         Return True if 'update_request' can be allowed to update the
-        sync_requirements.
+        synchronous requirements.
+
+        Arguments:
+            update_request_message: The update request message.
+            sync_requirements: The synchronous requirements that the update
+                request would modify, i.e., those resulting from the update
+                requests of the same batch admitted before it.
 
         """
         assert isinstance(update_request_message, Message)
@@ -93,54 +366,241 @@ class Master(NetworkDevice):
         # return true.
         return True
 
+    def window_hold_time(self, message, link):
+        """
+        Return how long message has to be held back before its transmission on
+        link can start within its window of the elementary cycle.
+
+        This method is meant to be used as the transmission gate of ports
+        enforcing the windows of the elementary cycles (see
+        ft4fttsim.networking.Port).
+
+        """
+        if self.ec_layout is None or self.ec_start_time is None:
+            return 0
+        return _window_hold_time(
+            self._ec_layout, self.ec_duration, self.ec_start_time,
+            self.env.now, message, link)
+
     def process_update_request_message(self, message):
-        if self.passes_admission_control(message):
-            stream_id, new_sync_stream_config = message.data
-            self.sync_requirements[stream_id] = new_sync_stream_config
+        """
+        Queue the update request message, so that it is applied, if it passes
+        the admission control, at the start of the next elementary cycle.
+
+        """
+        self.pending_update_requests.append(message)
+
+    def apply_pending_update_requests(self):
+        """
+        Apply the pending update requests as one atomic batch.
+
+        The batch is applied to a copy of the synchronous requirements which
+        then replaces them, so that the schedule table is rebuilt only once
+        per batch. Each update request passes the admission control or not
+        depending on the synchronous requirements modified by the update
+        requests of the batch admitted before it. The numbers of applied and
+        rejected update requests are
+        recorded in update_counts for the current elementary cycle.
+
+        """
+        update_requests = self.pending_update_requests
+        self.pending_update_requests = []
+        new_sync_requirements = dict(self.sync_requirements)
+        num_applied = 0
+        for message in update_requests:
+            if self.passes_admission_control(message, new_sync_requirements):
+                stream_id, new_sync_stream_config = message.data
+                new_sync_requirements[stream_id] = new_sync_stream_config
+                num_applied += 1
+        self.sync_requirements = new_sync_requirements
+        self.update_counts[self.ec_count] = UpdateCounts(
+            applied=num_applied, rejected=len(update_requests) - num_applied)
+        log.debug("%s applied %s update requests", self, num_applied)
 
     def process_received_messages(self, messages):
         for msg in messages:
             if msg.message_type == MessageType.UPDATE_REQUEST:
                 self.process_update_request_message(msg)
 
-    def broadcast_trigger_message(self):
+    def build_trigger_messages_data(self):
         """
-        Broadcast the trigger message on all ports.
+        Return the data of the trigger messages of the current elementary
+        cycle.
 
+        Returns:
+            A list with a TriggerMessageData instance for each of the
+            num_tms_per_ec trigger messages. Depending on tm_content, each of
+            them carries either the whole schedule of the elementary cycle or
+            a different slice of it.
+
+        Raises:
+            FT4FTTSimException: error if a trigger message would have to carry
+                more than MAX_TM_ENTRIES schedule entries.
+
+        """
+        stream_ids = tuple(self.ec_schedule)
+        redundant = self.tm_content == TMContent.REDUNDANT
+        if redundant:
+            slices = [stream_ids] * self.num_tms_per_ec
+        else:
+            slice_size = -(-len(stream_ids) // max(self.num_tms_per_ec, 1))
+            slices = [stream_ids[i * slice_size:(i + 1) * slice_size]
+                      for i in range(self.num_tms_per_ec)]
+        if slices and len(slices[0]) > MAX_TM_ENTRIES:
+            raise FT4FTTSimException(
+                "The schedule of EC {} does not fit into the trigger "
+                "messages.".format(self.ec_count))
+        return [
+            TriggerMessageData(self.ec_count, tm_index, self.num_tms_per_ec,
+                               redundant, stream_ids_slice)
+            for tm_index, stream_ids_slice in enumerate(slices)]
+
+    def broadcast_trigger_message(self, tm_data):
         """
-        log.debug("{} broadcasting trigger message".format(self))
+        Broadcast a trigger message carrying tm_data on all ports.
+
+        The size of the trigger message depends on the size of tm_data.
+
+        """
+        log.debug("%s broadcasting trigger message", self)
+        size_bytes = trigger_message_size_bytes(tm_data)
         for port in self.ports:
-            # TODO: calculate a schedule to be transmitted in the trigger
-            # message.
             trigger_message = Message(self.env, self, self.slaves,
-                                      ethernet.MAX_FRAME_SIZE_BYTES,
-                                      MessageType.TRIGGER_MESSAGE)
-            log.debug(
-                "{} instruct transmission of trigger message".format(self))
-            self.env.process(
+                                      size_bytes,
+                                      MessageType.TRIGGER_MESSAGE, tm_data)
+            log.debug("%s instruct transmission of trigger message", self)
+            self.start_process(
                 self.instruct_transmission(trigger_message, port))
 
+    def get_state(self):
+        state = super().get_state()
+        state.update(
+            ec_count=self.ec_count,
+            ec_start_time=self.ec_start_time,
+            ec_schedule=dict(self.ec_schedule),
+            sync_requirements=dict(self.sync_requirements),
+            pending_update_requests=[
+                message.to_state()
+                for message in self.pending_update_requests],
+            update_counts=dict(self.update_counts))
+        return state
+
+    def set_state(self, state, devices_by_name):
+        """
+        Restore a state returned by get_state(). The elementary cycle in
+        progress is resumed, i.e., the next one starts at ec_start_time +
+        ec_duration.
+
+        """
+        super().set_state(state, devices_by_name)
+        self.ec_count = state["ec_count"]
+        self.ec_start_time = state["ec_start_time"]
+        self.ec_schedule = dict(state["ec_schedule"])
+        self.sync_requirements = dict(state["sync_requirements"])
+        self.pending_update_requests = [
+            Message.from_state(self.env, message_state, devices_by_name)
+            for message_state in state["pending_update_requests"]]
+        self.update_counts = dict(state["update_counts"])
+
     def run(self):
         while True:
+            if self.ec_start_time is not None:
+                # wait for the next elementary cycle to start
+                while True:
+                    time_since_ec_start = self.env.now - self.ec_start_time
+                    delay_before_next_tx_order = (self.ec_duration -
+                                                  time_since_ec_start)
+                    if delay_before_next_tx_order > 0:
+                        yield self.env.timeout(delay_before_next_tx_order)
+                    else:
+                        break
             self.ec_count += 1
-            log.debug("{} starting EC ".format(self, self.ec_count))
-            time_last_ec_start = self.env.now
-            for _ in range(self.num_tms_per_ec):
-                self.broadcast_trigger_message()
-            # wait for the next elementary cycle to start
-            while True:
-                time_since_ec_start = self.env.now - time_last_ec_start
-                delay_before_next_tx_order = float(self.ec_duration_us -
-                                                   time_since_ec_start)
-                if delay_before_next_tx_order > 0:
-                    yield self.env.timeout(delay_before_next_tx_order)
-                else:
-                    break
+            log.debug("%s starting EC %s", self, self.ec_count)
+            self.ec_start_time = self.env.now
+            if self.pending_update_requests:
+                self.apply_pending_update_requests()
+            self.ec_schedule = self.compute_ec_schedule()
+            for tm_data in self.build_trigger_messages_data():
+                self.broadcast_trigger_message(tm_data)
+
+
+class _InternalChannel(object):
+    """
+    Models the connection between an FT4FTT switch and its embedded master.
+
+    Unlike a Link, an _InternalChannel does not model any transmission,
+    propagation or interframe gap time, and it does not need a simpy process.
+    Instead, the output queue of each of its two ports delivers the messages
+    put into it to the other port. A message queued for transmission through
+    one port is therefore received through the other port at the same
+    instant of time, and messages are received in the order in which they
+    were queued.
+
+    """
+
+    def __init__(self, port1, port2):
+        """
+        Create a new instance of class _InternalChannel.
+
+        Arguments:
+            port1: An instance of Port at one end of the channel.
+            port2: An instance of Port at the other end of the channel.
+
+        """
+        assert port1.is_free
+        assert port2.is_free
+        port1.out_queue = _ChannelQueue(port2)
+        port2.out_queue = _ChannelQueue(port1)
+        port1.is_free = False
+        port2.is_free = False
+
+
+class _ChannelQueue(object):
+    """
+    Output queue of a port of an _InternalChannel.
+
+    """
+
+    def __init__(self, receiver_port):
+        """
+        Create a new instance of class _ChannelQueue.
+
+        Arguments:
+            receiver_port: The port at the other end of the channel.
+
+        """
+        self.receiver_port = receiver_port
+
+    def put(self, message):
+        """
+        Deliver message to the receiver port.
+
+        Returns:
+            An event that is already triggered, like the put events of a simpy
+            Store with free capacity.
+
+        """
+        self.receiver_port.deliver(message)
+        return self.receiver_port.env.event().succeed()
 
 
 class FT4FTTSwitch(NetworkDevice):
+    """
+    Class for FT4FTT switches, i.e., switches with an embedded FTT master.
+
+    If the embedded master has an EC layout, the external ports of the switch
+    hold back any message that would otherwise cross the boundary of its
+    window of the elementary cycle.
+
+    Synchronous messages are policed against the schedule of the current
+    elementary cycle of the embedded master. Messages of streams that are not
+    scheduled and messages larger than allowed for their stream are counted
+    as violations of the port through which they were received.
 
-    def __init__(self, env, name, num_ports, master):
+    """
+
+    def __init__(self, env, name, num_ports, master, forwarding_table=None,
+                 drop_violations=True):
         """
         Arguments:
             env: A simpy.Environment instance.
@@ -149,6 +609,12 @@ class FT4FTTSwitch(NetworkDevice):
                 have.
             master: An FTT master (i.e., instance of Master) to be embedded
                 within the FT4FTTSwitch instance.
+            forwarding_table: Dictionary whose keys are network devices and
+                whose values are ports of the FT4FTTSwitch instance. It is used
+                to forward synchronous messages.
+            drop_violations: If True, synchronous messages violating the
+                schedule are dropped. Otherwise they are only flagged, i.e.,
+                counted and forwarded anyway.
 
         """
         if len(master.ports) != 1:
@@ -161,9 +627,65 @@ class FT4FTTSwitch(NetworkDevice):
         self.ports.append(self.internal_port)
         # Ports leading to devices other than the embedded master.
         self.external_ports = self.ports[:-1]
-        Link(env, self.internal_port, master.ports[0], float("inf"), 0)
+        for port in self.external_ports:
+            port.transmission_gate = master.window_hold_time
+        _InternalChannel(self.internal_port, master.ports[0])
         self.master = master
-        env.process(self.listen_for_messages(self.process_received_messages))
+        if forwarding_table is None:
+            self.forwarding_table = {}
+        else:
+            self.forwarding_table = forwarding_table
+        self.drop_violations = drop_violations
+        # Dictionary whose keys are the ports and whose values count the
+        # violations (see PolicingViolation) detected on each port.
+        self.policing_violations = dict(
+            (port, Counter()) for port in self.ports)
+        # Dictionary whose keys identify the synchronous streams scheduled for
+        # the elementary cycle number _admitted_ec_count and whose values are
+        # the maximum message sizes of the streams.
+        self._admitted_streams = {}
+        self._admitted_ec_count = None
+        self.listen_for_messages(
+            self.process_received_messages, with_ports=True)
+
+    @property
+    def admitted_streams(self):
+        """
+        Dictionary whose keys identify the synchronous streams scheduled for
+        the current elementary cycle and whose values are the maximum message
+        sizes of the streams.
+
+        The dictionary is rebuilt from the schedule of the embedded master at
+        most once per elementary cycle.
+
+        """
+        if self._admitted_ec_count != self.master.ec_count:
+            self._admitted_streams = dict(
+                (stream_id, config.max_size_bytes)
+                for stream_id, config in self.master.ec_schedule.items())
+            self._admitted_ec_count = self.master.ec_count
+        return self._admitted_streams
+
+    def police(self, message, port):
+        """
+        Return the violation committed by synchronous message, or None if it
+        complies with the schedule of the current elementary cycle.
+
+        Violations are counted for port, the port through which message was
+        received.
+
+        """
+        max_size_bytes = self.admitted_streams.get(message.data)
+        if max_size_bytes is None:
+            violation = PolicingViolation.UNSCHEDULED
+        elif message.size_bytes > max_size_bytes:
+            violation = PolicingViolation.OVERSIZED
+        else:
+            return None
+        self.policing_violations[port][violation] += 1
+        log.debug("%s detected %s message %s on %s", self, violation, message,
+                  port)
+        return violation
 
     def flood_message(self, message):
         """
@@ -171,24 +693,198 @@ class FT4FTTSwitch(NetworkDevice):
 
         """
         for port in self.external_ports:
-            self.env.process(
+            self.start_process(
                 self.instruct_transmission(message, port))
 
-    def process_received_messages(self, messages):
-        for msg in messages:
+    def forward_message(self, message, reception_port):
+        """
+        Instruct the transmission of message on the external ports leading to
+        its destination, except for the port through which it was received.
+
+        """
+        output_ports = find_output_ports(
+            self.forwarding_table, message.destination, self.external_ports)
+        output_ports.discard(reception_port)
+        for port in output_ports:
+            self.start_process(
+                self.instruct_transmission(message, port))
+
+    def get_state(self):
+        state = super().get_state()
+        state["policing_violations"] = [
+            dict(self.policing_violations[port]) for port in self.ports]
+        return state
+
+    def set_state(self, state, devices_by_name):
+        super().set_state(state, devices_by_name)
+        self.policing_violations = dict(
+            (port, Counter(violations))
+            for port, violations in zip(
+                self.ports, state["policing_violations"]))
+
+    def process_received_messages(self, received):
+        for port, msg in received:
             if msg.destination == self.master:
-                self.env.process(
+                self.start_process(
                     self.instruct_transmission(msg, self.internal_port))
             elif msg.message_type == MessageType.TRIGGER_MESSAGE:
                 self.flood_message(msg)
+            elif msg.message_type == MessageType.SYNCHRONOUS_MESSAGE:
+                violation = self.police(msg, port)
+                if violation is None or not self.drop_violations:
+                    self.forward_message(msg, port)
 
 
-# TODO: update this class.  It is currently obsolete.
 class Slave(NetworkDevice):
     """
     Class for FTT slaves.
 
+    A slave takes the reception of the first valid trigger message of an
+    elementary cycle as the start of that elementary cycle. If the trigger
+    messages of the elementary cycle are redundant copies, the slave uses the
+    schedule of that first copy and ignores the others. Otherwise it collects
+    the slices of the schedule carried by each trigger message, once per
+    trigger message index, so that the copies sent by several masters are
+    not counted twice. If the slave has an EC layout, its ports hold back any
+    message that would otherwise cross the boundary of its window of the
+    elementary cycle.
+
     """
 
-    # TODO: implement
-    pass
+    def __init__(
+            self, env, name, num_ports, ec_duration_us=None, ec_layout=None):
+        """
+        Constructor for FTT slaves.
+
+        Arguments:
+            env: A simpy.Environment instance.
+            name: A string used to identify the new Slave instance.
+            num_ports: The number of ports that the new Slave instance should
+                have.
+            ec_duration_us: Duration of the elementary cycles in
+                microseconds.
+            ec_layout: An ECLayout instance with the windows of the elementary
+                cycles, or None if the windows should not be enforced.
+
+        Raises:
+            FT4FTTSimException: error if ec_layout is given without
+                ec_duration_us, or if its windows do not fit into an
+                elementary cycle.
+
+        """
+        if ec_layout is not None:
+            if ec_duration_us is None:
+                raise FT4FTTSimException(
+                    "An EC layout requires the EC duration.")
+            if sum(ec_layout) > ec_duration_us:
+                raise FT4FTTSimException(
+                    "The windows of the EC layout exceed the EC duration.")
+        NetworkDevice.__init__(self, env, name, num_ports)
+        self.ec_duration_us = ec_duration_us
+        self.ec_layout = ec_layout
+        time_base = timebase.get_time_base(env)
+        # duration and windows of the elementary cycles in the time base of
+        # env
+        self.ec_duration = (None if ec_duration_us is None
+                            else time_base.from_us(ec_duration_us))
+        self._ec_layout = _ec_layout_in_time_base(ec_layout, time_base)
+        # Instant of time when the current elementary cycle started
+        self.ec_start_time = None
+        # Number of the current elementary cycle as announced by the master
+        self.ec_number = None
+        # Identifiers of the synchronous streams scheduled for the current
+        # elementary cycle that are known to the slave so far
+        self.ec_schedule = ()
+        # Dictionary whose keys are the indices of the trigger messages of
+        # the current elementary cycle received so far and whose values are
+        # the slices of the schedule that they carry
+        self.ec_slices = {}
+        for port in self.ports:
+            port.transmission_gate = self.window_hold_time
+        self.listen_for_messages(self.process_received_messages)
+
+    def process_received_messages(self, messages):
+        for msg in messages:
+            if msg.message_type == MessageType.TRIGGER_MESSAGE:
+                self.process_trigger_message(msg)
+
+    def is_valid_trigger_message(self, message):
+        """
+        Return True if message is a trigger message of the current or of a
+        later elementary cycle.
+
+        """
+        tm_data = message.data
+        if not isinstance(tm_data, TriggerMessageData):
+            return False
+        return self.ec_number is None or tm_data.ec_number >= self.ec_number
+
+    def process_trigger_message(self, message):
+        """
+        Start a new elementary cycle if message is the first valid trigger
+        message of the elementary cycle, and update the schedule of the
+        elementary cycle with the slice carried by message.
+
+        """
+        if not self.is_valid_trigger_message(message):
+            log.debug("%s ignoring %s", self, message)
+            return
+        tm_data = message.data
+        if tm_data.ec_number != self.ec_number:
+            self.ec_number = tm_data.ec_number
+            self.ec_start_time = self.env.now
+            self.ec_schedule = tm_data.stream_ids
+            self.ec_slices = {tm_data.tm_index: tm_data.stream_ids}
+            log.debug("%s starting EC %s", self, self.ec_number)
+        elif not tm_data.redundant and tm_data.tm_index not in self.ec_slices:
+            self.ec_slices[tm_data.tm_index] = tm_data.stream_ids
+            # keep the order of the schedule built by the master
+            self.ec_schedule = tuple(
+                stream_id for tm_index in sorted(self.ec_slices)
+                for stream_id in self.ec_slices[tm_index])
+
+    def get_state(self):
+        state = super().get_state()
+        state.update(ec_start_time=self.ec_start_time,
+                     ec_number=self.ec_number,
+                     ec_schedule=self.ec_schedule,
+                     ec_slices=dict(self.ec_slices))
+        return state
+
+    def set_state(self, state, devices_by_name):
+        super().set_state(state, devices_by_name)
+        self.ec_start_time = state["ec_start_time"]
+        self.ec_number = state["ec_number"]
+        self.ec_schedule = state["ec_schedule"]
+        self.ec_slices = dict(state["ec_slices"])
+
+    def window_hold_time(self, message, link):
+        """
+        Return how long message has to be held back before its transmission on
+        link can start within its window of the elementary cycle.
+
+        Messages are not held back before the first trigger message has been
+        received.
+
+        """
+        if self.ec_layout is None or self.ec_start_time is None:
+            return 0
+        return _window_hold_time(
+            self._ec_layout, self.ec_duration, self.ec_start_time,
+            self.env.now, message, link)
+
+
+class RecordingSlave(Slave, MessageRecordingDevice):
+    """
+    Slave that also records and timestamps each received message, like a
+    MessageRecordingDevice.
+
+    """
+
+    def __init__(self, env, name, num_ports=1, **kwargs):
+        Slave.__init__(self, env, name, num_ports, **kwargs)
+        self.reception_records = {}
+
+    def process_received_messages(self, messages):
+        self.do_timestamp_messages(messages)
+        Slave.process_received_messages(self, messages)
@@ -0,0 +1,266 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Diagnostics of the memory use of long simulations.
+
+Memory grows in long runs when objects are retained longer than needed,
+e.g., messages kept by recorders, processes blocked forever on a full
+output queue, or pending put and get events of stores. A MemoryMonitor
+samples, at regular intervals of simulated time, the number of live
+objects of such classes and the memory traced by tracemalloc, and keeps a
+tracemalloc snapshot of the first and of the last sample to find the lines
+of code whose allocations grew the most in between:
+
+    monitor = MemoryMonitor(env, interval=10000)
+    env.run(until=10 ** 7)
+    monitor.stop()
+    monitor.write_time_series("memory.csv")
+    print(monitor.report())
+
+Objects are counted by walking all the objects tracked by the garbage
+collector, so a sample costs time proportional to the size of the heap and
+the interval should be chosen accordingly. Only objects of the environment
+of the monitor are counted. The monitor stops sampling once no other events
+are scheduled, so that env.run() without until still ends.
+
+"""
+
+from collections import namedtuple
+import csv
+import gc
+import time
+import tracemalloc
+
+import simpy
+import simpy.resources.store
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import Message
+
+
+# Default classes of objects counted by a MemoryMonitor: a dictionary whose
+# keys are the names under which the objects are counted and whose values
+# are tuples of classes.
+DEFAULT_CLASSES = {
+    "Message": (Message,),
+    "Process": (simpy.events.Process, kernel.Process),
+    "Store event": (simpy.resources.store.StorePut,
+                    simpy.resources.store.StoreGet,
+                    kernel.StorePut, kernel.StoreGet),
+    "Event": (simpy.events.Event, kernel.Event),
+}
+
+
+# A sample of a MemoryMonitor. time is the simulated time of the sample,
+# wall_time_s the wall-clock time since the monitor was created, counts a
+# dictionary whose keys are the names of the counted classes and whose
+# values are the numbers of live objects, num_scheduled the number of events
+# scheduled in the environment, and traced_bytes and peak_traced_bytes the
+# current and peak memory traced by tracemalloc (None if not traced).
+MemorySample = namedtuple(
+    "MemorySample",
+    "time, wall_time_s, counts, num_scheduled, traced_bytes, "
+    "peak_traced_bytes")
+
+
+# Growth of the memory allocated by a line of code between the first and the
+# last sample of a MemoryMonitor.
+Allocation = namedtuple(
+    "Allocation", "location, size_bytes, size_diff_bytes, count, count_diff")
+
+
+class MemoryMonitor(object):
+    """
+    Samples the memory use of a simulation at regular intervals of simulated
+    time, until no other events are scheduled.
+
+    """
+
+    def __init__(self, env, interval, classes=None, trace_allocations=True,
+                 num_frames=1):
+        """
+        Arguments:
+            env: The simpy.Environment or ft4fttsim.kernel.Environment
+                instance of the simulation.
+            interval: The simulated time between consecutive samples.
+            classes: A dictionary like DEFAULT_CLASSES with the classes of
+                the objects to count, by default DEFAULT_CLASSES.
+            trace_allocations: Whether to trace the allocations with
+                tracemalloc. Tracing is started if it is not already.
+            num_frames: The number of frames of the tracebacks stored by
+                tracemalloc, if tracing is started by the monitor.
+
+        Raises:
+            FT4FTTSimException: If interval is not positive.
+
+        """
+        if interval <= 0:
+            raise FT4FTTSimException("The interval must be positive.")
+        self.env = env
+        self.interval = interval
+        self.classes = DEFAULT_CLASSES if classes is None else classes
+        # Dictionary whose keys are types and whose values are the names of
+        # the counted classes that the objects of the types are counted as.
+        self._names_of_type = {}
+        self.trace_allocations = trace_allocations
+        self._started_tracing = False
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(num_frames)
+            self._started_tracing = True
+        self._start = time.perf_counter()
+        # list of MemorySample instances
+        self.samples = []
+        # tracemalloc snapshots of the first and of the last sample
+        self.first_snapshot = None
+        self.last_snapshot = None
+        env.process(self.run())
+
+    def run(self):
+        """
+        Simpy process that takes the samples.
+
+        """
+        while True:
+            self.take_sample()
+            if not self.other_events_scheduled():
+                return
+            yield self.env.timeout(self.interval)
+
+    def other_events_scheduled(self):
+        """
+        Return True if events other than those of the monitor are scheduled.
+
+        """
+        return kernel.pending_events(self.env) > 0
+
+    def count_objects(self):
+        """
+        Return a dictionary whose keys are the names of the counted classes
+        and whose values are the numbers of live objects of the classes in the
+        environment of the monitor.
+
+        """
+        counts = dict((name, 0) for name in self.classes)
+        names_of_type = self._names_of_type
+        for obj in gc.get_objects():
+            names = names_of_type.get(type(obj))
+            if names is None:
+                names = tuple(
+                    name for name, classes in self.classes.items()
+                    if issubclass(type(obj), classes))
+                names_of_type[type(obj)] = names
+            if names and getattr(obj, "env", None) is self.env:
+                for name in names:
+                    counts[name] += 1
+        return counts
+
+    def take_sample(self):
+        """
+        Take a sample now.
+
+        Returns:
+            The new MemorySample instance.
+
+        """
+        traced_bytes = peak_traced_bytes = None
+        if self.trace_allocations and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__)])
+            if self.first_snapshot is None:
+                self.first_snapshot = snapshot
+            self.last_snapshot = snapshot
+            traced_bytes, peak_traced_bytes = tracemalloc.get_traced_memory()
+        sample = MemorySample(
+            self.env.now, time.perf_counter() - self._start,
+            self.count_objects(), kernel.pending_events(self.env),
+            traced_bytes, peak_traced_bytes)
+        self.samples.append(sample)
+        return sample
+
+    def stop(self):
+        """
+        Stop tracing the allocations, if the monitor started it. The last
+        snapshot is kept.
+
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def top_allocators(self, limit=10, key_type="lineno"):
+        """
+        Return the lines of code whose allocations grew the most between the
+        first and the last sample.
+
+        Arguments:
+            limit: The maximum number of lines of code to return.
+            key_type: How to group the allocations, "lineno", "filename" or
+                "traceback" (see tracemalloc.Snapshot.statistics()).
+
+        Returns:
+            A list of Allocation instances.
+
+        Raises:
+            FT4FTTSimException: If no snapshot has been taken.
+
+        """
+        if self.first_snapshot is None:
+            raise FT4FTTSimException(
+                "No allocations have been traced by the monitor.")
+        statistics = self.last_snapshot.compare_to(
+            self.first_snapshot, key_type)
+        return [Allocation(str(statistic.traceback), statistic.size,
+                           statistic.size_diff, statistic.count,
+                           statistic.count_diff)
+                for statistic in statistics[:limit]]
+
+    def time_series(self):
+        """
+        Return the samples as a list of dictionaries, one per sample, with
+        the counts under the names of their classes.
+
+        """
+        rows = []
+        for sample in self.samples:
+            row = dict(time=sample.time, wall_time_s=sample.wall_time_s,
+                       num_scheduled=sample.num_scheduled,
+                       traced_bytes=sample.traced_bytes,
+                       peak_traced_bytes=sample.peak_traced_bytes)
+            row.update(sample.counts)
+            rows.append(row)
+        return rows
+
+    def write_time_series(self, path):
+        """
+        Write the samples to a CSV file.
+
+        """
+        fields = (["time", "wall_time_s", "num_scheduled", "traced_bytes",
+                   "peak_traced_bytes"] + sorted(self.classes))
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fields)
+            writer.writeheader()
+            writer.writerows(self.time_series())
+
+    def report(self, limit=10):
+        """
+        Return the growth of the counted objects and the top allocators as a
+        string.
+
+        """
+        if not self.samples:
+            return "No samples."
+        first, last = self.samples[0], self.samples[-1]
+        lines = ["Live objects at {} and at {}:".format(first.time, last.time)]
+        for name in sorted(self.classes):
+            lines.append("    {:<20} {:>10} {:>10} {:>+10}".format(
+                name, first.counts[name], last.counts[name],
+                last.counts[name] - first.counts[name]))
+        if self.first_snapshot is not None:
+            lines.append("Top allocators:")
+            for allocation in self.top_allocators(limit):
+                lines.append("    {:<50} {:>12} B {:>+12} B {:>8}".format(
+                    allocation.location, allocation.size_bytes,
+                    allocation.size_diff_bytes, allocation.count))
+        return "\n".join(lines)
@@ -4,11 +4,14 @@ This module provides classes to define a simulated ethernet network.
 
 """
 
-import collections
+from collections import namedtuple
+import collections.abc
 
 import simpy
 
 import ft4fttsim.ethernet as ethernet
+import ft4fttsim.kernel as kernel
+import ft4fttsim.timebase as timebase
 from ft4fttsim.exceptions import FT4FTTSimException
 from ft4fttsim.simlogging import log
 
@@ -31,6 +34,10 @@ class Port(object):
     capacity 1. This means that messages transmitted through the output queue
     may suffer a queuing delay.
 
+    The queues are only created when they are first used, usually when a link
+    is attached to the port, so that devices with many unconnected ports
+    remain cheap.
+
     """
 
     def __init__(self, env, name):
@@ -42,16 +49,181 @@ class Port(object):
             name: A string used to identify the Port instance.
 
         """
-        self.in_queue = simpy.Store(env)
-        self.out_queue = simpy.Store(env, capacity=1)
+        self.env = env
+        self._in_queue = None
+        self._out_queue = None
         # indicates whether the port is already connected to a link
         self.is_free = True
+        # Optional function called with the port and each message received
+        # through it. Messages received while it is None are queued in the
+        # input queue. See NetworkDevice.listen_for_messages().
+        self.receive_callback = None
+        # Optional function deciding when a message taken from the output
+        # queue may start being transmitted. See _Sublink.start_transmission().
+        self.transmission_gate = None
+        # The FrameTrain last queued through the port, with its
+        # available_since and spacing at that time, if some of its frames may
+        # not be available yet. See queue_for_transmission().
+        self._incomplete_train = None
+        # The events that queue the remainders of split trains.
+        self._queueings = set()
         self.name = name
 
+    @property
+    def in_queue(self):
+        if self._in_queue is None:
+            self._in_queue = kernel.store(self.env)
+        return self._in_queue
+
+    @in_queue.setter
+    def in_queue(self, queue):
+        self._in_queue = queue
+
+    @property
+    def out_queue(self):
+        if self._out_queue is None:
+            self._out_queue = kernel.store(self.env, capacity=1)
+        return self._out_queue
+
+    @out_queue.setter
+    def out_queue(self, queue):
+        self._out_queue = queue
+
+    def queue_for_transmission(self, message):
+        """
+        Put message into the output queue.
+
+        The origin time of the message is set to the current time if it is
+        handed to a port for the first time.
+
+        Messages are queued in the order in which they become available, as
+        if each frame of a FrameTrain were queued when it becomes available:
+        the frames of the train last queued that are not available yet are
+        split off into a new train, which is queued once its first frame
+        becomes available.
+
+        Returns:
+            The put event of the output queue.
+
+        """
+        if self._incomplete_train is not None:
+            self.split_incomplete_train()
+        if message.origin_time is None:
+            message.origin_time = self.env.now
+        put = self.out_queue.put(message)
+        if isinstance(message, FrameTrain) and message.spacing > 0:
+            self._incomplete_train = (
+                message, message.available_since, message.spacing)
+        return put
+
+    def split_incomplete_train(self):
+        train, available_since, spacing = self._incomplete_train
+        self._incomplete_train = None
+        now = self.env.now
+        num_available = int((now - available_since) // spacing) + 1
+        if num_available >= train.num_frames:
+            return
+        log.debug("%s splitting %s after %s frames", self, train,
+                  num_available)
+        self.queue_when_available(train.split(
+            num_available, available_since + num_available * spacing,
+            spacing))
+
+    def queue_when_available(self, train):
+        """
+        Queue train for transmission once its first frame becomes available.
+
+        """
+        queueing = self.env.timeout(train.available_since - self.env.now,
+                                    train)
+        queueing.callbacks.append(self.queue_remainder)
+        self._queueings.add(queueing)
+
+    def queue_remainder(self, queueing):
+        self._queueings.discard(queueing)
+        # the train may have been truncated to nothing in the meantime
+        if queueing.value.num_frames > 0:
+            self.queue_for_transmission(queueing.value)
+
+    @property
+    def is_queueing_trains(self):
+        """
+        True if frames of frame trains are still to be queued through the
+        port.
+
+        """
+        if self._queueings:
+            return True
+        if self._incomplete_train is None:
+            return False
+        train, available_since, spacing = self._incomplete_train
+        return (available_since + (train.num_frames - 1) * spacing >
+                self.env.now)
+
+    def deliver(self, message):
+        """
+        Hand a message received through the port to the device of the port.
+
+        """
+        if self.receive_callback is None:
+            self.in_queue.put(message)
+        else:
+            self.receive_callback(self, message)
+
     def __repr__(self):
         return self.name
 
 
+class _ReceptionDispatcher(object):
+    """
+    Collects the messages received through the ports of a network device and
+    passes them to the device's callback once per instant of time.
+
+    """
+
+    def __init__(self, device, callback, with_ports):
+        """
+        Create a new instance of class _ReceptionDispatcher.
+
+        Arguments:
+            device: The NetworkDevice instance receiving the messages.
+            callback: The function called with the list of messages received
+                at an instant of time.
+            with_ports: If True, callback is called with a list of
+                (port, message) tuples instead.
+
+        """
+        self.device = device
+        self.callback = callback
+        self.with_ports = with_ports
+        self.received = []
+
+    def receive(self, port, message):
+        """
+        Add message to the messages received at the current instant of time.
+
+        """
+        if not self.received:
+            # flush after the other events of the current instant of time
+            flush_event = self.device.env.timeout(0)
+            flush_event.callbacks.append(self.flush)
+        self.received.append((port, message))
+
+    def flush(self, event):
+        """
+        Pass the messages received at the current instant of time to the
+        callback.
+
+        """
+        received, self.received = self.received, []
+        messages = [message for _, message in received]
+        log.debug("%s received %s", self.device, messages)
+        if self.with_ports:
+            self.callback(received)
+        else:
+            self.callback(messages)
+
+
 class Link(object):
     """
     Models links used in an Ethernet network.
@@ -107,6 +279,24 @@ class Link(object):
         port2.is_free = False
         self.megabits_per_second = megabits_per_second
         self.propagation_delay_us = propagation_delay_us
+        time_base = timebase.get_time_base(env)
+        # Propagation delay and time to transmit a byte in units of the time
+        # base of env. byte_time is None unless the time base is integer.
+        self.propagation_delay = time_base.from_us(propagation_delay_us)
+        self.byte_time = time_base.byte_time(megabits_per_second)
+
+    def transmission_time(self, num_bytes):
+        """
+        Gives the time to transmit num_bytes on the link in units of the time
+        base of the link's environment (see ft4fttsim.timebase).
+
+        With an integer time base, the time is computed with integer
+        arithmetic only. Otherwise, it is transmission_time_us(num_bytes).
+
+        """
+        if self.byte_time is None:
+            return self.transmission_time_us(num_bytes)
+        return num_bytes * self.byte_time
 
     def transmission_time_us(self, num_bytes):
         """
@@ -140,6 +330,14 @@ class Link(object):
         return transmission_time_us
 
 
+# A FrameTrain being transmitted by a _Sublink. The transmission of frame k
+# of the train starts at start + k * interval, frame_time is the time the
+# _Sublink is busy with each frame, and num_frames is the number of frames of
+# the train the end of the transmission was scheduled for.
+_TrainTransmission = namedtuple(
+    "_TrainTransmission", "train, start, interval, frame_time, num_frames")
+
+
 class _Sublink(object):
     """
     Models a directional sublink of a Link.
@@ -174,7 +372,24 @@ class _Sublink(object):
         self.link = link
         self._transmitter_port = transmitter_port
         self._receiver_port = receiver_port
-        env.process(self.run())
+        # Optional function that takes over the delivery of the transmitted
+        # messages to the receiver port. See start_transmission().
+        self.remote_delivery = None
+        # Optional function called with the _Sublink and a message that
+        # returns how long the message has to wait for background traffic
+        # before its transmission starts. See ft4fttsim.fluid.
+        self.background_wait = None
+        # The events the _Sublink is waiting for, kept for get_state(): the
+        # request for the next message, the end of the current transmission,
+        # the end of the current interframe gap and the ends of the hold
+        # times of held messages.
+        self._get_request = None
+        self._transmission = None
+        self._interframe_gap = None
+        self._holds = set()
+        # The _TrainTransmission of the FrameTrain being transmitted, if any.
+        self._train = None
+        self.wait_for_message()
 
     @property
     def transmitter_port(self):
@@ -192,28 +407,297 @@ class _Sublink(object):
         """
         return self._receiver_port
 
-    def run(self):
+    def wait_for_message(self, event=None):
+        """
+        Get the next message to transmit from the transmitter port.
+
+        The _Sublink is driven by callbacks of the events it waits for rather
+        than by a simpy process: wait_for_message() is followed by
+        start_transmission() once a message is available, which is followed
+        by finish_transmission() once the message has been received, which is
+        followed by wait_for_message() once the interframe gap has elapsed.
+
+        """
+        get_request = self.transmitter_port.out_queue.get()
+        get_request.callbacks.append(self.start_transmission)
+        self._get_request = get_request
+
+    def start_transmission(self, get_request):
+        """
+        Simulate the transmission of the message got from the transmitter
+        port.
+
+        If the transmitter port has a transmission gate, the gate is called
+        with the message and the link before the transmission starts. The gate
+        returns how long the message has to be held back, in the time base of
+        the environment (see ft4fttsim.timebase), or None if the message may
+        never be transmitted on the link. While a message is held, the
+        messages queued behind it are transmitted. Once its hold time
+        elapses, it is put back at the head of the output queue, i.e., before
+        the messages still queued (see requeue()). A message that may never
+        be transmitted is discarded.
+
         """
-        Get a message from the transmitter port and simulate its transmission.
-
-        """
-        while True:
-            get_request = self.transmitter_port.out_queue.get()
-            message = yield get_request
-            log.debug("{} transmission of {} started".format(self, message))
-            bytes_to_transmit = (ethernet.PREAMBLE_SIZE_BYTES +
-                                 ethernet.SFD_SIZE_BYTES +
-                                 message.size_bytes)
-            # wait for the transmission + propagation time to elapse
-            yield self.env.timeout(
-                self.link.transmission_time_us(bytes_to_transmit) +
-                self.link.propagation_delay_us)
-            log.debug("{} transmission of {} finished".format(self, message))
-            self.receiver_port.in_queue.put(message)
-            # wait for the duration of the ethernet interframe gap to elapse
-            yield self.env.timeout(
-                self.link.transmission_time_us(ethernet.IFG_SIZE_BYTES))
-            log.debug("{} inter frame gap finished".format(self))
+        message = get_request.value
+        gate = self.transmitter_port.transmission_gate
+        if gate is not None:
+            hold_time = gate(message, self.link)
+            if hold_time is None:
+                log.warning("%s discarded %s", self, message)
+                self.wait_for_message()
+                return
+            if hold_time > 0:
+                log.debug("%s holding %s for %s", self, message, hold_time)
+                hold = self.env.timeout(hold_time, message)
+                hold.callbacks.append(self.requeue)
+                self._holds.add(hold)
+                self.wait_for_message()
+                return
+        if isinstance(message, FrameTrain):
+            self.start_train(message)
+            return
+        log.debug("%s transmission of %s started", self, message)
+        bytes_to_transmit = (ethernet.PREAMBLE_SIZE_BYTES +
+                             ethernet.SFD_SIZE_BYTES +
+                             message.size_bytes)
+        delay = (self.link.transmission_time(bytes_to_transmit) +
+                 self.link.propagation_delay)
+        if self.background_wait is not None:
+            delay += self.background_wait(self, message)
+        if self.remote_delivery is not None:
+            self.remote_delivery(self, message, self.env.now + delay)
+        # wait for the transmission + propagation time to elapse
+        transmission = self.env.timeout(delay, message)
+        transmission.callbacks.append(self.finish_transmission)
+        self._transmission = transmission
+
+    def finish_transmission(self, transmission):
+        """
+        Deliver the transmitted message and wait for the interframe gap.
+
+        """
+        message = transmission.value
+        log.debug("%s transmission of %s finished", self, message)
+        if self.remote_delivery is None:
+            self.receiver_port.deliver(message)
+        # wait for the duration of the ethernet interframe gap to elapse
+        interframe_gap = self.env.timeout(
+            self.link.transmission_time(ethernet.IFG_SIZE_BYTES))
+        interframe_gap.callbacks.append(self.finish_interframe_gap)
+        self._interframe_gap = interframe_gap
+
+    def finish_interframe_gap(self, interframe_gap):
+        log.debug("%s inter frame gap finished", self)
+        self.wait_for_message()
+
+    def start_train(self, train):
+        """
+        Simulate the transmission of the frames of a train.
+
+        The frames are transmitted one after another as they become
+        available, as if each of them were a message, so that the
+        transmission of frame k starts at start + k * interval, where interval
+        is the larger of the time the _Sublink is busy with a message of the
+        size of the frames and the spacing of the train. Only two events are
+        scheduled for the whole train: the reception of its first frame, when
+        the train is delivered to the receiver port, and the end of the
+        interframe gap of its last frame.
+
+        If the transmission starts after the first frame became available and
+        the frames become available more slowly than they are transmitted,
+        the frames that have become available in the meantime are transmitted
+        back-to-back and the others, which are transmitted as they become
+        available, are split off into a new train.
+
+        """
+        if train.num_frames == 0:
+            self.wait_for_message()
+            return
+        if self.remote_delivery is not None:
+            raise FT4FTTSimException(
+                "Frame train {} cannot be transmitted to another "
+                "partition".format(train))
+        transmission_time = self.link.transmission_time(
+            ethernet.PREAMBLE_SIZE_BYTES + ethernet.SFD_SIZE_BYTES +
+            train.size_bytes)
+        # like the transmission of a message, that of a frame lasts until
+        # the frame has been received and the interframe gap has elapsed
+        frame_time = (transmission_time + self.link.propagation_delay +
+                      self.link.transmission_time(ethernet.IFG_SIZE_BYTES))
+        available_since, spacing = train.available_since, train.spacing
+        delay = 0
+        if self.background_wait is not None:
+            delay = self.background_wait(self, train)
+        start = self.env.now + delay
+        interval = max(frame_time, spacing)
+        if spacing > frame_time and start > available_since:
+            num_waiting = int(
+                (start - available_since) // (spacing - frame_time)) + 1
+            if num_waiting < train.num_frames:
+                self.transmitter_port.queue_when_available(train.split(
+                    num_waiting, available_since + num_waiting * spacing,
+                    spacing))
+            interval = frame_time
+        log.debug("%s transmission of %s started", self, train)
+        self._train = _TrainTransmission(
+            train, start, interval, frame_time, train.num_frames)
+        train.truncation_listeners.append(self.truncate_train)
+        transmission = self.env.timeout(
+            delay + transmission_time + self.link.propagation_delay, train)
+        transmission.callbacks.append(self.deliver_train)
+        self._transmission = transmission
+        self.schedule_train_end()
+
+    def schedule_train_end(self):
+        """
+        Wait for the end of the interframe gap of the last frame of the train
+        being transmitted.
+
+        """
+        state = self._train
+        end = (state.start + (state.num_frames - 1) * state.interval +
+               state.frame_time)
+        train_end = self.env.timeout(max(end - self.env.now, 0))
+        train_end.callbacks.append(self.finish_train)
+        self._interframe_gap = train_end
+
+    def deliver_train(self, transmission):
+        """
+        Deliver the train being transmitted once its first frame has been
+        received. The following frames are received at the interval at which
+        they are transmitted.
+
+        """
+        if transmission is not self._transmission:
+            # the transmission was cancelled, see truncate_train()
+            return
+        train = transmission.value
+        log.debug("%s first frame of %s received", self, train)
+        train.available_since = self.env.now
+        train.spacing = self._train.interval
+        self.receiver_port.deliver(train)
+
+    def finish_train(self, train_end):
+        if train_end is not self._interframe_gap:
+            # rescheduled by truncate_train()
+            return
+        log.debug("%s transmission of %s finished", self, self._train.train)
+        self.end_train()
+        self.wait_for_message()
+
+    def end_train(self):
+        self._train.train.truncation_listeners.remove(self.truncate_train)
+        self._train = None
+
+    def truncate_train(self, num_frames):
+        """
+        Adapt the transmission of the train being transmitted after the train
+        has been truncated (see FrameTrain.truncate()).
+
+        """
+        state = self._train
+        train = state.train
+        if train.num_frames == state.num_frames:
+            return
+        if train.num_frames > 0:
+            self._train = state._replace(num_frames=train.num_frames)
+            self.schedule_train_end()
+            return
+        # None of the frames has been transmitted yet.
+        log.debug("%s transmission of %s cancelled", self, train)
+        self._transmission = None
+        self._interframe_gap = None
+        self.end_train()
+        self.wait_for_message()
+
+    def requeue(self, hold):
+        """
+        Put the held message back at the head of the output queue once its
+        hold time has elapsed, so that it is transmitted before the messages
+        that were queued while it was held.
+
+        """
+        self._holds.discard(hold)
+        out_queue = self.transmitter_port.out_queue
+        if out_queue.get_queue:
+            # The _Sublink is waiting for a message, so the output queue is
+            # empty.
+            out_queue.put(hold.value)
+        else:
+            # The store may briefly hold one item more than its capacity.
+            out_queue.items.insert(0, hold.value)
+
+    def get_state(self, queue_keys):
+        """
+        Return a picklable description of the frames in flight on the
+        _Sublink (see ft4fttsim.checkpoint).
+
+        Arguments:
+            queue_keys: Dictionary whose keys are the events scheduled in the
+                environment and whose values are their (time, priority,
+                event id) keys in the event queue.
+
+        Returns:
+            A dictionary with the key of the end of the current transmission
+            and the state (see Message.to_state) of the transmitted message,
+            the key of the end of the current interframe gap, and a list of
+            the keys of the ends of the hold times and the states of the held
+            messages.
+
+        Raises:
+            FT4FTTSimException: If a FrameTrain is being transmitted.
+
+        """
+        def pending(event):
+            return event is not None and event in queue_keys
+
+        if self._train is not None:
+            raise FT4FTTSimException(
+                "{} is transmitting frame train {}; frame trains in flight "
+                "cannot be checkpointed".format(self, self._train.train))
+        state = {"transmission": None, "interframe_gap": None, "held": []}
+        if pending(self._transmission):
+            state["transmission"] = (queue_keys[self._transmission],
+                                     self._transmission.value.to_state())
+        if pending(self._interframe_gap):
+            state["interframe_gap"] = queue_keys[self._interframe_gap]
+        for hold in self._holds:
+            state["held"].append((queue_keys[hold], hold.value.to_state()))
+        return state
+
+    def set_state(self, state, devices_by_name, schedule):
+        """
+        Restore the frames in flight described by a state returned by
+        get_state().
+
+        Arguments:
+            state: The state of the _Sublink.
+            devices_by_name: Dictionary whose keys are the names of the
+                network devices and whose values are the network devices.
+            schedule: Function called with the key of an event, a callback
+                and a value that returns a new event with the callback, which
+                is scheduled in the order of the keys (see
+                ft4fttsim.checkpoint.restore_checkpoint()).
+
+        """
+        def message(message_state):
+            return Message.from_state(self.env, message_state, devices_by_name)
+
+        if state["transmission"] or state["interframe_gap"]:
+            # the _Sublink is busy and does not take a message yet
+            out_queue = self.transmitter_port.out_queue
+            out_queue.get_queue.remove(self._get_request)
+            self._get_request = None
+        if state["transmission"]:
+            key, message_state = state["transmission"]
+            self._transmission = schedule(
+                key, self.finish_transmission, message(message_state))
+        if state["interframe_gap"]:
+            self._interframe_gap = schedule(
+                state["interframe_gap"], self.finish_interframe_gap)
+        for key, message_state in state["held"]:
+            self._holds.add(
+                schedule(key, self.requeue, message(message_state)))
 
     def __repr__(self):
         return "{}->{}".format(self.transmitter_port, self.receiver_port)
@@ -257,25 +741,36 @@ class NetworkDevice(object):
                       for i in range(num_ports)]
         self.name = name
 
-    def listen_for_messages(self, callback):
+    def listen_for_messages(self, callback, with_ports=False):
         """
-        Simpy process that calls callback when messages are received.
+        Call callback when messages are received.
 
         Arguments:
             callback: The function to be called when one or more messages are
                 received. The function should accept a single parameter that is
                 the list of received messages.
+            with_ports: If True, the list passed to callback contains
+                (port, message) tuples instead, where port is the port through
+                which message was received.
+
+        Raises:
+            FT4FTTSimException: If the device is already listening, i.e., if
+                a port of the device already has a receive callback.
 
-        Note that a simpy process is a generator function (a.k.a., co-routine).
-        It should therefore not be called directly. Instead, it should be
-        registered with a simpy environment using simpy.Environment().process
+        The callback is registered as the receive callback of every port of
+        the device, including the ports that are connected to a link later,
+        so the cost of a reception does not depend on the number of ports.
+        All the messages received at the same instant of time are passed to
+        callback in a single call. Messages received before the device
+        started listening are passed to callback at the current instant of
+        time.
 
         Example:
 
         >>> class MyNetworkDevice(NetworkDevice):
         ...     def __init__(self, env, name, num_ports):
         ...         NetworkDevice.__init__(self, env, name, num_ports)
-        ...         env.process(self.listen_for_messages(self.hello))
+        ...         self.listen_for_messages(self.hello)
         ...     def hello(self, messages):
         ...         for msg in messages:
         ...             print("Hello message {}".format(msg))
@@ -284,36 +779,40 @@ class NetworkDevice(object):
         >>> d = MyNetworkDevice(env, "some device", 1)
 
         """
-        # generate get requests for all input queues
-        requests = [port.in_queue.get() for port in self.ports]
-        while requests:
-            # helper variable for the asserts
-            queues_with_pending_requests = [req.resource for req in requests]
-            # There is a request for each input queue.
-            assert set(self.input_queues) == set(queues_with_pending_requests)
-            # For each input queue there's exactly one request.
-            assert (
-                len(queues_with_pending_requests) ==
-                len(set(queues_with_pending_requests)))
-
-            log.debug("{} waiting for next reception".format(self))
-            completed_requests = (yield self.env.any_of(requests))
-            received_messages = list(completed_requests.values())
-            log.debug("{} received {}".format(
-                self, received_messages))
-
-            callback(received_messages)
-
-            # Only leave the requests which have not been completed yet
-            remaining_requests = [
-                req for req in requests if req not in completed_requests]
-            # Input queues that have been emptied since the last wake up.
-            emptied_queues = [req.resource for req in completed_requests]
-            # Add new get requests for the input queues that have been emptied.
-            new_requests = []
-            for input_queue in emptied_queues:
-                new_requests.append(input_queue.get())
-            requests = remaining_requests + new_requests
+        for port in self.ports:
+            if port.receive_callback is not None:
+                raise FT4FTTSimException(
+                    "{} is already listening for messages on {}".format(
+                        self, port))
+        dispatcher = _ReceptionDispatcher(self, callback, with_ports)
+        for port in self.ports:
+            port.receive_callback = dispatcher.receive
+            # messages received before the device started listening
+            if port._in_queue is not None:
+                for message in port._in_queue.items:
+                    dispatcher.receive(port, message)
+                del port._in_queue.items[:]
+
+    def start_process(self, generator):
+        """
+        Start a process of the network device.
+
+        The network device is recorded as the owner of the process (see
+        process_owner()), so that the process can be told apart from those
+        of other devices, e.g., to run it only in the partition of the
+        device in a parallel simulation, or to attribute its wall-clock time
+        to the device when profiling.
+
+        Arguments:
+            generator: The generator run by the process.
+
+        Returns:
+            The process, as returned by env.process().
+
+        """
+        process = self.env.process(generator)
+        process.owner = self
+        return process
 
     def instruct_transmission(self, message, port):
         """
@@ -341,21 +840,95 @@ class NetworkDevice(object):
         <Process(instruct_transmission) object at 0x...>
 
         """
-        log.debug("{} instructing transmission of {} on {}".format(
-            self, message, port))
+        log.debug("%s instructing transmission of %s on %s", self, message,
+                  port)
         if port not in self.ports:
             raise FT4FTTSimException("{} is not a port of {}".format(
                 port, self))
-        log.debug("{} queued for transmission".format(message))
-        yield port.out_queue.put(message)
+        log.debug("%s queued for transmission", message)
+        yield port.queue_for_transmission(message)
+
+    def get_state(self):
+        """
+        Return a picklable description of the dynamic state of the
+        NetworkDevice instance, i.e., of everything that changes while the
+        network is simulated (see ft4fttsim.checkpoint).
+
+        Subclasses with more state extend the dictionary returned by the
+        get_state() method of their superclass, and restore it in
+        set_state().
+
+        Returns:
+            A dictionary. Its "ports" key maps to a list with, for each port,
+            a dictionary with the states (see Message.to_state) of the
+            messages in the input queue and in the output queue of the port.
+            Messages waiting to be put into an output queue are included in
+            the order in which they will be put into it.
+
+        Raises:
+            FT4FTTSimException: If frames of a FrameTrain are still to be
+                queued through a port.
+
+        """
+        ports = []
+        for port in self.ports:
+            if port.is_queueing_trains:
+                raise FT4FTTSimException(
+                    "Frame trains are being queued through {}; frame trains "
+                    "in flight cannot be checkpointed".format(port))
+            in_queue = []
+            if port._in_queue is not None:
+                in_queue = port._in_queue.items
+            out_queue = []
+            # skip the output queues of internal channels, which never
+            # hold messages
+            if getattr(port._out_queue, "put_queue", None) is not None:
+                out_queue = (
+                    port._out_queue.items +
+                    [put.item for put in port._out_queue.put_queue])
+            ports.append({
+                "in_queue": [message.to_state() for message in in_queue],
+                "out_queue": [message.to_state() for message in out_queue],
+            })
+        return {"ports": ports}
+
+    def set_state(self, state, devices_by_name):
+        """
+        Restore a state returned by get_state() into the NetworkDevice
+        instance of a newly built network.
+
+        Arguments:
+            state: The state of the NetworkDevice instance.
+            devices_by_name: Dictionary whose keys are the names of the
+                network devices and whose values are the network devices of
+                the network being restored.
+
+        """
+        for port, port_state in zip(self.ports, state["ports"]):
+            for message_state in port_state["in_queue"]:
+                port.deliver(Message.from_state(
+                    self.env, message_state, devices_by_name))
+            for message_state in port_state["out_queue"]:
+                port.out_queue.put(Message.from_state(
+                    self.env, message_state, devices_by_name))
+
+    @property
+    def connected_ports(self):
+        """
+        Returns a list of the ports of the NetworkDevice instance that are
+        connected to a link.
+
+        """
+        return [port for port in self.ports if not port.is_free]
 
     @property
     def input_queues(self):
         """
-        Returns a list of all the input queues of the NetworkDevice instance.
+        Returns a list of the input queues of the connected ports of the
+        NetworkDevice instance.
 
         """
-        return [port.in_queue for port in self.ports]
+        return [port.in_queue for port in self.connected_ports]
 
     def __str__(self):
         return self.name
@@ -382,7 +955,7 @@ class EchoDevice(NetworkDevice):
 
         """
         NetworkDevice.__init__(self, env, name, 1)
-        self.env.process(self.listen_for_messages(self.echo))
+        self.listen_for_messages(self.echo)
 
     def echo(self, messages):
         """
@@ -393,7 +966,7 @@ class EchoDevice(NetworkDevice):
 
         """
         for msg in messages:
-            self.env.process(self.instruct_transmission(msg, self.ports[0]))
+            self.start_process(self.instruct_transmission(msg, self.ports[0]))
 
 
 class MessageRecordingDevice(NetworkDevice):
@@ -418,7 +991,7 @@ class MessageRecordingDevice(NetworkDevice):
         """
         NetworkDevice.__init__(self, env, name, num_ports)
         self.reception_records = {}
-        self.env.process(self.listen_for_messages(self.do_timestamp_messages))
+        self.listen_for_messages(self.do_timestamp_messages)
 
     def do_timestamp_messages(self, messages):
         """
@@ -426,8 +999,23 @@ class MessageRecordingDevice(NetworkDevice):
 
         """
         timestamp = self.env.now
-        self.reception_records[timestamp] = messages
-        log.debug("{} recorded {}".format(self, self.reception_records))
+        self.reception_records.setdefault(timestamp, []).extend(messages)
+        log.debug("%s recorded %s", self, messages)
+
+    def get_state(self):
+        state = super().get_state()
+        state["reception_records"] = dict(
+            (time, [message.to_state() for message in messages])
+            for time, messages in self.reception_records.items())
+        return state
+
+    def set_state(self, state, devices_by_name):
+        super().set_state(state, devices_by_name)
+        self.reception_records = dict(
+            (time, [Message.from_state(self.env, message_state,
+                                       devices_by_name)
+                    for message_state in message_states])
+            for time, message_states in state["reception_records"].items())
 
     @property
     def recorded_messages(self):
@@ -465,7 +1053,7 @@ class MessagePlaybackDevice(NetworkDevice):
 
     def __init__(self, env, name, num_ports):
         NetworkDevice.__init__(self, env, name, num_ports)
-        env.process(self.run())
+        self.start_process(self.run())
         self.transmission_commands = {}
 
     def load_transmission_commands(self, transmission_commands):
@@ -491,23 +1079,29 @@ class MessagePlaybackDevice(NetworkDevice):
 
         """
         self.transmission_commands = transmission_commands
-        log.debug("{} loaded transmissions: {}".format(
-            self, self.transmission_commands))
+        log.debug("%s loaded transmissions: %s", self,
+                  self.transmission_commands)
 
     def run(self):
         """
         Simpy process that executes previously loaded transmission commands.
 
+        Commands for instants of time earlier than the time at which the
+        process starts are skipped, e.g., when the network is restored from
+        a checkpoint.
+
         """
         for time in sorted(self.transmission_commands):
+            if time < self.env.now:
+                continue
             delay_before_next_tx_order = time - self.env.now
-            log.debug("{} waiting for next transmission time".format(self))
+            log.debug("%s waiting for next transmission time", self)
             # wait until next transmission time
             yield self.env.timeout(delay_before_next_tx_order)
             for port, messages_to_tx in \
                     self.transmission_commands[time].items():
                 for message in messages_to_tx:
-                    self.env.process(
+                    self.start_process(
                         self.instruct_transmission(message, port))
 
     @property
@@ -529,7 +1123,38 @@ class MessagePlaybackAndRecordingDevice(
     def __init__(self, env, name, num_ports):
         MessagePlaybackDevice.__init__(self, env, name, num_ports)
         self.reception_records = {}
-        self.env.process(self.listen_for_messages(self.do_timestamp_messages))
+        self.listen_for_messages(self.do_timestamp_messages)
+
+
+def find_output_ports(forwarding_table, destination, default_ports):
+    """
+    Return the ports that according to a forwarding table lead to destination.
+
+    Arguments:
+        forwarding_table: Dictionary whose keys are network devices or
+            multicast groups and whose values are the ports leading to them.
+        destination: an instance of class NetworkDevice, an instance of class
+            MulticastGroup or an iterable of NetworkDevice instances.
+        default_ports: The ports leading to devices that do not appear in the
+            forwarding table.
+
+    Returns:
+        A set of the ports that lead to the devices in 'destination'.
+
+    """
+    try:
+        # destinations with their own entry, e.g., multicast groups
+        return set(forwarding_table[destination])
+    except (KeyError, TypeError):
+        pass
+    output_ports = set()
+    if isinstance(destination, collections.abc.Iterable):
+        for device in destination:
+            # ports leading to device
+            output_ports.update(forwarding_table.get(device, default_ports))
+    else:
+        output_ports.update(forwarding_table.get(destination, default_ports))
+    return output_ports
 
 
 class Switch(NetworkDevice):
@@ -547,18 +1172,28 @@ class Switch(NetworkDevice):
             name: A string used to identify the new switch instance.
             num_ports: The number of ports that the new switch instance should
                 have.
-            forwarding_table: Dictionary whose keys are network devices and
-                whose values are ports of the Switch instance.
+            forwarding_table: Dictionary whose keys are network devices or
+                multicast groups and whose values are ports of the Switch
+                instance.
 
         """
         NetworkDevice.__init__(self, env, name, num_ports)
-        env.process(self.listen_for_messages(self.forward_messages))
+        self.listen_for_messages(
+            self.forward_received_messages, with_ports=True)
         if forwarding_table is None:
             self.forwarding_table = {}
         else:
             self.forwarding_table = forwarding_table
 
-    def forward_messages(self, message_list):
+    def forward_received_messages(self, received):
+        """
+        Forward each message in the list of (port, message) tuples received.
+
+        """
+        for reception_port, message in received:
+            self.forward_messages([message], reception_port)
+
+    def forward_messages(self, message_list, reception_port=None):
         """
         Forward each message in 'message_list' through the appropriate port.
 
@@ -567,40 +1202,89 @@ class Switch(NetworkDevice):
         in the first port, and transmitting the new message instance on the
         second port.
 
+        Arguments:
+            message_list: The messages to forward.
+            reception_port: The port through which the messages were
+                received. Messages are never forwarded through it.
+
         """
 
-        def find_ports(destination):
-            """
-            Return a list of the ports that according to the forwarding table
-            lead to 'destination'.
+        for message in message_list:
+            output_ports = find_output_ports(
+                self.forwarding_table, message.destination, self.ports)
+            output_ports.discard(reception_port)
+            for port in output_ports:
+                new_message = type(message).from_message(message)
+                self.start_process(
+                    self.instruct_transmission(new_message, port))
 
-            Arguments:
-                destination: an instance of class NetworkDevice or an iterable
-                    of NetworkDevice instances.
 
-            Returns:
-                A set of the ports that lead to the devices in 'destination'.
+def process_owner(process):
+    """
+    Return the network device that started process with
+    NetworkDevice.start_process(), or None if the process was started
+    otherwise.
 
-            """
-            output_ports = set()
-            if isinstance(destination, collections.Iterable):
-                for device in destination:
-                    # ports leading to device
-                    ports_towards_device = self.forwarding_table.get(
-                        device, self.ports)
-                    output_ports.update(ports_towards_device)
-            else:
-                output_ports.update(
-                    self.forwarding_table.get(destination, self.ports))
-            return output_ports
+    """
+    return getattr(process, "owner", None)
 
-        for message in message_list:
-            destinations = message.destination
-            output_ports = find_ports(destinations)
-            for port in output_ports:
-                new_message = Message.from_message(message)
-                self.env.process(
-                    self.instruct_transmission(new_message, port))
+
+class MulticastGroup(frozenset):
+    """
+    Models a multicast MAC address, i.e., a named set of network devices.
+
+    A multicast group can be used as the destination of messages. Switches
+    look it up in their forwarding table before looking up its members:
+
+    >>> env = simpy.Environment()
+    >>> d, d2 = NetworkDevice(env, "d", 1), NetworkDevice(env, "d2", 1)
+    >>> group = MulticastGroup("group", [d, d2])
+    >>> sorted(find_output_ports({group: [1], d: [2]}, group, [3]))
+    [1]
+    >>> sorted(find_output_ports({d: [2]}, group, [3]))
+    [2, 3]
+
+    Like multicast MAC addresses, multicast groups with the same members but
+    different names are different groups, and a group is not equal to the
+    plain set of its members.
+
+    """
+
+    def __new__(cls, name, members):
+        group = frozenset.__new__(cls, members)
+        group.name = name
+        return group
+
+    def __init__(self, name, members):
+        frozenset.__init__(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, MulticastGroup):
+            return False
+        return self.name == other.name and frozenset.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.name, frozenset.__hash__(self)))
+
+    def __reduce__(self):
+        return (MulticastGroup, (self.name, list(self)))
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return self.name
+
+
+class _DeviceName(str):
+    """
+    Name of a network device within a message record (see Message.to_record).
+
+    """
+    pass
 
 
 class Message(object):
@@ -654,10 +1338,15 @@ class Message(object):
         self.size_bytes = size_bytes
         self.message_type = message_type
         self.data = data
+        # Instant of time when the message was first handed to a port for
+        # transmission, i.e., None until then, or, for copies made by
+        # switches (see from_message()), when the original message was.
+        # Used to measure end-to-end latencies.
+        self.origin_time = None
         self.name = "({:03d}, {}, {}, {:d}, {}, {})".format(
             self.identifier, self.source, self.destination, self.size_bytes,
             self.message_type, self.data)
-        log.debug("{} created".format(self))
+        log.debug("%s created", self)
 
     @property
     def identifier(self):
@@ -680,8 +1369,91 @@ class Message(object):
             template_message.size_bytes,
             template_message.message_type,
             template_message.data)
+        new_equivalent_message.origin_time = template_message.origin_time
         return new_equivalent_message
 
+    def to_record(self):
+        """
+        Return a picklable record of the message.
+
+        Network devices referenced by the source and destination fields are
+        replaced by their names, so that the record can be turned back into a
+        message of another simulated network with devices of the same names
+        (see from_record()). The data of the message has to be picklable.
+
+        """
+        def device_name(device):
+            if isinstance(device, NetworkDevice):
+                return _DeviceName(device.name)
+            return device
+
+        if isinstance(self.destination, MulticastGroup):
+            destination = MulticastGroup(
+                self.destination.name,
+                [device_name(d) for d in self.destination])
+        elif (isinstance(self.destination, collections.abc.Iterable) and
+                not isinstance(self.destination, str)):
+            destination = [device_name(d) for d in self.destination]
+        else:
+            destination = device_name(self.destination)
+        return (device_name(self.source), destination, self.size_bytes,
+                self.message_type, self.data)
+
+    @classmethod
+    def from_record(cls, env, record, devices_by_name):
+        """
+        Create a new message from a record returned by to_record().
+
+        Arguments:
+            env: A simpy.Environment instance.
+            record: The record of the message.
+            devices_by_name: Dictionary whose keys are names of network
+                devices and whose values are the corresponding network
+                devices of the simulated network the message is created for.
+
+        """
+        def device(name):
+            if isinstance(name, _DeviceName):
+                return devices_by_name[name]
+            return name
+
+        source, destination, size_bytes, message_type, data = record[:5]
+        if len(record) > 5:
+            # the record of a FrameTrain, see FrameTrain.to_record()
+            cls = FrameTrain
+        if isinstance(destination, MulticastGroup):
+            destination = MulticastGroup(
+                destination.name, [device(d) for d in destination])
+        elif isinstance(destination, list):
+            destination = [device(d) for d in destination]
+        else:
+            destination = device(destination)
+        return cls(env, device(source), destination, size_bytes, message_type,
+                   data, *record[5:])
+
+    def to_state(self):
+        """
+        Return a picklable state of the message for checkpoints and for
+        messages crossing partitions of a parallel simulation: its record
+        (see to_record()) and its origin time.
+
+        """
+        return (self.to_record(), self.origin_time)
+
+    @classmethod
+    def from_state(cls, env, state, devices_by_name):
+        """
+        Create a new message from a state returned by to_state().
+
+        """
+        record, origin_time = state[:2]
+        message = cls.from_record(env, record, devices_by_name)
+        message.origin_time = origin_time
+        if len(state) > 2:
+            # the state of a FrameTrain, see FrameTrain.to_state()
+            message.available_since, message.spacing = state[2:]
+        return message
+
     def __eq__(self, message):
         """
         Returns true if self and message are identical except for the message
@@ -699,3 +1471,168 @@ class Message(object):
 
     def __repr__(self):
         return self.name
+
+
+class FrameTrain(Message):
+    """
+    Models a train of back-to-back Ethernet frames with the same source,
+    destination, size, type and data, e.g., the frames of a bulk transfer.
+
+    A train is transmitted by links, received and forwarded by switches as a
+    single message, so that it costs about as much to simulate as a single
+    frame. The times of its frames are computed in closed form instead: the
+    frames of a train become available to the device holding it one after
+    another, frame k at available_since + k * spacing. For a train created by
+    a device all the frames are available right away. Once a train has been
+    received, available_since is the instant of time when its first frame
+    was received and spacing the interval between the receptions of its
+    frames, so devices receive a train when its first frame arrives:
+
+    >>> env = simpy.Environment()
+    >>> d = NetworkDevice(env, "some device", 1)
+    >>> d2 = MessageRecordingDevice(env, "another device", 1)
+    >>> L = Link(env, d.ports[0], d2.ports[0], 100, 3)
+    >>> train = FrameTrain(env, d, d2, 1242, "bulk", num_frames=3)
+    >>> p = env.process(d.instruct_transmission(train, d.ports[0]))
+    >>> env.run()
+    >>> d2.recorded_timestamps
+    [103.0]
+    >>> [round(time, 2) for time in train.frame_times()]
+    [103.0, 206.96, 310.92]
+
+    A train is split automatically when it meets contention, i.e., when
+    another message is queued for transmission through the port of the train
+    before all the frames of the train are available: the frames that only
+    become available after the message are split off into a new train, which
+    is queued once its first frame becomes available (see
+    Port.queue_for_transmission()). The copies of the train that switches
+    are already forwarding are truncated accordingly, since the frames split
+    off reach them later. Trains that keep contending with each other are
+    thus split into ever smaller trains, down to single frames, and remain
+    exact.
+
+    Frame trains cannot be checkpointed while in flight, nor cross the
+    partitions of a parallel simulation.
+
+    """
+
+    def __init__(
+            self, env, source, destination, size_bytes, message_type,
+            data=None, num_frames=1):
+        """
+        Create an instance of FrameTrain.
+
+        Arguments:
+            num_frames: The number of frames of the train.
+
+        The other arguments are those of Message and apply to every frame of
+        the train.
+
+        """
+        if not isinstance(num_frames, int) or num_frames < 0:
+            raise FT4FTTSimException(
+                "The number of frames must be a non-negative integer")
+        Message.__init__(self, env, source, destination, size_bytes,
+                         message_type, data)
+        self.num_frames = num_frames
+        self.available_since = env.now
+        self.spacing = 0
+        # Functions called with a number of frames whenever the train is
+        # truncated or split to that number of frames: the truncate() methods
+        # of its copies and the _Sublink transmitting it.
+        self.truncation_listeners = []
+        # (number of frames, remainder) tuples of the remainders split off
+        # the train (see split()).
+        self._remainders = []
+        self.name = "{} x {}".format(self.name, num_frames)
+
+    @classmethod
+    def from_message(cls, template_message):
+        """
+        Creates a copy of a train, e.g., to forward it, that is truncated
+        whenever the train is truncated.
+
+        """
+        new_train = cls(
+            template_message.env,
+            template_message.source,
+            template_message.destination,
+            template_message.size_bytes,
+            template_message.message_type,
+            template_message.data,
+            template_message.num_frames)
+        new_train.origin_time = template_message.origin_time
+        new_train.spacing = template_message.spacing
+        template_message.truncation_listeners.append(new_train.truncate)
+        return new_train
+
+    def frame_times(self):
+        """
+        Return the instants of time when the frames of the train become
+        available.
+
+        """
+        return [self.available_since + k * self.spacing
+                for k in range(self.num_frames)]
+
+    def truncate(self, num_frames):
+        """
+        Drop the frames of the train from frame number num_frames on.
+
+        Copies of the train (see from_message()) are truncated to the same
+        number of frames, and remainders (see split()) lose the frames past
+        num_frames of the train they were split from.
+
+        """
+        self._shorten(num_frames)
+        for offset, remainder in self._remainders:
+            remainder.truncate(num_frames - offset)
+
+    def _shorten(self, num_frames):
+        self.num_frames = max(0, min(self.num_frames, num_frames))
+        for listener in list(self.truncation_listeners):
+            listener(num_frames)
+
+    def split(self, num_frames, available_since, spacing):
+        """
+        Shorten the train to its first num_frames frames and return a new
+        train with the remaining frames. Copies of the train are truncated,
+        but the remainders split off the train before are kept.
+
+        Arguments:
+            num_frames: The number of frames left in the train.
+            available_since: The instant of time when the first frame of the
+                new train becomes available.
+            spacing: The interval between the frames of the new train.
+
+        """
+        remainder = FrameTrain(
+            self.env, self.source, self.destination, self.size_bytes,
+            self.message_type, self.data, self.num_frames - num_frames)
+        remainder.origin_time = self.origin_time
+        remainder.available_since = available_since
+        remainder.spacing = spacing
+        self._shorten(num_frames)
+        self._remainders.append((num_frames, remainder))
+        return remainder
+
+    def to_record(self):
+        """
+        Return a picklable record of the train: the record of a message (see
+        Message.to_record()) followed by the number of frames.
+
+        """
+        return Message.to_record(self) + (self.num_frames,)
+
+    def to_state(self):
+        """
+        Return the state of a message (see Message.to_state()) followed by
+        available_since and spacing.
+
+        """
+        return (self.to_record(), self.origin_time, self.available_since,
+                self.spacing)
+
+    def __eq__(self, message):
+        return (Message.__eq__(self, message) and
+                self.num_frames == getattr(message, "num_frames", None))
@@ -0,0 +1,521 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+This module provides a conservative parallel simulation of a network.
+
+The network devices of a simulated network are partitioned and each partition
+is simulated by a separate worker process in its own simpy environment. The
+partitions are cut at links. A message transmitted over a link whose
+receiving end belongs to another partition is handed to the worker of that
+partition as soon as its transmission starts, together with the instant of
+time when it is to be received.
+
+The workers are synchronized in windows. The lookahead of a cut link is the
+smallest time that a message needs to cross it, i.e., its propagation delay
+plus the transmission time of a minimum size frame, and the distance from one
+partition to another is the smallest sum of the lookaheads of the cut links
+that a message must cross to get from the first to the second. In each window
+every worker processes the events earlier than the earliest pending event of
+each partition plus the distance from that partition to its own, which
+includes its own partition through any cycle back to it. No message received
+from another worker can therefore lie within the window being processed.
+
+A partition that no message can reach from the busy partitions, or only
+across long distances, thus processes many lookaheads worth of events per
+window instead of a single one, e.g., all of its events in a single window if
+it only transmits to other partitions but never receives from them.
+
+"""
+
+import collections
+import heapq
+import multiprocessing
+
+import simpy
+from simpy.events import NORMAL
+
+import ft4fttsim.ethernet as ethernet
+import ft4fttsim.simlogging
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import NetworkDevice, Message, process_owner
+from ft4fttsim.simlogging import log
+
+
+def link_lookahead(link):
+    """
+    Return the minimum time that a message needs to be received after its
+    transmission on link starts, in units of the time base of the link's
+    environment.
+
+    Example:
+
+    >>> from ft4fttsim.networking import Link
+    >>> env = simpy.Environment()
+    >>> d1 = NetworkDevice(env, "some device", 1)
+    >>> d2 = NetworkDevice(env, "another device", 1)
+    >>> link_lookahead(Link(env, d1.ports[0], d2.ports[0], 100, 3))
+    8.76
+
+    """
+    min_bytes_to_transmit = (ethernet.PREAMBLE_SIZE_BYTES +
+                             ethernet.SFD_SIZE_BYTES +
+                             ethernet.MIN_FRAME_SIZE_BYTES)
+    return (link.transmission_time(min_bytes_to_transmit) +
+            link.propagation_delay)
+
+
+def _distances(lookaheads):
+    """
+    Return the distances between partitions.
+
+    Arguments:
+        lookaheads: A matrix (list of lists) whose element [i][j] is the
+            smallest lookahead of the links from partition i to partition j,
+            or infinity if there are none.
+
+    Returns:
+        A matrix whose element [i][j] is the smallest sum of lookaheads along
+        a path from partition i to partition j, or infinity if there is no
+        path. Element [i][i] is that of the shortest cycle through i.
+
+    Example:
+
+    >>> inf = float("inf")
+    >>> _distances([[inf, 1, inf], [2, inf, inf], [inf, 5, inf]])
+    [[3, 1, inf], [2, 3, inf], [7, 5, inf]]
+
+    """
+    distances = [list(row) for row in lookaheads]
+    num_partitions = len(distances)
+    for k in range(num_partitions):
+        for i in range(num_partitions):
+            for j in range(num_partitions):
+                through_k = distances[i][k] + distances[k][j]
+                if through_k < distances[i][j]:
+                    distances[i][j] = through_k
+    return distances
+
+
+def _device_of_port(devices):
+    """
+    Return a dictionary whose keys are the ports of devices and whose values
+    are the devices the ports belong to.
+
+    """
+    return dict((port, device) for device in devices for port in device.ports)
+
+
+def _link_ends(link, device_of_port):
+    """
+    Return the two devices connected by link.
+
+    """
+    sublink = link.sublink[0]
+    return (device_of_port[sublink.transmitter_port],
+            device_of_port[sublink.receiver_port])
+
+
+def partition_network(devices, links, num_partitions):
+    """
+    Partition the devices of a network so that each partition can be
+    simulated by a separate worker.
+
+    Devices connected by links with zero lookahead, and devices whose ports
+    are connected directly to each other without a link (e.g., an FT4FTT
+    switch and its embedded master), always end up in the same partition. The
+    remaining devices are visited breadth-first and assigned to partitions in
+    that order, so that each partition gets a connected part of the network
+    of about the same number of devices.
+
+    Arguments:
+        devices: The network devices of the network.
+        links: The links of the network.
+        num_partitions: The number of partitions to create.
+
+    Returns:
+        A list of at most num_partitions lists of device names.
+
+    """
+    device_of_port = _device_of_port(devices)
+    neighbors = dict((device, []) for device in devices)
+    # devices that cannot be separated, keyed by device
+    group = dict((device, [device]) for device in devices)
+
+    def merge(device1, device2):
+        group1, group2 = group[device1], group[device2]
+        if group1 is not group2:
+            group1.extend(group2)
+            for device in group2:
+                group[device] = group1
+
+    for link in links:
+        device1, device2 = _link_ends(link, device_of_port)
+        neighbors[device1].append(device2)
+        neighbors[device2].append(device1)
+        if link_lookahead(link) <= 0:
+            merge(device1, device2)
+    for port, device in device_of_port.items():
+        if port.is_free:
+            continue
+        # Output queues of ports connected directly to another port deliver
+        # to that port instead of being emptied by a _Sublink.
+        receiver_port = getattr(port.out_queue, "receiver_port", None)
+        if receiver_port in device_of_port:
+            merge(device, device_of_port[receiver_port])
+
+    # groups in breadth-first order
+    ordered_groups = []
+    visited_group_ids = set()
+    for start in devices:
+        if id(group[start]) in visited_group_ids:
+            continue
+        visited_group_ids.add(id(group[start]))
+        queue = collections.deque([group[start]])
+        while queue:
+            current_group = queue.popleft()
+            ordered_groups.append(current_group)
+            for device in current_group:
+                for neighbor in neighbors[device]:
+                    if id(group[neighbor]) not in visited_group_ids:
+                        visited_group_ids.add(id(group[neighbor]))
+                        queue.append(group[neighbor])
+
+    partitions = []
+    target_size = -(-len(devices) // num_partitions)
+    current = []
+    for devices_group in ordered_groups:
+        current.extend(device.name for device in devices_group)
+        if (len(current) >= target_size and
+                len(partitions) < num_partitions - 1):
+            partitions.append(current)
+            current = []
+    if current:
+        partitions.append(current)
+    return partitions
+
+
+class _PartitionEnvironment(simpy.Environment):
+    """
+    Environment of a worker that only runs the processes of its partition.
+
+    While the network is being built, processes are not started but only
+    recorded. Once the partition is known, start_partition() starts those
+    that belong to network devices of the partition, i.e., that were started
+    with NetworkDevice.start_process(). Processes that do not belong to a
+    network device are started in the first partition only.
+
+    _Sublinks are not processes and wait for messages in every partition,
+    but only those whose transmitter port belongs to a device of the
+    partition ever get messages to transmit.
+
+    """
+
+    def __init__(self):
+        simpy.Environment.__init__(self)
+        self._building = True
+        # (generator, placeholder) tuples of the recorded processes
+        self._deferred_processes = []
+
+    def process(self, generator):
+        if self._building:
+            # placeholder for the value normally returned by process(), whose
+            # owner is set by NetworkDevice.start_process()
+            placeholder = self.event()
+            self._deferred_processes.append((generator, placeholder))
+            return placeholder
+        return simpy.Environment.process(self, generator)
+
+    def start_partition(self, owned_names, is_first_partition):
+        """
+        Start the recorded processes that belong to the partition.
+
+        """
+        self._building = False
+        for generator, placeholder in self._deferred_processes:
+            owner = process_owner(placeholder)
+            if owner is not None:
+                is_owned = owner.name in owned_names
+            else:
+                is_owned = is_first_partition
+            if is_owned:
+                process = simpy.Environment.process(self, generator)
+                process.owner = owner
+            else:
+                generator.close()
+        self._deferred_processes = []
+
+    def timeout_at(self, time):
+        """
+        Return an event that is triggered at the absolute time given.
+
+        Unlike timeout(time - now), the event is scheduled at exactly the
+        given time, without the rounding error of the subtraction, so that
+        imported receptions happen at the same instant as in a sequential
+        simulation.
+
+        """
+        event = self.event()
+        event._ok = True
+        event._value = None
+        heapq.heappush(self._queue, (time, NORMAL, next(self._eid), event))
+        return event
+
+
+def _build(build_network, env):
+    """
+    Build the network with build_network() and check the result.
+
+    Returns:
+        A (devices, links) tuple of lists.
+
+    """
+    devices, links = build_network(env)
+    devices, links = list(devices), list(links)
+    names = [device.name for device in devices]
+    if len(set(names)) != len(names):
+        raise FT4FTTSimException(
+            "Device names must be unique to simulate a network in parallel.")
+    return devices, links
+
+
+def summarize_device(device):
+    """
+    Default summary of a device returned by ParallelSimulation.run().
+
+    Returns:
+        For devices that record messages, a dictionary whose keys are the
+        instants of time when messages were received and whose values are
+        lists of records (see Message.to_record) of the received messages.
+        None for other devices.
+
+    """
+    reception_records = getattr(device, "reception_records", None)
+    if reception_records is None:
+        return None
+    return dict(
+        (time, [message.to_record() for message in messages])
+        for time, messages in reception_records.items())
+
+
+def _worker_main(build_network, summarize, owned_names, is_first_partition,
+                 connection):
+    """
+    Main function of the worker process simulating one partition.
+
+    The worker executes the commands received through connection:
+
+        ("advance", horizon, imports): schedule the reception of the imported
+            messages and process all events earlier than horizon. Then reply
+            with the time of the next event and the exported messages.
+        ("finish",): reply with the summaries of the devices of the partition
+            and terminate.
+
+    """
+    env = _PartitionEnvironment()
+    ft4fttsim.simlogging.env = env
+    devices, links = _build(build_network, env)
+    devices_by_name = dict((device.name, device) for device in devices)
+    device_of_port = _device_of_port(devices)
+    exports = []
+
+    def exporter(link_index, direction):
+        def export(sublink, message, reception_time):
+            exports.append((link_index, direction, reception_time,
+                            message.to_state()))
+        return export
+
+    for link_index, link in enumerate(links):
+        for direction, sublink in enumerate(link.sublink):
+            transmitter = device_of_port[sublink.transmitter_port]
+            receiver = device_of_port[sublink.receiver_port]
+            if (transmitter.name in owned_names and
+                    receiver.name not in owned_names):
+                sublink.remote_delivery = exporter(link_index, direction)
+    env.start_partition(owned_names, is_first_partition)
+
+    def deliver(port, message):
+        return lambda event: port.deliver(message)
+
+    while True:
+        command = connection.recv()
+        if command[0] == "finish":
+            connection.send(dict(
+                (name, summarize(devices_by_name[name]))
+                for name in owned_names))
+            break
+        _, horizon, imports = command
+        for link_index, direction, reception_time, message_state in imports:
+            message = Message.from_state(env, message_state, devices_by_name)
+            port = links[link_index].sublink[direction].receiver_port
+            reception = env.timeout_at(reception_time)
+            reception.callbacks.append(deliver(port, message))
+        while env.peek() < horizon:
+            env.step()
+        connection.send((env.peek(), exports[:]))
+        del exports[:]
+    connection.close()
+
+
+class ParallelSimulation(object):
+    """
+    Simulates a network in parallel on several worker processes.
+
+    The network is described by a function that builds it, so that each
+    worker can build its own copy of the network in its own environment and
+    simulate its partition of it:
+
+        def build_network(env):
+            ...
+            return devices, links
+
+    The function must return all the network devices and all the links of
+    the network, give each network device a unique name, and build the same
+    network every time it is called. It must be picklable (i.e., a module
+    level function) if worker processes are not created by forking. The data
+    of messages crossing partitions must be picklable as well.
+
+    Messages received by a device from another partition are received at the
+    same instant of time as in a sequential simulation, but possibly in a
+    different order relative to other events of that same instant of time.
+
+    """
+
+    def __init__(self, build_network, num_partitions,
+                 summarize=summarize_device):
+        """
+        Create a new instance of class ParallelSimulation.
+
+        Arguments:
+            build_network: The function that builds the network.
+            num_partitions: The maximum number of partitions, i.e., of worker
+                processes, to use.
+            summarize: Function called with each network device after the
+                simulation to obtain a picklable summary of it.
+
+        """
+        if num_partitions < 1:
+            raise FT4FTTSimException("At least one partition is needed.")
+        self.build_network = build_network
+        self.summarize = summarize
+        env = _PartitionEnvironment()
+        devices, links = _build(build_network, env)
+        self.partitions = partition_network(devices, links, num_partitions)
+        partition_of = dict(
+            (name, index) for index, partition in enumerate(self.partitions)
+            for name in partition)
+        device_of_port = _device_of_port(devices)
+        # Dictionary whose keys are (link index, direction) tuples of the
+        # _Sublinks crossing partitions and whose values are the indexes of
+        # the receiving partitions.
+        self._receiving_partition = {}
+        self.lookahead = float("inf")
+        lookaheads = [[float("inf")] * len(self.partitions)
+                      for _ in self.partitions]
+        for link_index, link in enumerate(links):
+            for direction, sublink in enumerate(link.sublink):
+                transmitter = device_of_port[sublink.transmitter_port]
+                receiver = device_of_port[sublink.receiver_port]
+                source = partition_of[transmitter.name]
+                destination = partition_of[receiver.name]
+                if source != destination:
+                    self._receiving_partition[(link_index, direction)] = (
+                        destination)
+                    lookahead = link_lookahead(link)
+                    self.lookahead = min(self.lookahead, lookahead)
+                    lookaheads[source][destination] = min(
+                        lookaheads[source][destination], lookahead)
+        # element [i][j] is the distance from partition i to partition j
+        self._distances = _distances(lookaheads)
+        # number of windows of the last run
+        self.num_windows = 0
+
+    def run(self, until=float("inf")):
+        """
+        Simulate the network until the given instant of time.
+
+        Returns:
+            A dictionary whose keys are the names of the network devices and
+            whose values are their summaries.
+
+        """
+        context = multiprocessing.get_context()
+        connections = []
+        workers = []
+        for index, partition in enumerate(self.partitions):
+            parent_end, worker_end = context.Pipe()
+            worker = context.Process(
+                target=_worker_main,
+                args=(self.build_network, self.summarize, set(partition),
+                      index == 0, worker_end))
+            worker.start()
+            worker_end.close()
+            connections.append(parent_end)
+            workers.append(worker)
+        try:
+            self._synchronize(connections, until)
+            summaries = {}
+            for connection in connections:
+                connection.send(("finish",))
+            for connection in connections:
+                summaries.update(connection.recv())
+        finally:
+            for worker in workers:
+                worker.join()
+        return summaries
+
+    def _synchronize(self, connections, until):
+        """
+        Advance the workers window by window until the given instant of time.
+
+        """
+        self.num_windows = 0
+        num_partitions = len(connections)
+        partitions = range(num_partitions)
+        imports = [[] for _ in partitions]
+        next_event_times = self._advance(
+            connections, [0] * num_partitions, imports)
+        while True:
+            # earliest pending event of each partition, imports included
+            earliest = list(next_event_times)
+            for destination, partition_imports in enumerate(imports):
+                for _, _, reception_time, _ in partition_imports:
+                    earliest[destination] = min(earliest[destination],
+                                                reception_time)
+            if min(earliest) >= until:
+                break
+            horizons = [
+                min([until] + [earliest[source] +
+                               self._distances[source][destination]
+                               for source in partitions])
+                for destination in partitions]
+            log.debug("advancing partitions to %s", horizons)
+            next_event_times = self._advance(connections, horizons, imports)
+        if until != float("inf"):
+            self._advance(connections, [until] * num_partitions, imports)
+
+    def _advance(self, connections, horizons, imports):
+        """
+        Let each worker process the events earlier than its horizon in
+        horizons.
+
+        The messages in imports are handed to the workers first. imports is
+        then refilled with the messages exported by the workers.
+
+        Returns:
+            A list with the time of the next event of each worker.
+
+        """
+        self.num_windows += 1
+        for connection, horizon, partition_imports in zip(
+                connections, horizons, imports):
+            connection.send(("advance", horizon, partition_imports[:]))
+            del partition_imports[:]
+        next_event_times = []
+        for connection in connections:
+            next_event_time, exports = connection.recv()
+            next_event_times.append(next_event_time)
+            for export in exports:
+                link_index, direction = export[:2]
+                receiving_partition = self._receiving_partition[
+                    (link_index, direction)]
+                imports[receiving_partition].append(export)
+        return next_event_times
@@ -0,0 +1,273 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Profiler that attributes the wall-clock time of a simulation to the network
+devices and links of the network.
+
+A Python profiler shows that time is spent in, e.g.,
+_Sublink.start_transmission or Switch.forward_received_messages, but not on
+behalf of which sublink or switch. A Profiler runs the simulation in place
+of env.run(), one event at a time, and times each callback of the events it
+processes. Each callback is attributed to the component it belongs to:
+
+    - callbacks of sublinks (e.g., the start and end of transmissions) to
+      the sublink,
+    - resumptions of processes to the network device that started them
+      with NetworkDevice.start_process(), e.g., to the master whose run()
+      method the process is executing,
+    - the delivery of the messages received at an instant of time (see
+      NetworkDevice.listen_for_messages) to the receiving device, and
+    - callbacks of ports and of their input and output queues to the device
+      of the port, if the devices are given.
+
+Callbacks that do not belong to a network device or to a sublink, e.g.,
+processes of plain functions, are attributed to "other":
+
+    profiler = Profiler(env, devices)
+    profiler.run(until=10000)
+    print(profiler.report())
+    profiler.write_collapsed_stacks("profile.folded")
+
+The collapsed stacks file has a line per component and function with the
+microseconds spent in it, as expected by flame graph tools (e.g.,
+flamegraph.pl profile.folded > profile.svg).
+
+Timing every callback roughly doubles the cost of an event. For long runs,
+sample_every=N times only one event in N on average, and the wall times and
+the event counts of the components are estimated by scaling those of the
+sampled events by N. The numbers of events skipped between samples are
+geometrically distributed and drawn from a random generator seeded with
+seed, rather than fixed, so that the sampled events do not alias with
+periodic patterns of the simulation, e.g., with the events of each
+elementary cycle.
+
+"""
+
+from collections import namedtuple
+import math
+import random
+import time
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import (
+    NetworkDevice, Port, _ReceptionDispatcher, _Sublink, process_owner)
+
+
+# Profile of a component. kind is the name of its class (or "other"), name
+# its name, num_events the number of callbacks of events attributed to it and
+# wall_time_s the wall-clock time spent in them.
+ComponentProfile = namedtuple(
+    "ComponentProfile", "kind, name, num_events, wall_time_s")
+
+
+# key of the callbacks that do not belong to any component
+_OTHER = ("other", "other")
+
+
+class Profiler(object):
+    """
+    Runs a simulation while attributing the wall-clock time of the callbacks
+    of its events to network devices and sublinks.
+
+    """
+
+    def __init__(self, env, devices=(), sample_every=1, seed=0):
+        """
+        Arguments:
+            env: The simpy.Environment or ft4fttsim.kernel.Environment
+                instance of the simulation.
+            devices: The network devices of the network, used to attribute
+                the callbacks of ports and of their queues to the devices.
+            sample_every: Time one event in sample_every on average.
+            seed: The seed of the random generator that chooses the sampled
+                events.
+
+        Raises:
+            FT4FTTSimException: If sample_every is smaller than 1.
+
+        """
+        if sample_every < 1:
+            raise FT4FTTSimException("sample_every must be at least 1")
+        self.env = env
+        self.sample_every = sample_every
+        self._random = random.Random(seed)
+        # Number of the next event to be sampled, counting from 1.
+        self._next_sampled_event = self._num_events_to_next_sample()
+        self._device_of_port = dict(
+            (port, device) for device in devices for port in device.ports)
+        # Dictionary whose keys are the input and output queues of the ports
+        # and whose values are the devices of the ports, or None for queues
+        # of unknown ports. Since the queues of the ports are created when
+        # they are first used, it is updated whenever a queue is missing.
+        self._device_of_queue = {}
+        # Number of events processed by run().
+        self.num_events = 0
+        # Wall-clock time spent in run().
+        self.wall_time_s = 0.0
+        # Dictionary whose keys are (kind, name) tuples of components and
+        # whose values are dictionaries whose keys are stacks of function
+        # names and whose values are [number of callbacks, wall time] lists
+        # of the sampled events.
+        self._samples = {}
+
+    def attribute(self, callback):
+        """
+        Return the component a callback belongs to and the names of the
+        functions it runs.
+
+        Returns:
+            A (component, stack) tuple. component is None for callbacks that
+            do not belong to a network device or to a sublink.
+
+        """
+        owner = getattr(callback, "__self__", None)
+        generator = getattr(owner, "_generator", None)
+        if generator is not None:
+            # resumption of a process, which belongs to the device that
+            # started it
+            stack = []
+            while generator is not None:
+                stack.append(generator.__name__)
+                generator = getattr(generator, "gi_yieldfrom", None)
+            return process_owner(owner), tuple(stack)
+        if isinstance(owner, _ReceptionDispatcher):
+            return owner.device, (
+                "listen_for_messages",
+                getattr(owner.callback, "__name__", "callback"))
+        if isinstance(owner, Port):
+            owner = self._device_of_port.get(owner, owner)
+        elif owner is not None and hasattr(owner, "put_queue"):
+            owner = self.device_of_queue(owner)
+        name = getattr(callback, "__name__", type(callback).__name__)
+        return owner, (name,)
+
+    def device_of_queue(self, queue):
+        """
+        Return the device of the port whose input or output queue is queue,
+        or None if it is not the queue of a port of the devices.
+
+        """
+        if queue not in self._device_of_queue:
+            for port, device in self._device_of_port.items():
+                for port_queue in [port._in_queue, port._out_queue]:
+                    if port_queue is not None:
+                        self._device_of_queue[port_queue] = device
+            self._device_of_queue.setdefault(queue, None)
+        return self._device_of_queue[queue]
+
+    def _num_events_to_next_sample(self):
+        """
+        Return the number of events from the last sampled event to the next
+        one, which is geometrically distributed with mean sample_every.
+
+        """
+        if self.sample_every == 1:
+            return 1
+        # inverse transform sampling; 1 - random() is in (0, 1]
+        return 1 + int(math.log(1 - self._random.random()) /
+                       math.log(1 - 1 / self.sample_every))
+
+    def _key(self, component):
+        if isinstance(component, (NetworkDevice, _Sublink, Port)):
+            return type(component).__name__, str(component)
+        return _OTHER
+
+    def _timed(self, callback):
+        component, stack = self.attribute(callback)
+        samples = self._samples.setdefault(self._key(component), {})
+        sample = samples.setdefault(stack, [0, 0.0])
+
+        def timed_callback(event):
+            start = time.perf_counter()
+            try:
+                callback(event)
+            finally:
+                sample[0] += 1
+                sample[1] += time.perf_counter() - start
+        return timed_callback
+
+    def run(self, until=None):
+        """
+        Run the simulation like env.run(until).
+
+        """
+        env = self.env
+        limit = float("inf") if until is None else until
+        start = time.perf_counter()
+        try:
+            kernel.skip_stop_event(env)
+            while env.peek() < limit:
+                self.num_events += 1
+                if self.num_events == self._next_sampled_event:
+                    self._next_sampled_event += (
+                        self._num_events_to_next_sample())
+                    event = kernel.next_event(env)
+                    if event.callbacks:
+                        event.callbacks = [self._timed(callback)
+                                           for callback in event.callbacks]
+                env.step()
+            if until is not None:
+                # advance the time to until
+                env.run(until=until)
+        finally:
+            self.wall_time_s += time.perf_counter() - start
+
+    def components(self):
+        """
+        Return the profiles of the components, from the most to the least
+        time consuming.
+
+        Returns:
+            A list of ComponentProfile instances. With sampling, their event
+            counts and wall times are estimates.
+
+        """
+        profiles = []
+        for (kind, name), samples in self._samples.items():
+            num_events = sum(count for count, _ in samples.values())
+            wall_time_s = sum(wall_time for _, wall_time in samples.values())
+            profiles.append(ComponentProfile(
+                kind, name, num_events * self.sample_every,
+                wall_time_s * self.sample_every))
+        profiles.sort(key=lambda profile: profile.wall_time_s, reverse=True)
+        return profiles
+
+    def report(self):
+        """
+        Return a table of the components as a string.
+
+        """
+        profiles = self.components()
+        attributed_s = sum(profile.wall_time_s for profile in profiles)
+        total_s = max(self.wall_time_s, attributed_s, 1e-12)
+        lines = ["{:<16} {:<40} {:>10} {:>10} {:>6}".format(
+            "kind", "name", "events", "time (s)", "%")]
+        for profile in profiles:
+            lines.append("{:<16} {:<40} {:>10} {:>10.4f} {:>6.1f}".format(
+                profile.kind, profile.name, profile.num_events,
+                profile.wall_time_s, 100 * profile.wall_time_s / total_s))
+        lines.append("{} events in {:.4f} s, {:.4f} s in the event "
+                     "loop".format(self.num_events, self.wall_time_s,
+                                   max(self.wall_time_s - attributed_s, 0)))
+        return "\n".join(lines)
+
+    def collapsed_stacks(self):
+        """
+        Return the lines of the collapsed stacks file, i.e., the component
+        kind, component name and function names separated by semicolons,
+        followed by the microseconds spent in them.
+
+        """
+        lines = []
+        for (kind, name), samples in sorted(self._samples.items()):
+            for stack, (_, wall_time_s) in sorted(samples.items()):
+                frames = [kind, name] + list(stack)
+                lines.append("{} {}".format(
+                    ";".join(frame.replace(";", ",") for frame in frames),
+                    int(round(wall_time_s * self.sample_every * 1e6))))
+        return lines
+
+    def write_collapsed_stacks(self, path):
+        with open(path, "w") as stacks_file:
+            for line in self.collapsed_stacks():
+                stacks_file.write(line + "\n")
@@ -0,0 +1,544 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Real-time simulation, to connect simulated networks to software running on
+the same host, e.g., a software implementation of an FTT slave.
+
+A RealtimePacer processes the events of an environment no earlier than
+their instant of time on the wall clock. A SocketBridge is a network device
+that stands for an external program: the messages it receives from the
+simulated network are sent to the program through a datagram socket, a UNIX
+socket or a UDP socket on the loopback interface, and the frames the program
+sends through the socket are transmitted by the bridge into the simulated
+network as soon as the pacer reads them:
+
+    program, bridge_end = socket.socketpair(socket.AF_UNIX,
+                                            socket.SOCK_DGRAM)
+    bridge = SocketBridge(env, "slave3", bridge_end)
+    ... build the rest of the network, with bridge in place of slave3 ...
+    bridge.devices_by_name = devices_by_name
+    pacer = RealtimePacer(env, bridges=[bridge])
+    stats = pacer.run(until=10 ** 6)
+    print(stats.num_misses, stats.max_lag_s)
+
+The pacer steps the environment itself instead of using
+simpy.rt.RealtimeEnvironment, so that it paces ft4fttsim.kernel
+environments too, waits for the sockets of the bridges rather than sleeping,
+and measures how late every instant of time is processed instead of giving
+up at the first one that is too late.
+
+run() waits for the sockets with a selector of its own. To run the
+simulation in the asyncio event loop of the external program instead, e.g.,
+when the program is written with asyncio and runs in the same process, use
+
+    stats = await pacer.run_async(until=10 ** 6)
+
+which waits for the sockets with loop.add_reader(). It therefore needs an
+event loop that supports add_reader(), i.e., not the proactor event loop of
+Windows.
+
+Frames are encoded in batches: a datagram is the UTF-8 JSON array of the
+frames of one instant of time. Every frame is a [source, destination,
+size_bytes, message_type, data] array like the records of Message.to_record(),
+where network devices are given by their names, multicast destinations by
+{"group": name, "members": [names]} objects, and data of the classes in
+DATA_TYPES by {"type": class name, "fields": [fields]} objects. Arrays in
+data are decoded as tuples.
+
+"""
+
+import asyncio
+from collections import namedtuple
+import json
+import math
+import selectors
+import time
+
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.ft4ftt import (
+    ECLayout, SyncStreamConfig, TriggerMessageData, UpdateCounts)
+from ft4fttsim.networking import NetworkDevice, Message, MulticastGroup
+from ft4fttsim.simlogging import log
+import ft4fttsim.timebase as timebase
+
+
+# Largest payload of a UDP datagram.
+MAX_DATAGRAM_BYTES = 65507
+
+# Named tuple classes of message data that are encoded with their class
+# names, so that they are decoded into instances of the same classes: a
+# dictionary whose keys are the names and whose values are the classes.
+DATA_TYPES = dict((data_type.__name__, data_type) for data_type in (
+    ECLayout, SyncStreamConfig, TriggerMessageData, UpdateCounts))
+
+
+# Statistics of the pacing of a RealtimePacer. num_deadlines is the number
+# of instants of time processed, and num_misses the number of them that
+# were processed later than the tolerance of the pacer. mean_lag_s and
+# max_lag_s are the mean and the maximum delay of their processing with
+# respect to the wall clock, in seconds, and wall_time_s the wall clock time
+# of the run.
+PacingStats = namedtuple(
+    "PacingStats",
+    "num_deadlines, num_misses, mean_lag_s, max_lag_s, wall_time_s")
+
+
+def _encode_data(data):
+    name = type(data).__name__
+    if DATA_TYPES.get(name) is type(data):
+        return {"type": name, "fields": [_encode_data(field)
+                                         for field in data]}
+    if isinstance(data, (tuple, list)):
+        return [_encode_data(item) for item in data]
+    return data
+
+
+def _decode_data(data):
+    if isinstance(data, dict) and "type" in data and "fields" in data:
+        return DATA_TYPES[data["type"]](
+            *[_decode_data(field) for field in data["fields"]])
+    if isinstance(data, list):
+        return tuple(_decode_data(item) for item in data)
+    return data
+
+
+def _encode_address(address):
+    if isinstance(address, NetworkDevice):
+        return address.name
+    if isinstance(address, MulticastGroup):
+        return {"group": address.name,
+                "members": [_encode_address(member) for member in address]}
+    if isinstance(address, (tuple, list)):
+        return [_encode_address(member) for member in address]
+    return address
+
+
+def _decode_address(address, devices_by_name):
+    if isinstance(address, dict):
+        return MulticastGroup(
+            address["group"],
+            [_decode_address(member, devices_by_name)
+             for member in address["members"]])
+    if isinstance(address, list):
+        return [_decode_address(member, devices_by_name)
+                for member in address]
+    return devices_by_name.get(address, address)
+
+
+def _encode_frame(message):
+    return [_encode_address(message.source),
+            _encode_address(message.destination), message.size_bytes,
+            message.message_type, _encode_data(message.data)]
+
+
+def encode_messages(messages):
+    """
+    Encode a batch of messages into a datagram.
+
+    Returns:
+        A bytes instance.
+
+    Raises:
+        FT4FTTSimException: If the addresses, the type or the data of a
+            message cannot be encoded.
+
+    """
+    try:
+        return json.dumps([_encode_frame(message) for message in messages],
+                          separators=(",", ":")).encode("utf-8")
+    except (TypeError, ValueError):
+        # find the message that cannot be encoded
+        for message in messages:
+            try:
+                json.dumps(_encode_frame(message))
+            except (TypeError, ValueError) as error:
+                raise FT4FTTSimException(
+                    "{} cannot be encoded: {}".format(message, error))
+        raise
+
+
+def decode_messages(env, datagram, devices_by_name):
+    """
+    Decode a datagram encoded by encode_messages() into a list of messages.
+
+    Arguments:
+        env: The environment of the messages.
+        datagram: The bytes of the datagram.
+        devices_by_name: Dictionary whose keys are names of network devices
+            and whose values are the network devices that the names in the
+            datagram stand for. Names that are not in it are left as they
+            are.
+
+    Raises:
+        FT4FTTSimException: If the datagram is not a valid batch of frames.
+
+    """
+    try:
+        frames = json.loads(datagram.decode("utf-8"))
+        return [Message(env, _decode_address(source, devices_by_name),
+                        _decode_address(destination, devices_by_name),
+                        size_bytes, message_type, _decode_data(data))
+                for source, destination, size_bytes, message_type, data
+                in frames]
+    except (ValueError, TypeError, KeyError) as error:
+        raise FT4FTTSimException(
+            "Invalid datagram {!r}: {}".format(datagram[:100], error))
+
+
+class SocketBridge(NetworkDevice):
+    """
+    Network device that connects its single port to an external program
+    through a datagram socket.
+
+    """
+
+    def __init__(self, env, name, sock, devices_by_name=None,
+                 max_datagram_bytes=MAX_DATAGRAM_BYTES):
+        """
+        Arguments:
+            env: A simpy.Environment or ft4fttsim.kernel.Environment
+                instance.
+            name: A string used to identify the SocketBridge instance. The
+                external program uses it as its address.
+            sock: A connected datagram socket, e.g., one end of
+                socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) or a UDP
+                socket connected to a port of 127.0.0.1. It is made
+                non-blocking.
+            devices_by_name: Dictionary whose keys are the names of the
+                network devices and whose values are the network devices,
+                used to decode the addresses of the frames of the external
+                program. It can also be set later through the devices_by_name
+                attribute, once the network is built.
+            max_datagram_bytes: The maximum size of the datagrams sent.
+                Batches that do not fit into a datagram are split.
+
+        """
+        NetworkDevice.__init__(self, env, name, 1)
+        self.sock = sock
+        sock.setblocking(False)
+        self.devices_by_name = (
+            {} if devices_by_name is None else devices_by_name)
+        self.max_datagram_bytes = max_datagram_bytes
+        self.num_frames_sent = 0
+        self.num_frames_received = 0
+        # datagrams that could not be sent, e.g., because the external
+        # program was not reading them
+        self.num_datagrams_dropped = 0
+        self.listen_for_messages(self.send_messages)
+
+    def send_messages(self, messages):
+        """
+        Send the messages received from the simulated network at an instant
+        of time to the external program.
+
+        Raises:
+            FT4FTTSimException: If a message cannot be encoded or does not
+                fit into a datagram.
+
+        """
+        datagram = encode_messages(messages)
+        if len(datagram) > self.max_datagram_bytes:
+            if len(messages) == 1:
+                raise FT4FTTSimException(
+                    "{} does not fit into a datagram of {} bytes".format(
+                        messages[0], self.max_datagram_bytes))
+            half = len(messages) // 2
+            self.send_messages(messages[:half])
+            self.send_messages(messages[half:])
+            return
+        try:
+            self.sock.send(datagram)
+        except OSError as error:
+            log.debug("%s dropping datagram: %s", self, error)
+            self.num_datagrams_dropped += 1
+            return
+        self.num_frames_sent += len(messages)
+
+    def receive_datagrams(self):
+        """
+        Return the list of the datagrams sent by the external program that
+        have not been read yet.
+
+        """
+        datagrams = []
+        while True:
+            try:
+                datagrams.append(self.sock.recv(self.max_datagram_bytes))
+            except (BlockingIOError, InterruptedError):
+                return datagrams
+
+    def transmit_datagrams(self, datagrams):
+        """
+        Transmit the frames of datagrams into the simulated network.
+
+        """
+        for datagram in datagrams:
+            messages = decode_messages(self.env, datagram,
+                                       self.devices_by_name)
+            self.num_frames_received += len(messages)
+            for message in messages:
+                self.start_process(
+                    self.instruct_transmission(message, self.ports[0]))
+
+
+class RealtimePacer(object):
+    """
+    Runs a simulation in step with the wall clock and feeds it the frames of
+    socket bridges.
+
+    """
+
+    def __init__(self, env, bridges=(), speed=1.0, tolerance_s=0.001,
+                 poll_interval_s=0.1):
+        """
+        Arguments:
+            env: The simpy.Environment or ft4fttsim.kernel.Environment
+                instance of the simulation.
+            bridges: The SocketBridge instances whose sockets are read.
+            speed: The simulated time that passes per unit of wall clock
+                time, e.g., 0.5 to run at half speed.
+            tolerance_s: How late, in seconds, an instant of time can be
+                processed without counting as a deadline miss.
+            poll_interval_s: The longest time, in seconds, that the pacer
+                waits without checking whether it has been stopped.
+
+        Raises:
+            FT4FTTSimException: If speed is not positive.
+
+        """
+        if speed <= 0:
+            raise FT4FTTSimException("The speed must be positive.")
+        self.env = env
+        self.bridges = list(bridges)
+        self.speed = speed
+        self.tolerance_s = tolerance_s
+        self.poll_interval_s = poll_interval_s
+        time_base = timebase.get_time_base(env)
+        self._integer_time = time_base.is_integer
+        # wall clock seconds per unit of simulated time
+        self._seconds_per_unit = time_base.to_us(1) * 1e-6 / speed
+        self._start_wall_time = None
+        self._start_time = None
+        self._stop_requested = False
+        self.num_deadlines = 0
+        self.num_misses = 0
+        self.total_lag_s = 0.0
+        self.max_lag_s = 0.0
+        self.wall_time_s = 0.0
+
+    def wall_time(self, time):
+        """
+        Return the value of time.perf_counter() at which the instant of
+        simulated time time is due.
+
+        """
+        return (self._start_wall_time +
+                (time - self._start_time) * self._seconds_per_unit)
+
+    def simulated_time(self, wall_time):
+        """
+        Return the instant of simulated time due at the value wall_time of
+        time.perf_counter().
+
+        """
+        return (self._start_time +
+                (wall_time - self._start_wall_time) / self._seconds_per_unit)
+
+    def stop(self):
+        """
+        Stop the run at the next instant of time, e.g., from another thread.
+
+        """
+        self._stop_requested = True
+
+    def stats(self):
+        """
+        Return the PacingStats of the runs so far.
+
+        """
+        mean_lag_s = 0.0
+        if self.num_deadlines:
+            mean_lag_s = self.total_lag_s / self.num_deadlines
+        return PacingStats(self.num_deadlines, self.num_misses, mean_lag_s,
+                           self.max_lag_s, self.wall_time_s)
+
+    def record_lag(self, lag_s):
+        self.num_deadlines += 1
+        self.total_lag_s += lag_s
+        if lag_s > self.max_lag_s:
+            self.max_lag_s = lag_s
+        if lag_s > self.tolerance_s:
+            self.num_misses += 1
+
+    @staticmethod
+    def _transmitter(bridge, datagrams):
+        return lambda event: bridge.transmit_datagrams(datagrams)
+
+    def read_bridge(self, bridge):
+        """
+        Read the frames of bridge, and schedule their transmission at the
+        instant of simulated time when they were read.
+
+        Returns:
+            True if frames were read.
+
+        """
+        datagrams = bridge.receive_datagrams()
+        if not datagrams:
+            return False
+        delay = max(0, self.simulated_time(time.perf_counter()) -
+                    self.env.now)
+        if self._integer_time:
+            delay = math.ceil(delay)
+        self.env.timeout(delay).callbacks.append(
+            self._transmitter(bridge, datagrams))
+        return True
+
+    def read_bridges(self, selector, timeout_s):
+        """
+        Wait up to timeout_s seconds for frames of the bridges, and schedule
+        their transmission (see read_bridge()).
+
+        Returns:
+            True if frames were read.
+
+        """
+        read = False
+        for key, _ in selector.select(timeout_s):
+            if self.read_bridge(key.data):
+                read = True
+        return read
+
+    def wait_until(self, selector, deadline):
+        """
+        Wait until the wall clock reaches deadline, reading the frames of
+        the bridges meanwhile.
+
+        Returns:
+            True if the deadline was reached, False if frames were read or
+            the run was stopped before.
+
+        """
+        while True:
+            remaining_s = deadline - time.perf_counter()
+            timeout_s = max(0, min(remaining_s, self.poll_interval_s))
+            if self.bridges:
+                if self.read_bridges(selector, timeout_s):
+                    return False
+            elif timeout_s > 0:
+                time.sleep(timeout_s)
+            if remaining_s <= 0:
+                return True
+            if self._stop_requested:
+                return False
+
+    def _start(self):
+        self._stop_requested = False
+        self._start_wall_time = time.perf_counter()
+        self._start_time = self.env.now
+
+    def _next_time(self, until):
+        """
+        Return the next instant of time to process, or None if the run ends
+        because no more events are scheduled.
+
+        """
+        next_time = min(self.env.peek(), until)
+        if next_time == float("inf") and not self.bridges:
+            return None
+        return next_time
+
+    def _process(self, next_time, deadline, until):
+        """
+        Process the events of the instant of time next_time, due at deadline
+        on the wall clock.
+
+        Returns:
+            False if the run has reached until.
+
+        """
+        env = self.env
+        if next_time >= until:
+            if until > env.now:
+                env.run(until=until)
+            return False
+        self.record_lag(time.perf_counter() - deadline)
+        while env.peek() == next_time:
+            env.step()
+        return True
+
+    def run(self, until=float("inf")):
+        """
+        Run the simulation in real time until the instant of time until, or
+        until it is stopped. Without bridges, the run also ends when no more
+        events are scheduled.
+
+        Returns:
+            A PacingStats instance.
+
+        """
+        self._start()
+        selector = selectors.DefaultSelector()
+        for bridge in self.bridges:
+            selector.register(bridge.sock, selectors.EVENT_READ, bridge)
+        try:
+            while not self._stop_requested:
+                next_time = self._next_time(until)
+                if next_time is None:
+                    break
+                deadline = self.wall_time(next_time)
+                if not self.wait_until(selector, deadline):
+                    continue
+                if not self._process(next_time, deadline, until):
+                    break
+        finally:
+            selector.close()
+            self.wall_time_s += time.perf_counter() - self._start_wall_time
+        return self.stats()
+
+    async def run_async(self, until=float("inf")):
+        """
+        Coroutine that does the same as run(), but waits for the wall clock
+        and for the sockets of the bridges in the running asyncio event
+        loop, so that other tasks of the loop, e.g., the external program,
+        run meanwhile.
+
+        Returns:
+            A PacingStats instance.
+
+        """
+        loop = asyncio.get_running_loop()
+        read = asyncio.Event()
+
+        def on_readable(bridge):
+            if self.read_bridge(bridge):
+                read.set()
+
+        self._start()
+        for bridge in self.bridges:
+            loop.add_reader(bridge.sock, on_readable, bridge)
+        try:
+            while not self._stop_requested:
+                next_time = self._next_time(until)
+                if next_time is None:
+                    break
+                deadline = self.wall_time(next_time)
+                remaining_s = deadline - time.perf_counter()
+                if remaining_s > 0:
+                    read.clear()
+                    try:
+                        await asyncio.wait_for(
+                            read.wait(),
+                            min(remaining_s, self.poll_interval_s))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if not self._process(next_time, deadline, until):
+                    break
+                # let the readers and the other tasks run between instants
+                # of time, also when the simulation lags behind
+                await asyncio.sleep(0)
+        finally:
+            for bridge in self.bridges:
+                loop.remove_reader(bridge.sock)
+            self.wall_time_s += time.perf_counter() - self._start_wall_time
+        return self.stats()
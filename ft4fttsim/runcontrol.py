@@ -0,0 +1,326 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Run simulations until their statistics have converged.
+
+Instead of simulating up to a conservatively large instant of time, a
+RunController runs the simulation in slices and watches a set of metrics,
+e.g., the latency of the messages received by a recorder or the length of
+the output queue of a port. After each slice, the warm-up of each metric is
+truncated with the MSER-5 rule and a confidence interval of its mean is
+computed with the method of batch means. The run ends as soon as the
+confidence intervals of all metrics are narrow enough:
+
+    controller = RunController(
+        env, {"latency": ReceptionLatency(recorder),
+              "queue": QueueLength(env, switch.ports[1], 10)},
+        check_interval=1000, until=10 ** 7, relative_precision=0.05)
+    result = controller.run()
+    result.estimates["latency"].mean
+
+"""
+
+from collections import namedtuple
+import math
+import statistics
+
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+# Estimate of the steady-state mean of a metric. half_width is the half
+# width of its confidence interval, num_observations the number of
+# observations it is based on, and warm_up the number of initial
+# observations that were discarded as warm-up.
+Estimate = namedtuple(
+    "Estimate", "mean, half_width, num_observations, warm_up")
+
+
+# Outcome of RunController.run(). time is the instant of time when the run
+# ended, converged tells whether the requested precision was reached, and
+# estimates is a dictionary whose keys are the names of the metrics and whose
+# values are Estimate instances, or None for metrics without enough
+# observations.
+RunResult = namedtuple("RunResult", "time, converged, estimates")
+
+
+class ReceptionLatency(object):
+    """
+    Metric whose observations are the latencies of the messages received by
+    a recorder, i.e., their reception times minus their origin times (see
+    ft4fttsim.networking.Message).
+
+    """
+
+    def __init__(self, recorder):
+        """
+        Arguments:
+            recorder: A MessageRecordingDevice instance, or any network
+                device with reception_records.
+
+        """
+        self.recorder = recorder
+        # cursor into the reception records of the recorder: the last
+        # reception time read so far and how many of its messages were read
+        self._last_time = None
+        self._num_read_at_last_time = 0
+
+    def new_observations(self):
+        """
+        Return the latencies of the messages received since the last call.
+
+        """
+        records = self.recorder.reception_records
+        new_times = []
+        # The reception records are in the order of the reception times, so
+        # only their end has to be looked at.
+        for time in reversed(records):
+            if self._last_time is not None and time <= self._last_time:
+                break
+            new_times.append(time)
+        observations = []
+        if self._last_time is not None:
+            messages = records[self._last_time]
+            observations.extend(
+                self._last_time - message.origin_time
+                for message in messages[self._num_read_at_last_time:])
+            self._num_read_at_last_time = len(messages)
+        for time in reversed(new_times):
+            messages = records[time]
+            observations.extend(
+                time - message.origin_time for message in messages)
+            self._last_time = time
+            self._num_read_at_last_time = len(messages)
+        return observations
+
+
+class QueueLength(object):
+    """
+    Metric whose observations are samples of the number of messages waiting
+    in the output queue of a port, taken periodically by a simpy process.
+
+    """
+
+    def __init__(self, env, port, sampling_interval):
+        """
+        Arguments:
+            env: A simpy.Environment instance.
+            port: The port whose output queue is sampled.
+            sampling_interval: The time between consecutive samples.
+
+        """
+        self.env = env
+        self.port = port
+        self.sampling_interval = sampling_interval
+        self._samples = []
+        env.process(self.run())
+
+    def run(self):
+        while True:
+            queue = self.port.out_queue
+            self._samples.append(len(queue.items) + len(queue.put_queue))
+            yield self.env.timeout(self.sampling_interval)
+
+    def new_observations(self):
+        """
+        Return the samples taken since the last call.
+
+        """
+        samples, self._samples = self._samples, []
+        return samples
+
+
+def mser_truncation(observations, batch_size=5):
+    """
+    Return the number of initial observations to discard as warm-up
+    according to the MSER rule applied to batches of batch_size
+    observations (MSER-5 by default).
+
+    The warm-up is the number d of initial batches that minimizes the
+    variance of the mean of the remaining batches, i.e., the sum of the
+    squared deviations of the remaining batch means from their mean divided
+    by the square of their number. Only truncations of at most half of the
+    batches are considered.
+
+    >>> mser_truncation([100] * 10 + [1, 2] * 50)
+    10
+
+    """
+    num_batches = len(observations) // batch_size
+    batch_means = [
+        math.fsum(observations[i * batch_size:(i + 1) * batch_size]) /
+        batch_size
+        for i in range(num_batches)]
+    best_d, best_statistic = 0, None
+    # suffix sums of the batch means and of their squares
+    total = total_of_squares = 0.0
+    for d in range(num_batches - 1, -1, -1):
+        total += batch_means[d]
+        total_of_squares += batch_means[d] ** 2
+        remaining = num_batches - d
+        if d > num_batches // 2:
+            continue
+        squared_deviations = total_of_squares - total ** 2 / remaining
+        statistic = squared_deviations / remaining ** 2
+        if best_statistic is None or statistic <= best_statistic:
+            best_d, best_statistic = d, statistic
+    return best_d * batch_size
+
+
+def t_quantile(p, degrees_of_freedom):
+    """
+    Return the p-quantile of Student's t distribution.
+
+    The quantile is computed from the quantile of the normal distribution
+    with the Cornish-Fisher expansion, which is accurate to about 0.1% for 5
+    or more degrees of freedom.
+
+    >>> round(t_quantile(0.975, 19), 3)
+    2.093
+
+    """
+    z = statistics.NormalDist().inv_cdf(p)
+    v = float(degrees_of_freedom)
+    return (z +
+            (z ** 3 + z) / (4 * v) +
+            (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * v ** 2) +
+            (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) /
+            (384 * v ** 3) +
+            (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 -
+             945 * z) / (92160 * v ** 4))
+
+
+def batch_means(observations, num_batches=20, confidence=0.95):
+    """
+    Estimate the mean of observations with the method of batch means.
+
+    The observations are split into num_batches batches of consecutive
+    observations, whose means are treated as independent and normally
+    distributed. If the number of observations is not a multiple of
+    num_batches, the earliest observations are left out.
+
+    Returns:
+        A (mean, half width of the confidence interval) tuple, or None if
+        there are fewer observations than batches.
+
+    """
+    batch_size = len(observations) // num_batches
+    if batch_size == 0 or num_batches < 2:
+        return None
+    start = len(observations) - num_batches * batch_size
+    means = [
+        math.fsum(observations[start + i * batch_size:
+                               start + (i + 1) * batch_size]) / batch_size
+        for i in range(num_batches)]
+    mean = math.fsum(means) / num_batches
+    half_width = (t_quantile((1 + confidence) / 2, num_batches - 1) *
+                  statistics.stdev(means) / math.sqrt(num_batches))
+    return mean, half_width
+
+
+class RunController(object):
+    """
+    Runs a simulation until the steady-state means of some metrics are
+    known with a given precision.
+
+    A metric is any object with a new_observations() method that returns
+    the list of the observations made since its previous call, e.g.,
+    ReceptionLatency and QueueLength instances.
+
+    """
+
+    def __init__(self, env, metrics, check_interval, until,
+                 relative_precision=0.05, absolute_precision=0.0,
+                 confidence=0.95, num_batches=20, min_observations=200):
+        """
+        Arguments:
+            env: The simpy.Environment instance of the simulation.
+            metrics: A dictionary whose keys are the names of the metrics and
+                whose values are the metrics.
+            check_interval: The simulated time between convergence checks.
+            until: The instant of time at which the run ends even if the
+                metrics have not converged.
+            relative_precision: The largest acceptable half width of the
+                confidence intervals relative to the estimated means.
+            absolute_precision: A half width that is always acceptable, e.g.,
+                for metrics whose mean is close to zero.
+            confidence: The confidence level of the confidence intervals.
+            num_batches: The number of batches of the method of batch means.
+            min_observations: The number of observations left after the
+                warm-up needed before a metric is considered converged.
+
+        Raises:
+            FT4FTTSimException: If check_interval is not positive.
+
+        """
+        if check_interval <= 0:
+            raise FT4FTTSimException("The check interval must be positive.")
+        self.env = env
+        self.metrics = metrics
+        self.check_interval = check_interval
+        self.until = until
+        self.relative_precision = relative_precision
+        self.absolute_precision = absolute_precision
+        self.confidence = confidence
+        self.num_batches = num_batches
+        self.min_observations = max(min_observations, num_batches)
+        # Dictionary whose keys are the names of the metrics and whose values
+        # are lists of all their observations so far.
+        self.observations = dict((name, []) for name in metrics)
+
+    def collect_observations(self):
+        for name, metric in self.metrics.items():
+            self.observations[name].extend(metric.new_observations())
+
+    def estimate(self, observations):
+        """
+        Return an Estimate of the steady-state mean of observations, or None
+        if there are too few observations after the warm-up.
+
+        """
+        warm_up = mser_truncation(observations)
+        steady_state = observations[warm_up:]
+        if len(steady_state) < self.min_observations:
+            return None
+        mean, half_width = batch_means(
+            steady_state, self.num_batches, self.confidence)
+        return Estimate(mean, half_width, len(steady_state), warm_up)
+
+    def estimates(self):
+        return dict((name, self.estimate(observations))
+                    for name, observations in self.observations.items())
+
+    def has_converged(self, estimates):
+        """
+        Return True if all the estimates are precise enough.
+
+        """
+        for estimate in estimates.values():
+            if estimate is None:
+                return False
+            acceptable_half_width = max(
+                self.relative_precision * abs(estimate.mean),
+                self.absolute_precision)
+            if estimate.half_width > acceptable_half_width:
+                return False
+        return True
+
+    def run(self):
+        """
+        Run the simulation until the metrics have converged or until the
+        instant of time until.
+
+        Returns:
+            A RunResult instance.
+
+        """
+        start = self.env.now
+        num_checks = 0
+        estimates = self.estimates()
+        converged = False
+        while not converged and self.env.now < self.until:
+            num_checks += 1
+            self.env.run(until=min(start + num_checks * self.check_interval,
+                                   self.until))
+            self.collect_observations()
+            estimates = self.estimates()
+            converged = self.has_converged(estimates)
+        return RunResult(self.env.now, converged, estimates)
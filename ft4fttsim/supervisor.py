@@ -0,0 +1,303 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Supervision of long simulations.
+
+A RunSupervisor runs a simulation in slices of simulated time, so that a run
+of hours is not a black box. After each slice it reports the progress of the
+run, i.e., the simulated time reached, the events processed per second, the
+estimated wall clock time until the end and the memory used, to a callback
+and to a JSON status file that can be watched from another shell:
+
+    supervisor = RunSupervisor(
+        env, until=10 ** 9, slice_duration=10 ** 6,
+        on_progress=lambda progress: print(progress.time, progress.eta_s),
+        status_path="status.json",
+        flush=lambda: monitor.write_time_series("memory.csv"),
+        handle_signals=True)
+    progress = supervisor.run()
+
+The run can be paused, resumed and stopped gracefully, either by calling
+pause(), resume() and stop() from the callback or from another thread, or,
+with handle_signals, by sending SIGUSR1 (pause), SIGUSR2 (resume) and SIGINT
+or SIGTERM (stop) to the process. Requests take effect at the end of the
+current slice. The flush function, which should write the partial results
+of the simulation, is called whenever the run is paused and when it ends,
+also if it ends with an exception.
+
+"""
+
+from collections import namedtuple
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+class RunStatus(object):
+    """
+    Enumeration of the states of a supervised run.
+
+    """
+    RUNNING = "running"
+    PAUSED = "paused"
+    STOPPED = "stopped"
+    FINISHED = "finished"
+    ERROR = "error"
+
+
+# Progress of a supervised run. status is a RunStatus value, time the
+# simulated time reached, i.e., the end of the last slice or, once no more
+# events are scheduled, the time of the last event, and until the instant
+# of time at which the run ends. wall_time_s is the wall clock time spent
+# simulating, without the pauses, and num_events the number of events
+# processed so far.
+# events_per_s is the number of events processed per second of wall clock
+# time in the last slice. eta_s is the estimated wall clock time until the
+# end of the run at the average speed so far, or None if it is unknown.
+# peak_rss_bytes is the peak resident memory of the process (None where it
+# cannot be measured), and traced_bytes the memory traced by tracemalloc
+# (None if it is not tracing).
+Progress = namedtuple(
+    "Progress",
+    "status, time, until, wall_time_s, num_events, events_per_s, eta_s, "
+    "peak_rss_bytes, traced_bytes")
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident memory of the process in bytes, or None if it
+    cannot be measured on this platform.
+
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes.
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+class RunSupervisor(object):
+    """
+    Runs a simulation in slices of simulated time, reporting its progress
+    after each slice, and can pause, resume and stop it.
+
+    """
+
+    def __init__(self, env, until, slice_duration, on_progress=None,
+                 status_path=None, flush=None, handle_signals=False,
+                 poll_interval_s=0.1):
+        """
+        Arguments:
+            env: The simpy.Environment or ft4fttsim.kernel.Environment
+                instance of the simulation.
+            until: The instant of time at which the run ends. It may be
+                infinite, in which case the run ends when no more events
+                are scheduled.
+            slice_duration: The simulated time between progress reports.
+            on_progress: A function called with a Progress instance after
+                every slice, when the run is paused and when it ends.
+            status_path: The path of a file to which the last Progress is
+                written as a JSON object.
+            flush: A function without arguments that writes the partial
+                results of the simulation, called when the run is paused and
+                when it ends.
+            handle_signals: Whether to pause, resume and stop the run on
+                SIGUSR1, SIGUSR2 and SIGINT or SIGTERM while it runs. Signal
+                handlers can only be installed from the main thread.
+            poll_interval_s: How often a paused run checks whether it has
+                been resumed or stopped, in seconds.
+
+        Raises:
+            FT4FTTSimException: If slice_duration is not positive.
+
+        """
+        if slice_duration <= 0:
+            raise FT4FTTSimException("The slice duration must be positive.")
+        self.env = env
+        self.until = until
+        self.slice_duration = slice_duration
+        self.on_progress = on_progress
+        self.status_path = status_path
+        self.flush = flush
+        self.handle_signals = handle_signals
+        self.poll_interval_s = poll_interval_s
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._stop_requested = threading.Event()
+        self._start_time = env.now
+        self.wall_time_s = 0.0
+        self.num_events = 0
+        # events processed per second of wall clock time in the last slice
+        self.events_per_s = 0.0
+        # the last Progress reported
+        self.progress = None
+
+    def pause(self):
+        """
+        Pause the run at the end of the current slice.
+
+        """
+        self._resumed.clear()
+
+    def resume(self):
+        """
+        Resume a paused run.
+
+        """
+        self._resumed.set()
+
+    def stop(self):
+        """
+        Stop the run at the end of the current slice, or right away if it is
+        paused.
+
+        """
+        self._stop_requested.set()
+        self._resumed.set()
+
+    def run_slice(self):
+        """
+        Simulate up to the end of the next slice.
+
+        The events earlier than the end of the slice are processed one at a
+        time, so that they can be counted. If events remain scheduled, the
+        time is then advanced to the end of the slice with env.run(until),
+        but not past the last event once no more events are scheduled.
+
+        Returns:
+            A (wall clock time, number of events) tuple of the slice.
+
+        """
+        env = self.env
+        slice_end = min(env.now + self.slice_duration, self.until)
+        peek = env.peek
+        step = env.step
+        num_events = 0
+        start = time.perf_counter()
+        # the event that stopped a previous run is not counted
+        kernel.skip_stop_event(env)
+        while peek() < slice_end:
+            step()
+            num_events += 1
+        if kernel.pending_events(env):
+            env.run(until=slice_end)
+        wall_time_s = time.perf_counter() - start
+        return wall_time_s, num_events
+
+    def report(self, status):
+        """
+        Report the progress of the run to the callback and to the status
+        file.
+
+        Returns:
+            The new Progress instance.
+
+        """
+        now = self.env.now
+        eta_s = None
+        if status == RunStatus.FINISHED or now >= self.until:
+            eta_s = 0.0
+        elif self.until < float("inf") and self.wall_time_s > 0 and (
+                now > self._start_time):
+            eta_s = (self.wall_time_s * (self.until - now) /
+                     (now - self._start_time))
+        traced_bytes = None
+        if tracemalloc.is_tracing():
+            traced_bytes = tracemalloc.get_traced_memory()[0]
+        self.progress = Progress(
+            status, now, self.until, self.wall_time_s, self.num_events,
+            self.events_per_s, eta_s, peak_rss_bytes(), traced_bytes)
+        if self.status_path is not None:
+            self.write_status(self.status_path)
+        if self.on_progress is not None:
+            self.on_progress(self.progress)
+        return self.progress
+
+    def write_status(self, path):
+        """
+        Write the last Progress to a JSON file. The file is replaced
+        atomically, so that it can be read at any time.
+
+        """
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as status_file:
+            json.dump(self.progress._asdict(), status_file, indent=2,
+                      sort_keys=True)
+        os.replace(temporary_path, path)
+
+    def _flush(self):
+        if self.flush is not None:
+            self.flush()
+
+    def _install_signal_handlers(self):
+        """
+        Install the signal handlers of the run.
+
+        Returns:
+            A dictionary whose keys are the signals and whose values are
+            their previous handlers.
+
+        """
+        handlers = {
+            signal.SIGUSR1: lambda signum, frame: self.pause(),
+            signal.SIGUSR2: lambda signum, frame: self.resume(),
+            signal.SIGINT: lambda signum, frame: self.stop(),
+            signal.SIGTERM: lambda signum, frame: self.stop(),
+        }
+        return dict((signum, signal.signal(signum, handler))
+                    for signum, handler in handlers.items())
+
+    def _wait_while_paused(self):
+        self._flush()
+        self.report(RunStatus.PAUSED)
+        while not self._resumed.wait(self.poll_interval_s):
+            pass
+
+    def run(self):
+        """
+        Run the simulation until the instant of time until, until no more
+        events are scheduled, or until the run is stopped.
+
+        Returns:
+            The final Progress instance, whose status is RunStatus.FINISHED
+            or RunStatus.STOPPED.
+
+        """
+        self._start_time = self.env.now
+        previous_handlers = {}
+        if self.handle_signals:
+            previous_handlers = self._install_signal_handlers()
+        status = RunStatus.ERROR
+        try:
+            while True:
+                if not self._resumed.is_set():
+                    self._wait_while_paused()
+                if self._stop_requested.is_set():
+                    status = RunStatus.STOPPED
+                    break
+                if (self.env.now >= self.until or
+                        not kernel.pending_events(self.env)):
+                    status = RunStatus.FINISHED
+                    break
+                wall_time_s, num_events = self.run_slice()
+                self.wall_time_s += wall_time_s
+                self.num_events += num_events
+                if wall_time_s > 0:
+                    self.events_per_s = num_events / wall_time_s
+                self.report(RunStatus.RUNNING)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            self._flush()
+            self.report(status)
+        return self.progress
@@ -0,0 +1,234 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Runs a scenario over a grid of parameters on a pool of worker processes.
+
+A scenario is a module level function that builds a network in a given
+environment from keyword parameters and returns a function that summarizes
+the network after the simulation:
+
+    def scenario(env, megabits_per_second, propagation_delay_us):
+        ...
+        return lambda: {"received": len(recorder.reception_records)}
+
+Each point of the sweep is a dictionary with the parameters of one
+simulation. Every point is simulated in its own worker process, so only the
+scenario, the points and the summaries have to be picklable.
+
+"""
+
+from collections import namedtuple
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import time
+
+import simpy
+
+from ft4fttsim.cache import scenario_key
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.simlogging import log
+
+
+class SweepStatus(object):
+    """
+    Enumeration of the possible outcomes of simulating a point of a sweep.
+
+    """
+    OK = "ok"
+    TIMEOUT = "timeout"
+    ERROR = "error"
+
+
+# Default value of cache lookups that distinguishes missing summaries from
+# summaries that are None.
+_MISSING = object()
+
+
+# The result of simulating a point of a sweep. summary is the value
+# returned by the summary function of the scenario if status is
+# SweepStatus.OK, a description of the error if status is SweepStatus.ERROR
+# and None otherwise.
+SweepResult = namedtuple("SweepResult",
+                         "params, status, summary, wall_time_s")
+
+
+def grid(**axes):
+    """
+    Return the points of the Cartesian product of the values of the axes.
+
+    Arguments:
+        axes: Keyword arguments whose values are the lists of values that
+            the parameter named by the keyword takes in the sweep.
+
+    Returns:
+        A list of dictionaries, one per combination of values.
+
+    >>> grid(megabits_per_second=[10, 100], propagation_delay_us=[0])
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [{'megabits_per_second': 10, 'propagation_delay_us': 0},
+     {'megabits_per_second': 100, 'propagation_delay_us': 0}]
+
+    """
+    names = sorted(axes)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(axes[name] for name in names))]
+
+
+def run_point(scenario, params, until):
+    """
+    Simulate a single point of a sweep in the calling process.
+
+    Returns:
+        The summary of the simulated network.
+
+    """
+    env = simpy.Environment()
+    summarize = scenario(env, **params)
+    if until == float("inf"):
+        env.run()
+    else:
+        env.run(until=until)
+    return summarize()
+
+
+def _worker_main(scenario, params, until, connection):
+    """
+    Main function of the worker process simulating a point of a sweep.
+
+    """
+    start = time.perf_counter()
+    try:
+        summary = run_point(scenario, params, until)
+        status = SweepStatus.OK
+    except Exception as error:
+        summary = repr(error)
+        status = SweepStatus.ERROR
+    connection.send((status, summary, time.perf_counter() - start))
+    connection.close()
+
+
+def run_sweep(scenario, points, until=float("inf"), max_workers=None,
+              timeout_s=None, cache=None):
+    """
+    Simulate the scenario at every point on a bounded pool of processes.
+
+    Arguments:
+        scenario: The function that builds the network of a point.
+        points: An iterable of dictionaries with the keyword arguments of
+            scenario for each point, e.g., as returned by grid().
+        until: The instant of time until which every point is simulated.
+        max_workers: The maximum number of points simulated at the same
+            time. Defaults to the number of CPUs.
+        timeout_s: The wall clock time in seconds after which the simulation
+            of a point is killed. None means no timeout.
+        cache: An optional ft4fttsim.cache.ResultCache. Points whose summary
+            is in the cache are not simulated again and have a wall time of
+            0. The summary of every point simulated successfully is stored
+            in the cache as soon as it is available, so that an interrupted
+            sweep resumes where it stopped.
+
+    Returns:
+        A list with a SweepResult for every point, in the order of points.
+
+    """
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+    if max_workers < 1:
+        raise FT4FTTSimException("At least one worker is needed.")
+    points = list(points)
+    results = [None] * len(points)
+    context = multiprocessing.get_context()
+    keys = [None] * len(points)
+    pending = []
+    for index, params in enumerate(points):
+        if cache is not None:
+            keys[index] = scenario_key(scenario, params, until)
+            summary = cache.get(keys[index], _MISSING)
+            if summary is not _MISSING:
+                results[index] = SweepResult(
+                    params, SweepStatus.OK, summary, 0.0)
+                continue
+        pending.append(index)
+    pending.reverse()
+    # Dictionary whose keys are the connections to the running workers and
+    # whose values are (point index, worker, start time) tuples.
+    running = {}
+    while pending or running:
+        while pending and len(running) < max_workers:
+            index = pending.pop()
+            parent_end, worker_end = context.Pipe(duplex=False)
+            worker = context.Process(
+                target=_worker_main,
+                args=(scenario, points[index], until, worker_end))
+            worker.start()
+            worker_end.close()
+            running[parent_end] = (index, worker, time.perf_counter())
+        wait_s = None
+        if timeout_s is not None:
+            now = time.perf_counter()
+            wait_s = max(0, min(start + timeout_s - now
+                                for _, _, start in running.values()))
+        ready = multiprocessing.connection.wait(list(running), wait_s)
+        now = time.perf_counter()
+        for connection in list(running):
+            index, worker, start = running[connection]
+            if connection in ready:
+                try:
+                    status, summary, wall_time_s = connection.recv()
+                except EOFError:
+                    status, summary, wall_time_s = (
+                        SweepStatus.ERROR,
+                        "worker exited with code {}".format(
+                            worker.exitcode), now - start)
+            elif timeout_s is not None and now - start >= timeout_s:
+                worker.terminate()
+                status, summary, wall_time_s = (
+                    SweepStatus.TIMEOUT, None, now - start)
+            else:
+                continue
+            worker.join()
+            connection.close()
+            del running[connection]
+            log.debug("point %s of sweep finished with status %s",
+                      points[index], status)
+            results[index] = SweepResult(
+                points[index], status, summary, wall_time_s)
+            if cache is not None and status == SweepStatus.OK:
+                cache.put(keys[index], summary)
+    return results
+
+
+def results_table(results):
+    """
+    Merge the results of a sweep into a single table.
+
+    The columns of the table are the parameters of the points, followed by
+    the status and wall time of each point and by the keys of the summaries
+    that are dictionaries. Cells without value are None.
+
+    Returns:
+        A (columns, rows) tuple, where columns is a list of column names and
+        rows is a list with a list of cells for each result.
+
+    >>> results_table([
+    ...     SweepResult({"Mbps": 10}, SweepStatus.OK, {"received": 3}, 0.5),
+    ...     SweepResult({"Mbps": 100}, SweepStatus.TIMEOUT, None, 9.0)])
+    ... # doctest: +NORMALIZE_WHITESPACE
+    (['Mbps', 'status', 'wall_time_s', 'received'],
+     [[10, 'ok', 0.5, 3], [100, 'timeout', 9.0, None]])
+
+    """
+    param_columns = sorted(set(
+        name for result in results for name in result.params))
+    summary_columns = sorted(set(
+        key for result in results if isinstance(result.summary, dict)
+        for key in result.summary))
+    columns = param_columns + ["status", "wall_time_s"] + summary_columns
+    rows = []
+    for result in results:
+        summary = result.summary if isinstance(result.summary, dict) else {}
+        rows.append(
+            [result.params.get(name) for name in param_columns] +
+            [result.status, result.wall_time_s] +
+            [summary.get(key) for key in summary_columns])
+    return columns, rows
@@ -0,0 +1,401 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Synthetic networks of common shapes for scaling studies.
+
+The functions of this module build lines, rings, stars, trees and fat trees
+of switches with hosts attached to the switches, and a dual star of FT4FTT
+switches with slaves connected to both of them:
+
+    network = tree(env, depth=3, fan_out=4, hosts_per_switch=8)
+    recorder = network.devices["host5_2"]
+
+They return ft4fttsim.topology.Network instances. The switches are named
+"switch0", "switch1", etc. and the hosts of switch i "host<i>_0",
+"host<i>_1", etc. The hosts are MessageRecordingDevices unless another
+function to make them is given (e.g., MessagePlaybackAndRecordingDevice,
+or any function with the signature of the values of
+ft4fttsim.topology.DEVICE_TYPES).
+
+Unlike those of ft4fttsim.topology.compile_topology(), whose size grows
+with the square of the size of the network, the forwarding tables of the
+switches only have entries for their own hosts. The ports leading to other
+destinations are computed from the position of their switch in the network
+when they are first looked up, so that networks of tens of thousands of
+devices are built in a fraction of a second. Automatic garbage collection
+is suspended while the networks are built, since the collections triggered
+by the allocation of many long-lived objects would otherwise dominate the
+time to build them.
+
+Unicast messages follow the shortest path (in rings, around the shorter side
+of the ring). Messages to multicast groups are forwarded to each of their
+members along the shortest path, which in rings may deliver them twice to
+some members; in the other shapes each member receives them once.
+
+"""
+
+import contextlib
+import gc
+
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.ft4ftt import FT4FTTSwitch, Master, RecordingSlave
+from ft4fttsim.networking import Link, MessageRecordingDevice, Switch
+from ft4fttsim.topology import Network
+
+
+class RoutingTable(dict):
+    """
+    Forwarding table that computes the ports leading to destinations without
+    an entry, instead of storing an entry for every device of the network.
+
+    """
+
+    def __init__(self, route, entries=()):
+        """
+        Arguments:
+            route: Function called with a destination that returns the list
+                of ports leading to it, or None if the destination is unknown,
+                e.g., a multicast group. The result is stored as a new entry.
+            entries: The initial entries of the table.
+
+        """
+        dict.__init__(self, entries)
+        self.route = route
+
+    def __missing__(self, destination):
+        ports = self.route(destination)
+        if ports is None:
+            raise KeyError(destination)
+        self[destination] = ports
+        return ports
+
+    def get(self, destination, default=None):
+        try:
+            return self[destination]
+        except KeyError:
+            return default
+
+
+class _Builder(object):
+    """
+    Creates the switches, hosts and links of a synthetic network.
+
+    """
+
+    def __init__(self, env, make_host, megabits_per_second,
+                 propagation_delay_us):
+        self.env = env
+        self.make_host = make_host
+        self.megabits_per_second = megabits_per_second
+        self.propagation_delay_us = propagation_delay_us
+        self.devices = {}
+        self.links = []
+        # Dictionary whose keys are the devices of the network and whose
+        # values are the numbers of the switches they are attached to (for
+        # switches, their own number).
+        self.switch_number = {}
+        self.switches = []
+
+    def add_switch(self, num_ports, route):
+        """
+        Add a switch to the network.
+
+        Arguments:
+            num_ports: The number of ports of the switch.
+            route: Function called with the switch, its number and the number
+                of another switch that returns the list of ports of the
+                switch leading to the other switch.
+
+        Returns:
+            The new switch.
+
+        """
+        number = len(self.switches)
+        switch = Switch(self.env, "switch{}".format(number), num_ports)
+        switch_number = self.switch_number
+
+        def route_destination(destination):
+            destination_number = switch_number.get(destination)
+            if destination_number is None:
+                return None
+            if destination_number == number:
+                # the switch itself
+                return []
+            return route(switch, number, destination_number)
+        switch.forwarding_table = RoutingTable(route_destination)
+        self.switches.append(switch)
+        self.switch_number[switch] = number
+        self.devices[switch.name] = switch
+        return switch
+
+    def add_hosts(self, switch, num_hosts):
+        """
+        Attach num_hosts hosts to the first ports of switch.
+
+        """
+        number = self.switch_number[switch]
+        for i in range(num_hosts):
+            host = self.make_host(
+                self.env, "host{}_{}".format(number, i), 1)
+            self.link(switch.ports[i], host.ports[0])
+            switch.forwarding_table[host] = [switch.ports[i]]
+            self.switch_number[host] = number
+            self.devices[host.name] = host
+
+    def link(self, port1, port2, megabits_per_second=None):
+        if megabits_per_second is None:
+            megabits_per_second = self.megabits_per_second
+        self.links.append(Link(self.env, port1, port2, megabits_per_second,
+                               self.propagation_delay_us))
+
+    def network(self):
+        return Network(self.devices, self.links, {})
+
+
+@contextlib.contextmanager
+def _garbage_collection_suspended():
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _check_positive(**numbers):
+    for name, number in numbers.items():
+        if number < 1:
+            raise FT4FTTSimException(
+                "The {} must be at least 1.".format(name.replace("_", " ")))
+
+
+def line(env, num_switches, hosts_per_switch=1, megabits_per_second=100,
+         propagation_delay_us=1, make_host=MessageRecordingDevice):
+    """
+    Build a line of switches.
+
+    Port hosts_per_switch of each switch leads to the previous switch of the
+    line and port hosts_per_switch + 1 to the next one.
+
+    Arguments:
+        env: A simpy.Environment or ft4fttsim.kernel.Environment instance.
+        num_switches: The number of switches.
+        hosts_per_switch: The number of hosts attached to each switch.
+        megabits_per_second: The speed of all the links.
+        propagation_delay_us: The propagation delay of all the links.
+        make_host: Function called with env, a name and a number of ports
+            to make a host.
+
+    Returns:
+        A ft4fttsim.topology.Network instance.
+
+    """
+    with _garbage_collection_suspended():
+        return _line_or_ring(env, num_switches, hosts_per_switch,
+                             megabits_per_second, propagation_delay_us,
+                             make_host, is_ring=False)
+
+
+def ring(env, num_switches, hosts_per_switch=1, megabits_per_second=100,
+         propagation_delay_us=1, make_host=MessageRecordingDevice):
+    """
+    Build a ring of switches, i.e., a line whose last switch is connected to
+    its first switch. The arguments are those of line().
+
+    """
+    with _garbage_collection_suspended():
+        return _line_or_ring(env, num_switches, hosts_per_switch,
+                             megabits_per_second, propagation_delay_us,
+                             make_host, is_ring=True)
+
+
+def _line_or_ring(env, num_switches, hosts_per_switch, megabits_per_second,
+                  propagation_delay_us, make_host, is_ring):
+    _check_positive(num_switches=num_switches)
+    # rings of one or two switches are lines
+    is_ring = is_ring and num_switches > 2
+    builder = _Builder(env, make_host, megabits_per_second,
+                       propagation_delay_us)
+    previous_port = hosts_per_switch
+    next_port = hosts_per_switch + 1
+
+    def route(switch, number, destination):
+        if is_ring:
+            distance = (destination - number) % num_switches
+            is_next = 2 * distance <= num_switches
+        else:
+            is_next = destination > number
+        return [switch.ports[next_port if is_next else previous_port]]
+    for _ in range(num_switches):
+        switch = builder.add_switch(hosts_per_switch + 2, route)
+        builder.add_hosts(switch, hosts_per_switch)
+    switches = builder.switches
+    for switch, next_switch in zip(switches, switches[1:]):
+        builder.link(switch.ports[next_port], next_switch.ports[previous_port])
+    if is_ring:
+        builder.link(switches[-1].ports[next_port],
+                     switches[0].ports[previous_port])
+    return builder.network()
+
+
+def tree(env, depth, fan_out, hosts_per_switch=1, megabits_per_second=100,
+         propagation_delay_us=1, make_host=MessageRecordingDevice):
+    """
+    Build a tree of switches with hosts attached to its leaves, i.e., to the
+    switches of its lowest level.
+
+    The switches are numbered level by level, so the children of switch i
+    are the switches fan_out * i + 1 to fan_out * i + fan_out. Ports 0 to
+    fan_out - 1 of the inner switches lead to their children, and the last
+    port of every switch but the root leads to its parent.
+
+    Arguments:
+        env: A simpy.Environment or ft4fttsim.kernel.Environment instance.
+        depth: The number of levels of switches. A tree of depth 1 is a
+            single switch.
+        fan_out: The number of children of each inner switch.
+        hosts_per_switch: The number of hosts attached to each leaf switch.
+        megabits_per_second: The speed of all the links.
+        propagation_delay_us: The propagation delay of all the links.
+        make_host: Function called with env, a name and a number of ports
+            to make a host.
+
+    Returns:
+        A ft4fttsim.topology.Network instance.
+
+    """
+    with _garbage_collection_suspended():
+        return _tree(env, depth, fan_out, hosts_per_switch,
+                     megabits_per_second, propagation_delay_us, make_host,
+                     is_fat=False)
+
+
+def fat_tree(env, depth, fan_out, hosts_per_switch=1, megabits_per_second=100,
+             propagation_delay_us=1, make_host=MessageRecordingDevice):
+    """
+    Build a fat tree, i.e., a tree() whose links get faster towards the root:
+    the link between a switch and its parent is as fast as all the links of
+    the hosts below the switch together, so that the tree is never the
+    bottleneck. megabits_per_second is the speed of the links of the hosts.
+    The other arguments are those of tree().
+
+    """
+    with _garbage_collection_suspended():
+        return _tree(env, depth, fan_out, hosts_per_switch,
+                     megabits_per_second, propagation_delay_us, make_host,
+                     is_fat=True)
+
+
+def star(env, num_edge_switches, hosts_per_switch=1, megabits_per_second=100,
+         propagation_delay_us=1, make_host=MessageRecordingDevice):
+    """
+    Build a star of switches, i.e., a central switch (switch0) connected to
+    num_edge_switches switches with hosts. It is the tree() of depth 2 whose
+    fan-out is num_edge_switches, and the other arguments are those of
+    tree().
+
+    """
+    return tree(env, 2, num_edge_switches, hosts_per_switch,
+                megabits_per_second, propagation_delay_us, make_host)
+
+
+def _tree(env, depth, fan_out, hosts_per_switch, megabits_per_second,
+          propagation_delay_us, make_host, is_fat):
+    _check_positive(depth=depth, fan_out=fan_out)
+    builder = _Builder(env, make_host, megabits_per_second,
+                       propagation_delay_us)
+    # number of switches above the lowest level
+    if fan_out == 1:
+        num_inner = depth - 1
+    else:
+        num_inner = (fan_out ** (depth - 1) - 1) // (fan_out - 1)
+
+    def route(switch, number, destination):
+        # climb from the destination towards the root until reaching a
+        # child of the switch
+        while destination > number:
+            parent = (destination - 1) // fan_out
+            if parent == number:
+                return [switch.ports[destination - fan_out * number - 1]]
+            destination = parent
+        # the destination is not below the switch
+        return [switch.ports[-1]]
+    for number in range(num_inner + fan_out ** (depth - 1)):
+        if number < num_inner:
+            num_ports = fan_out
+        else:
+            num_ports = hosts_per_switch
+        if number > 0:
+            # port leading to the parent
+            num_ports += 1
+        switch = builder.add_switch(num_ports, route)
+        if number >= num_inner:
+            builder.add_hosts(switch, hosts_per_switch)
+    for number, switch in enumerate(builder.switches[1:], 1):
+        parent_number = (number - 1) // fan_out
+        parent = builder.switches[parent_number]
+        megabits_per_second = None
+        if is_fat:
+            level = 0
+            ancestor = number
+            while ancestor > 0:
+                ancestor = (ancestor - 1) // fan_out
+                level += 1
+            num_hosts_below = hosts_per_switch * fan_out ** (depth - 1 - level)
+            megabits_per_second = (builder.megabits_per_second *
+                                   num_hosts_below)
+        builder.link(
+            parent.ports[number - fan_out * parent_number - 1],
+            switch.ports[-1], megabits_per_second)
+    return builder.network()
+
+
+def dual_star(env, num_slaves, ec_duration_us=1000, megabits_per_second=100,
+              propagation_delay_us=1, ec_layout=None, **master_kwargs):
+    """
+    Build a dual star of FT4FTT switches: two FT4FTT switches, switch0 and
+    switch1, with embedded masters, master0 and master1, and num_slaves
+    slaves ("slave0", "slave1", etc.) whose ports 0 and 1 are connected to
+    port i of switch0 and of switch1, where i is the number of the slave.
+    The slaves are ft4fttsim.ft4ftt.RecordingSlave instances.
+
+    Arguments:
+        env: A simpy.Environment or ft4fttsim.kernel.Environment instance.
+        num_slaves: The number of slaves.
+        ec_duration_us: The duration of the elementary cycles.
+        megabits_per_second: The speed of all the links.
+        propagation_delay_us: The propagation delay of all the links.
+        ec_layout: The EC layout of the masters and of the slaves.
+        master_kwargs: Further keyword arguments of the masters, e.g.,
+            num_tms_per_ec.
+
+    Returns:
+        A ft4fttsim.topology.Network instance.
+
+    """
+    _check_positive(num_slaves=num_slaves)
+    with _garbage_collection_suspended():
+        return _dual_star(env, num_slaves, ec_duration_us,
+                          megabits_per_second, propagation_delay_us,
+                          ec_layout, master_kwargs)
+
+
+def _dual_star(env, num_slaves, ec_duration_us, megabits_per_second,
+               propagation_delay_us, ec_layout, master_kwargs):
+    slaves = [RecordingSlave(env, "slave{}".format(i), 2,
+                             ec_duration_us=ec_duration_us,
+                             ec_layout=ec_layout)
+              for i in range(num_slaves)]
+    devices = dict((slave.name, slave) for slave in slaves)
+    links = []
+    for i in range(2):
+        master = Master(env, "master{}".format(i), 1, slaves, ec_duration_us,
+                        ec_layout=ec_layout, **master_kwargs)
+        switch = FT4FTTSwitch(env, "switch{}".format(i), num_slaves, master)
+        for port, slave in zip(switch.external_ports, slaves):
+            links.append(Link(env, port, slave.ports[i], megabits_per_second,
+                              propagation_delay_us))
+            switch.forwarding_table[slave] = [port]
+        devices[master.name] = master
+        devices[switch.name] = switch
+    return Network(devices, links, {})
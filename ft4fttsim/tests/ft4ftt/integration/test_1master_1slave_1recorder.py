@@ -0,0 +1,78 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Perform tests under the following network:
+
++--------+ link1 +-------+ link2 +----------+
+| master 0 ----> 0 slave 1 ----> 0 recorder |
++--------+       +-------+       +----------+
+
+All links are 100 Mbps links without propagation delay. The master has no
+synchronous requirements, so its trigger messages have the minimum size and
+the slave receives the trigger message of the first elementary cycle at 5.76
+microseconds.
+
+"""
+
+from unittest.mock import sentinel
+
+import pytest
+
+from ft4fttsim.ft4ftt import Master, Slave, ECLayout, MessageType
+from ft4fttsim.networking import Link, Message
+
+
+EC_DURATION_US = 1000
+EC_LAYOUT = ECLayout(tm_window_us=200, sync_window_us=300,
+                     async_window_us=400)
+# Instant of time when the slave receives the first trigger message
+FIRST_TM_RECEPTION_US = 5.76
+
+
+@pytest.fixture
+def slave(env):
+    return Slave(env, "slave", 2, EC_DURATION_US, EC_LAYOUT)
+
+
+@pytest.fixture
+def master(env, slave):
+    new_master = Master(env, "master", 1, [slave], EC_DURATION_US,
+                        ec_layout=EC_LAYOUT)
+    Link(env, new_master.ports[0], slave.ports[0], 100, 0)
+    return new_master
+
+
+@pytest.fixture
+def link2(env, slave, recorder):
+    return Link(env, slave.ports[1], recorder.ports[0], 100, 0)
+
+
+def instruct_transmission_at(env, device, time, message, port):
+    yield env.timeout(time)
+    yield env.process(device.instruct_transmission(message, port))
+
+
+@pytest.mark.usefixtures("master", "link2")
+@pytest.mark.parametrize(
+    "message_type, instruction_time, expected_reception_time",
+    [
+        # Transmission of 992 bytes plus preamble and SFD takes 80
+        # microseconds.
+        (MessageType.SYNCHRONOUS_MESSAGE, 130, FIRST_TM_RECEPTION_US + 280),
+        (MessageType.UPDATE_REQUEST, 130, FIRST_TM_RECEPTION_US + 580),
+        (MessageType.SYNCHRONOUS_MESSAGE, FIRST_TM_RECEPTION_US + 230,
+         FIRST_TM_RECEPTION_US + 310),
+        # would cross the end of the asynchronous window
+        (MessageType.UPDATE_REQUEST, FIRST_TM_RECEPTION_US + 850,
+         FIRST_TM_RECEPTION_US + EC_DURATION_US + 580),
+    ]
+)
+def test_message_is_received_within_its_window(
+        env, slave, recorder, message_type, instruction_time,
+        expected_reception_time):
+    message = Message(env, slave, recorder, 992, message_type)
+    env.process(instruct_transmission_at(
+        env, slave, instruction_time, message, slave.ports[1]))
+    env.run(until=3 * EC_DURATION_US)
+    assert recorder.recorded_messages == [message]
+    assert recorder.recorded_timestamps == [
+        pytest.approx(expected_reception_time)]
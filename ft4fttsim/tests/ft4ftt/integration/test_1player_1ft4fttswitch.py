@@ -17,7 +17,7 @@ from unittest.mock import sentinel
 import pytest
 
 from ft4fttsim.networking import Link, Message, MessagePlaybackDevice
-from ft4fttsim.ft4ftt import SyncStreamConfig, MessageType
+from ft4fttsim.ft4ftt import SyncStreamConfig, MessageType, UpdateCounts
 from ft4fttsim.ft4ftt import FT4FTTSwitch
 
 
@@ -56,6 +56,15 @@ def switch(env, master, player):
 
 
 @pytest.mark.usefixtures("switch")
-def test_update_request(env, master, update_request_message):
+def test_update_request__not_applied_before_next_ec(env, master):
     env.run(until=master.ec_duration_us * 1)
+    assert master.sync_requirements == {}
+    assert master.update_counts == {}
+
+
+@pytest.mark.usefixtures("switch")
+def test_update_request__applied_at_start_of_next_ec(
+        env, master, update_request_message):
+    env.run(until=master.ec_duration_us * 1 + 1)
     assert master.sync_requirements == dict([update_request_message.data])
+    assert master.update_counts == {2: UpdateCounts(applied=1, rejected=0)}
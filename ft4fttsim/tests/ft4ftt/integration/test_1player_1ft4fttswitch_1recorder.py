@@ -0,0 +1,87 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Perform tests under the following network:
+
+  +--------+       +---------------+       +----------+
+  | player 0 ----- 0 FT4FTT switch 1 ----- 0 recorder |
+  +--------+       |               |       +----------+
+                   |  +---0----+   |
+                   |  | master |   |
+                   |  +--------+   |
+                   +---------------+
+
+"""
+
+from collections import Counter
+
+import pytest
+
+from ft4fttsim.networking import Link, Message, MessagePlaybackDevice
+from ft4fttsim.ft4ftt import FT4FTTSwitch, Master, MessageType
+from ft4fttsim.ft4ftt import PolicingViolation, SyncStreamConfig
+
+
+@pytest.fixture
+def master(env, recorder):
+    sync_requirements = {
+        "stream A": SyncStreamConfig(transmission_time_ecs=1, deadline_ecs=1,
+                                     period_ecs=1, offset_ecs=0,
+                                     max_size_bytes=500),
+    }
+    return Master(env, "master", 1, [recorder], 10 ** 9,
+                  sync_requirements=sync_requirements)
+
+
+@pytest.fixture
+def player(env, recorder):
+    new_player = MessagePlaybackDevice(env, "player", 1)
+    new_player.conforming_message = Message(
+        env, new_player, recorder, 500, MessageType.SYNCHRONOUS_MESSAGE,
+        "stream A")
+    new_player.oversized_message = Message(
+        env, new_player, recorder, 501, MessageType.SYNCHRONOUS_MESSAGE,
+        "stream A")
+    new_player.unscheduled_message = Message(
+        env, new_player, recorder, 64, MessageType.SYNCHRONOUS_MESSAGE,
+        "stream B")
+    new_player.load_transmission_commands(
+        {
+            10: {new_player.ports[0]: [new_player.conforming_message,
+                                       new_player.oversized_message,
+                                       new_player.unscheduled_message]}
+        }
+    )
+    return new_player
+
+
+@pytest.fixture(params=[True, False])
+def switch(request, env, master, player, recorder):
+    new_switch = FT4FTTSwitch(env, "FT4FTT switch", 2, master,
+                              drop_violations=request.param)
+    Link(env, player.ports[0], new_switch.ports[0], 100, 5)
+    Link(env, new_switch.ports[1], recorder.ports[0], 100, 5)
+    return new_switch
+
+
+def test_violations_are_counted_on_reception_port(env, switch):
+    env.run(until=10 ** 6)
+    reception_port = switch.external_ports[0]
+    assert switch.policing_violations[reception_port] == Counter({
+        PolicingViolation.OVERSIZED: 1,
+        PolicingViolation.UNSCHEDULED: 1,
+    })
+    assert switch.policing_violations[switch.external_ports[1]] == Counter()
+
+
+def test_recorder_receives_only_conforming_messages_unless_flagging(
+        env, switch, player, recorder):
+    env.run(until=10 ** 6)
+    received_sync_messages = [
+        msg for msg in recorder.recorded_messages
+        if msg.message_type == MessageType.SYNCHRONOUS_MESSAGE]
+    if switch.drop_violations:
+        assert received_sync_messages == [player.conforming_message]
+    else:
+        assert received_sync_messages == [player.conforming_message,
+                                          player.oversized_message,
+                                          player.unscheduled_message]
@@ -35,3 +35,21 @@ def test_num_ecs_simulated__record_correct_number_of_messages(
     env.run(until=num_ecs * switch.master.ec_duration_us)
     received_messages = recorder.recorded_messages
     assert len(received_messages) == num_ecs * switch.master.num_tms_per_ec
+
+
+def test_trigger_messages_reach_switch_without_delay(env, switch, recorder):
+    """
+    Test that the trigger messages are only delayed by the link between the
+    switch and the recorder.
+
+    """
+    num_tms_per_ec = switch.master.num_tms_per_ec
+    env.run(until=2 * switch.master.ec_duration_us)
+    # Trigger messages without schedule entries have the minimum size. 64
+    # bytes plus preamble and SFD at 100 Mbps take 5.76 microseconds, the
+    # interframe gap takes 0.96 microseconds and the propagation delay is 5
+    # microseconds.
+    expected_timestamps = [
+        ec * switch.master.ec_duration_us + 10.76 + i * (10.76 + 0.96)
+        for ec in range(2) for i in range(num_tms_per_ec)]
+    assert recorder.recorded_timestamps == pytest.approx(expected_timestamps)
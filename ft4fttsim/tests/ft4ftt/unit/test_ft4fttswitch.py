@@ -1,7 +1,12 @@
 # author: David Gessner <davidges@gmail.com>
 
+from collections import Counter
+from unittest.mock import sentinel
+
 import pytest
-from ft4fttsim.ft4ftt import FT4FTTSwitch, Master
+from ft4fttsim.ft4ftt import FT4FTTSwitch, Master, MessageType
+from ft4fttsim.ft4ftt import PolicingViolation, SyncStreamConfig
+from ft4fttsim.networking import Message
 from ft4fttsim.exceptions import FT4FTTSimException
 
 
@@ -17,3 +22,48 @@ def test_FT4FTT_switch_constructor_raises_exception(env):
         # Invoking the FT4FTTSwitch constructor with a master that has not
         # exactly one port should raise exception.
         FT4FTTSwitch(env, "FT4FTT switch", 3, master_2ports)
+
+
+@pytest.fixture
+def switch(env, master):
+    master.ec_count = 1
+    master.ec_schedule = {
+        "stream A": SyncStreamConfig(transmission_time_ecs=1, deadline_ecs=1,
+                                     period_ecs=1, offset_ecs=0,
+                                     max_size_bytes=100),
+    }
+    return FT4FTTSwitch(env, "FT4FTT switch", 3, master)
+
+
+@pytest.mark.parametrize(
+    "stream_id, size_bytes, expected_violation",
+    [
+        ("stream A", 100, None),
+        ("stream A", 64, None),
+        ("stream A", 101, PolicingViolation.OVERSIZED),
+        ("stream B", 64, PolicingViolation.UNSCHEDULED),
+    ]
+)
+def test_police(env, switch, stream_id, size_bytes, expected_violation):
+    port = switch.external_ports[1]
+    message = Message(env, sentinel.source, sentinel.destination, size_bytes,
+                      MessageType.SYNCHRONOUS_MESSAGE, stream_id)
+    assert switch.police(message, port) == expected_violation
+    expected_counts = Counter()
+    if expected_violation is not None:
+        expected_counts[expected_violation] = 1
+    assert switch.policing_violations[port] == expected_counts
+    assert switch.policing_violations[switch.external_ports[0]] == Counter()
+
+
+def test_admitted_streams__follow_schedule_of_current_ec(switch, master):
+    assert switch.admitted_streams == {"stream A": 100}
+    master.ec_count = 2
+    master.ec_schedule = {}
+    assert switch.admitted_streams == {}
+
+
+def test_embedded_master_is_connected_without_link(env, master):
+    switch = FT4FTTSwitch(env, "FT4FTT switch", 3, master)
+    assert master.ports[0].out_queue.receiver_port is switch.internal_port
+    assert switch.internal_port.out_queue.receiver_port is master.ports[0]
@@ -2,9 +2,12 @@
 
 
 import pytest
-from ft4fttsim.ft4ftt import Master, SyncStreamConfig, MessageType
-from ft4fttsim.networking import Message
+from ft4fttsim.ft4ftt import Master, SyncStreamConfig, MessageType, ECLayout
+from ft4fttsim.ft4ftt import UpdateCounts, TMContent, TriggerMessageData
+from ft4fttsim.ft4ftt import trigger_message_size_bytes, MAX_TM_ENTRIES
+from ft4fttsim.networking import Message, NetworkDevice, Link
 from ft4fttsim.ft4ftt import Slave
+from ft4fttsim.exceptions import FT4FTTSimException
 from unittest.mock import sentinel
 
 
@@ -42,6 +45,208 @@ def update_request_message(env, master):
     return new_update_request_message
 
 
-def test_process_update_request_message(master, update_request_message):
+def test_process_update_request_message__is_applied_in_next_batch(
+        master, update_request_message):
     master.process_update_request_message(update_request_message)
+    assert master.sync_requirements == {}
+    master.apply_pending_update_requests()
     assert master.sync_requirements == dict([update_request_message.data])
+
+
+def test_sync_requirements__cannot_be_modified_in_place(
+        master, update_request_message):
+    stream_id, config = update_request_message.data
+    with pytest.raises(TypeError):
+        master.sync_requirements[stream_id] = config
+
+
+def test_master_constructor_with_too_long_ec_layout__raises_exception(env):
+    ec_layout = ECLayout(tm_window_us=500, sync_window_us=400,
+                         async_window_us=101)
+    with pytest.raises(FT4FTTSimException):
+        Master(env, "FTT master", 1, [], 1000, ec_layout=ec_layout)
+
+
+@pytest.fixture
+def master_with_layout(env):
+    ec_layout = ECLayout(tm_window_us=200, sync_window_us=300,
+                         async_window_us=400)
+    new_master = Master(env, "FTT master", 1, [], 1000, ec_layout=ec_layout)
+    new_master.ec_start_time = 0
+    return new_master
+
+
+@pytest.fixture
+def link(env):
+    d1 = NetworkDevice(env, "some device", 1)
+    d2 = NetworkDevice(env, "another device", 1)
+    # 100 Mbps, i.e., 0.08 microseconds per byte
+    return Link(env, d1.ports[0], d2.ports[0], 100, 0)
+
+
+@pytest.mark.parametrize(
+    "now, message_type, size_bytes, expected_hold_time_us",
+    [
+        # trigger messages are never held back
+        (700, MessageType.TRIGGER_MESSAGE, 1518, 0),
+        # messages are held until their window starts
+        (0, MessageType.SYNCHRONOUS_MESSAGE, 992, 200),
+        (0, MessageType.UPDATE_REQUEST, 992, 500),
+        # messages that fit into the rest of their window are not held
+        (220, MessageType.SYNCHRONOUS_MESSAGE, 992, 0),
+        (820, MessageType.UPDATE_REQUEST, 992, 0),
+        # messages that would cross the end of their window are held until
+        # the window of the next elementary cycle
+        (421, MessageType.SYNCHRONOUS_MESSAGE, 992, 779),
+        (821, MessageType.UPDATE_REQUEST, 992, 679),
+        # the hold time is relative to the current elementary cycle
+        (3000, MessageType.UPDATE_REQUEST, 992, 500),
+    ]
+)
+def test_window_hold_time(
+        env, master_with_layout, link, now, message_type, size_bytes,
+        expected_hold_time_us):
+    if now > 0:
+        env.run(until=now)
+    # Do not let the master start new elementary cycles.
+    master_with_layout.ec_start_time = 0
+    message = Message(env, sentinel.source, sentinel.destination,
+                      size_bytes, message_type)
+    assert (
+        master_with_layout.window_hold_time(message, link) ==
+        pytest.approx(expected_hold_time_us))
+
+
+def test_window_hold_time__message_larger_than_window__returns_none(
+        env, master_with_layout):
+    # At 10 Mbps, transmitting 1518 bytes takes longer than the 300
+    # microseconds of the synchronous window.
+    slow_link = Link(env, NetworkDevice(env, "d3", 1).ports[0],
+                     NetworkDevice(env, "d4", 1).ports[0], 10, 0)
+    message = Message(env, sentinel.source, sentinel.destination,
+                      1518, MessageType.SYNCHRONOUS_MESSAGE)
+    assert master_with_layout.window_hold_time(message, slow_link) is None
+
+
+def test_window_hold_time__no_ec_layout__returns_zero(env, master, link):
+    message = Message(env, sentinel.source, sentinel.destination,
+                      1518, MessageType.SYNCHRONOUS_MESSAGE)
+    assert master.window_hold_time(message, link) == 0
+
+
+@pytest.mark.parametrize(
+    "ec_count, expected_stream_ids",
+    [
+        (1, []),
+        (2, ["stream A"]),
+        (3, ["stream B"]),
+        (4, ["stream A"]),
+        (5, []),
+        (6, ["stream A"]),
+        (7, ["stream B"]),
+        (8, ["stream A"]),
+    ]
+)
+def test_compute_ec_schedule(master, ec_count, expected_stream_ids):
+    master.sync_requirements = {
+        "stream A": SyncStreamConfig(transmission_time_ecs=1, deadline_ecs=1,
+                                     period_ecs=2, offset_ecs=1),
+        "stream B": SyncStreamConfig(transmission_time_ecs=1, deadline_ecs=4,
+                                     period_ecs=4, offset_ecs=2),
+    }
+    master.ec_count = ec_count
+    schedule = master.compute_ec_schedule()
+    assert sorted(schedule) == expected_stream_ids
+    for stream_id in expected_stream_ids:
+        assert schedule[stream_id] == master.sync_requirements[stream_id]
+
+
+def test_received_update_request__is_pending(master, update_request_message):
+    master.process_received_messages([update_request_message])
+    assert master.sync_requirements == {}
+    assert master.pending_update_requests == [update_request_message]
+
+
+def test_apply_pending_update_requests__applies_batch_and_counts(
+        env, master, update_request_message):
+    second_config = SyncStreamConfig(transmission_time_ecs=2, deadline_ecs=2,
+                                     period_ecs=2, offset_ecs=0)
+    second_update_request_message = Message(
+        env, sentinel.dummy_source, master, 1234, MessageType.UPDATE_REQUEST,
+        ("synchronous stream 2", second_config))
+    rejected_update_request_message = Message(
+        env, sentinel.dummy_source, master, 1234, MessageType.UPDATE_REQUEST,
+        ("rejected stream", second_config))
+    master.passes_admission_control = (
+        lambda message, sync_requirements:
+            message is not rejected_update_request_message)
+    master.process_received_messages([
+        update_request_message, rejected_update_request_message,
+        second_update_request_message])
+    master.ec_count = 7
+    master.apply_pending_update_requests()
+    assert master.sync_requirements == dict([
+        update_request_message.data, second_update_request_message.data])
+    assert master.pending_update_requests == []
+    assert master.update_counts == {7: UpdateCounts(applied=2, rejected=1)}
+
+
+def test_apply_pending_update_requests__admits_against_the_batch(
+        env, master, update_request_message):
+    # admit a stream only if the batch does not have two streams yet
+    master.passes_admission_control = (
+        lambda message, sync_requirements: len(sync_requirements) < 2)
+    messages = [
+        Message(env, sentinel.dummy_source, master, 1234,
+                MessageType.UPDATE_REQUEST,
+                ("stream {}".format(i), update_request_message.data[1]))
+        for i in range(3)]
+    master.process_received_messages(messages)
+    master.apply_pending_update_requests()
+    assert sorted(master.sync_requirements) == ["stream 0", "stream 1"]
+    assert master.update_counts == {0: UpdateCounts(applied=2, rejected=1)}
+
+
+@pytest.fixture
+def master_3tms(env):
+    new_master = Master(env, "FTT master", 1, [], 1000, num_tms_per_ec=3)
+    new_master.ec_count = 5
+    new_master.ec_schedule = dict.fromkeys(range(7))
+    return new_master
+
+
+def test_build_trigger_messages_data__redundant(master_3tms):
+    tms_data = master_3tms.build_trigger_messages_data()
+    assert tms_data == [
+        TriggerMessageData(5, tm_index, 3, True, tuple(range(7)))
+        for tm_index in range(3)]
+
+
+def test_build_trigger_messages_data__split(master_3tms):
+    master_3tms.tm_content = TMContent.SPLIT
+    tms_data = master_3tms.build_trigger_messages_data()
+    assert tms_data == [
+        TriggerMessageData(5, 0, 3, False, (0, 1, 2)),
+        TriggerMessageData(5, 1, 3, False, (3, 4, 5)),
+        TriggerMessageData(5, 2, 3, False, (6,)),
+    ]
+
+
+@pytest.mark.parametrize("tm_content, num_streams", [
+    (TMContent.REDUNDANT, MAX_TM_ENTRIES + 1),
+    (TMContent.SPLIT, 3 * MAX_TM_ENTRIES + 1),
+])
+def test_build_trigger_messages_data__schedule_too_large__raises_exception(
+        master_3tms, tm_content, num_streams):
+    master_3tms.tm_content = tm_content
+    master_3tms.ec_schedule = dict.fromkeys(range(num_streams))
+    with pytest.raises(FT4FTTSimException):
+        master_3tms.build_trigger_messages_data()
+
+
+@pytest.mark.parametrize("num_entries, expected_size_bytes", [
+    (0, 64), (9, 64), (10, 66), (MAX_TM_ENTRIES, 1518),
+])
+def test_trigger_message_size_bytes(num_entries, expected_size_bytes):
+    tm_data = TriggerMessageData(1, 0, 1, True, tuple(range(num_entries)))
+    assert trigger_message_size_bytes(tm_data) == expected_size_bytes
@@ -0,0 +1,92 @@
+# author: David Gessner <davidges@gmail.com>
+
+from unittest.mock import sentinel
+
+import pytest
+from ft4fttsim.ft4ftt import Slave, MessageType, TriggerMessageData, ECLayout
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import Message
+
+
+@pytest.fixture
+def slave(env):
+    return Slave(env, "slave", 1)
+
+
+def make_trigger_message(env, tm_data):
+    return Message(env, sentinel.master, sentinel.slaves, 64,
+                   MessageType.TRIGGER_MESSAGE, tm_data)
+
+
+def test_redundant_trigger_messages__first_copy_is_used(env, slave):
+    first = make_trigger_message(
+        env, TriggerMessageData(3, 0, 2, True, ("stream A",)))
+    second = make_trigger_message(
+        env, TriggerMessageData(3, 1, 2, True, ("stream A",)))
+    slave.process_received_messages([first, second])
+    assert slave.ec_number == 3
+    assert slave.ec_schedule == ("stream A",)
+
+
+def test_split_trigger_messages__slices_are_collected(env, slave):
+    first = make_trigger_message(
+        env, TriggerMessageData(3, 0, 2, False, ("stream A",)))
+    second = make_trigger_message(
+        env, TriggerMessageData(3, 1, 2, False, ("stream B",)))
+    slave.process_received_messages([first, second])
+    assert slave.ec_schedule == ("stream A", "stream B")
+
+
+def test_split_trigger_messages__repeated_slices_are_ignored(env, slave):
+    # the trigger messages of two masters, the second one out of order
+    tms_data = [TriggerMessageData(3, 0, 2, False, ("stream A",)),
+                TriggerMessageData(3, 1, 2, False, ("stream B",)),
+                TriggerMessageData(3, 1, 2, False, ("stream B",)),
+                TriggerMessageData(3, 0, 2, False, ("stream A",))]
+    slave.process_received_messages(
+        [make_trigger_message(env, tm_data) for tm_data in tms_data])
+    assert slave.ec_schedule == ("stream A", "stream B")
+
+
+def test_split_trigger_messages__slices_are_ordered_by_index(env, slave):
+    first = make_trigger_message(
+        env, TriggerMessageData(3, 1, 2, False, ("stream B",)))
+    second = make_trigger_message(
+        env, TriggerMessageData(3, 0, 2, False, ("stream A",)))
+    slave.process_received_messages([first, second])
+    assert slave.ec_schedule == ("stream A", "stream B")
+
+
+def test_new_ec__replaces_schedule(env, slave):
+    first = make_trigger_message(
+        env, TriggerMessageData(3, 0, 1, True, ("stream A",)))
+    second = make_trigger_message(
+        env, TriggerMessageData(4, 0, 1, True, ("stream B",)))
+    slave.process_received_messages([first, second])
+    assert slave.ec_number == 4
+    assert slave.ec_schedule == ("stream B",)
+
+
+@pytest.mark.parametrize("invalid_data", [
+    None,
+    "garbage",
+    # trigger message of an earlier elementary cycle
+    TriggerMessageData(2, 0, 1, True, ("stream B",)),
+])
+def test_invalid_trigger_messages_are_ignored(env, slave, invalid_data):
+    valid = make_trigger_message(
+        env, TriggerMessageData(3, 0, 1, True, ("stream A",)))
+    invalid = make_trigger_message(env, invalid_data)
+    slave.process_received_messages([valid, invalid])
+    assert slave.ec_number == 3
+    assert slave.ec_schedule == ("stream A",)
+
+
+@pytest.mark.parametrize("ec_duration_us", [None, 1000])
+def test_slave_constructor_with_invalid_ec_layout__raises_exception(
+        env, ec_duration_us):
+    ec_layout = ECLayout(tm_window_us=500, sync_window_us=400,
+                         async_window_us=101)
+    with pytest.raises(FT4FTTSimException):
+        Slave(env, "slave", 1, ec_duration_us=ec_duration_us,
+              ec_layout=ec_layout)
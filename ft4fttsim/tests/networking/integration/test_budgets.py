@@ -0,0 +1,152 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Check that the memory and the events needed to simulate large networks stay
+within budgets, so that changes that make them grow are noticed.
+
+The networks are lines, rings, stars and trees of switches built with
+ft4fttsim.synthetic, with a host attached to every switch (to every leaf
+switch in trees and stars). Every host transmits a burst of messages at
+time 0 to the host halfway across the list of hosts, and records the
+messages it receives:
+
+                   host0_0                   host1_0
+                      |                         |
+                 +-----0-------+           +-----0-------+
+ ... ----------- 1   switch0   2 --------- 1   switch1   2 ----- ...
+                 +-------------+           +-------------+
+
+The budgets are about twice the values measured when they were set, so
+that they hold on any Linux box and Python version but still catch changes
+that double the cost of a device or of a frame.
+
+"""
+
+import tracemalloc
+
+import pytest
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.networking import Message, MessagePlaybackAndRecordingDevice
+from ft4fttsim.synthetic import line, ring, star, tree
+from ft4fttsim.tests.networking.networkhelper import hosts_of
+
+
+# Peak memory allocated to build a network, per device (counting switches
+# and hosts) and per entry of the forwarding tables of the switches.
+BYTES_PER_DEVICE = 14000
+BYTES_PER_FORWARDING_ENTRY = 250
+
+# Memory allocated for a message waiting to be transmitted, besides the
+# message itself.
+BYTES_PER_QUEUED_FRAME = 1300
+
+# Events processed per message and per link it crosses.
+EVENTS_PER_FRAME_HOP = 14
+
+# Number of messages of the burst of each host.
+BURST_SIZE = 10
+
+
+BUILD_NETWORKS = [
+    lambda env: line(env, 20, make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: ring(env, 30, make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: star(env, 29, make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: tree(env, 4, 3, make_host=MessagePlaybackAndRecordingDevice),
+]
+
+
+def load_bursts(network):
+    """
+    Make host i transmit a burst of messages at time 0 to host
+    (i + n / 2) mod n, where n is the number of hosts.
+
+    Returns:
+        A list of (player, recorder) tuples of the transmitting and the
+        receiving hosts.
+
+    """
+    hosts = hosts_of(network)
+    pairs = []
+    for i, player in enumerate(hosts):
+        recorder = hosts[(i + len(hosts) // 2) % len(hosts)]
+        messages = [Message(player.env, player, recorder, 1000, "burst", j)
+                    for j in range(BURST_SIZE)]
+        player.load_transmission_commands({0: {player.ports[0]: messages}})
+        pairs.append((player, recorder))
+    return pairs
+
+
+def num_hops(network, player, recorder):
+    """
+    Return the number of links crossed by the messages from player to
+    recorder.
+
+    """
+    peer_of_port = {}
+    device_of_port = {}
+    for link in network.links:
+        for sublink in link.sublink:
+            peer_of_port[sublink.transmitter_port] = sublink.receiver_port
+    for device in network.devices.values():
+        for port in device.ports:
+            device_of_port[port] = device
+    hops = 1
+    device = device_of_port[peer_of_port[player.ports[0]]]
+    while device is not recorder:
+        [port] = device.forwarding_table[recorder]
+        device = device_of_port[peer_of_port[port]]
+        hops += 1
+    return hops
+
+
+@pytest.fixture(params=BUILD_NETWORKS,
+                ids=["line", "ring", "star", "tree"])
+def build_network(request):
+    return request.param
+
+
+def test_memory_per_device(build_network):
+    tracemalloc.start()
+    try:
+        network = build_network(kernel.Environment())
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    num_entries = sum(len(device.forwarding_table)
+                      for name, device in network.devices.items()
+                      if name.startswith("switch"))
+    assert peak_bytes < (BYTES_PER_DEVICE * len(network.devices) +
+                         BYTES_PER_FORWARDING_ENTRY * num_entries)
+
+
+def test_memory_per_queued_frame(build_network):
+    env = kernel.Environment()
+    network = build_network(env)
+    pairs = load_bursts(network)
+    tracemalloc.start()
+    try:
+        before_bytes = tracemalloc.get_traced_memory()[0]
+        # all the messages have been handed to the ports, but most of them
+        # are still waiting to be transmitted
+        env.run(until=1)
+        queued_bytes = tracemalloc.get_traced_memory()[0] - before_bytes
+    finally:
+        tracemalloc.stop()
+    assert queued_bytes / (len(pairs) * BURST_SIZE) < BYTES_PER_QUEUED_FRAME
+
+
+def test_events_per_frame_hop(build_network):
+    env = kernel.Environment()
+    network = build_network(env)
+    pairs = load_bursts(network)
+    num_events = 0
+    while env.peek() < float("inf"):
+        env.step()
+        num_events += 1
+    num_frame_hops = 0
+    for player, recorder in pairs:
+        received = sum(len(messages)
+                       for messages in recorder.reception_records.values())
+        assert received == BURST_SIZE
+        num_frame_hops += BURST_SIZE * num_hops(network, player, recorder)
+    assert num_events / num_frame_hops < EVENTS_PER_FRAME_HOP
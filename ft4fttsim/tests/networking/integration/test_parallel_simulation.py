@@ -0,0 +1,84 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Compare parallel and sequential simulations of the following networks:
+
++---------+       +---------+       +---------+       +-----------+
+| player1 0 ----> 0         |       |         1 ----> 0 recorder1 |
++---------+       | switch1 2 ----> 0 switch2 |       +-----------+
++---------+       |         |       |         |       +-----------+
+| player2 0 ----> 1         |       |         2 ----> 0 recorder2 |
++---------+       +---------+       +---------+       +-----------+
+
++-------+       +---------------+       +-------+
+| slave 0 ----- 0 FT4FTT switch 1 ----- 0 slave |
+|   0   |       | with embedded |       |   1   |
++-------+       |    master     |       +-------+
+                +---------------+
+
+"""
+
+import pytest
+import simpy
+
+from ft4fttsim.parallel import ParallelSimulation, partition_network
+from ft4fttsim.parallel import summarize_device
+from ft4fttsim.tests.networking.networkhelper import build_switched_network
+from ft4fttsim.tests.networking.networkhelper import build_ft4ftt_network
+
+
+def run_sequentially(build_network, until):
+    env = simpy.Environment()
+    devices, _ = build_network(env)
+    env.run(until=until)
+    return dict((device.name, summarize_device(device))
+                for device in devices)
+
+
+def normalized(summaries):
+    """
+    Sort the messages received at the same instant of time, since their order
+    may differ between sequential and parallel simulations.
+
+    """
+    return dict(
+        (name, summary if summary is None else dict(
+            (time, sorted(records, key=repr))
+            for time, records in summary.items()))
+        for name, summary in summaries.items())
+
+
+@pytest.mark.parametrize("build_network, until", [
+    (build_switched_network, float("inf")),
+    (build_switched_network, 500),
+    (build_ft4ftt_network, 5500),
+])
+@pytest.mark.parametrize("num_partitions", [1, 2, 3, 6])
+def test_parallel_simulation_matches_sequential_simulation(
+        build_network, until, num_partitions):
+    simulation = ParallelSimulation(build_network, num_partitions)
+    summaries = simulation.run(until)
+    expected_summaries = run_sequentially(build_network, until)
+    assert normalized(summaries) == normalized(expected_summaries)
+
+
+def test_partition_network__keeps_embedded_master_with_switch(env):
+    devices, links = build_ft4ftt_network(env)
+    partitions = partition_network(devices, links, 4)
+    assert len(partitions) == 3
+    assert ["FT4FTT switch", "master"] in [
+        sorted(partition) for partition in partitions]
+
+
+def test_partition_network__partitions_have_similar_size(env):
+    devices, links = build_switched_network(env)
+    partitions = partition_network(devices, links, 3)
+    assert sorted(len(partition) for partition in partitions) == [2, 2, 2]
+    assert sorted(sum(partitions, [])) == sorted(d.name for d in devices)
+
+
+def test_lookahead_is_smallest_lookahead_of_cut_links():
+    simulation = ParallelSimulation(build_switched_network, 2)
+    # The cut links in this network are 100 Mbps links with a propagation
+    # delay of 1 or 3 microseconds or a 1000 Mbps link with a propagation
+    # delay of 2 microseconds.
+    assert simulation.lookahead in (1 + 5.76, 2 + 0.576, 3 + 5.76)
@@ -0,0 +1,260 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Connect the following simulated network to an external program through a
+bridge:
+
++--------+              +--------+              +----------+
+| player 0 ----------- 0 switch 1 ----------- 0 recorder |
++--------+              +---2----+              +----------+
+                            |
+                        +---0----+   socket
+                        | bridge |----------- external program
+                        +--------+
+
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+import simpy
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.ft4ftt import (
+    Master, MessageType, SyncStreamConfig, TriggerMessageData)
+from ft4fttsim.networking import (
+    Link, Message, MessagePlaybackDevice, MessageRecordingDevice,
+    MulticastGroup, Switch)
+from ft4fttsim.realtime import (
+    RealtimePacer, SocketBridge, decode_messages, encode_messages)
+
+
+def tick(env, period, num_ticks, busy_s=0):
+    """
+    Simpy process that waits for period num_ticks times, keeping the CPU
+    busy for busy_s seconds of wall clock time after each wait.
+
+    """
+    for _ in range(num_ticks):
+        yield env.timeout(period)
+        time.sleep(busy_s)
+
+
+@pytest.fixture
+def network(env):
+    """
+    Return the player, the recorder, the bridge and the end of the socket of
+    the external program. The player transmits two messages to the bridge at
+    time 1000.
+
+    """
+    program_end, bridge_end = socket.socketpair(socket.AF_UNIX,
+                                                socket.SOCK_DGRAM)
+    program_end.settimeout(5)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    bridge = SocketBridge(env, "bridge", bridge_end)
+    switch = Switch(env, "switch", 3)
+    switch.forwarding_table = {player: [switch.ports[0]],
+                               recorder: [switch.ports[1]],
+                               bridge: [switch.ports[2]]}
+    Link(env, player.ports[0], switch.ports[0], 100, 1)
+    Link(env, switch.ports[1], recorder.ports[0], 100, 1)
+    Link(env, switch.ports[2], bridge.ports[0], 100, 1)
+    bridge.devices_by_name = {"player": player, "recorder": recorder,
+                              "bridge": bridge}
+    player.load_transmission_commands({1000: {player.ports[0]: [
+        Message(env, player, bridge, 100, "request", i) for i in range(2)]}})
+    yield player, recorder, bridge, program_end
+    program_end.close()
+    bridge_end.close()
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_run__follows_the_wall_clock(environment):
+    env = environment()
+    env.process(tick(env, 1000, 20))
+    pacer = RealtimePacer(env)
+    start = time.perf_counter()
+    stats = pacer.run(until=30000)
+    assert time.perf_counter() - start >= 0.03
+    assert env.now == 30000
+    # the initialization of the process and the 20 ticks
+    assert stats.num_deadlines == 21
+    assert stats.wall_time_s >= 0.03
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_run_async__follows_the_wall_clock(environment):
+    env = environment()
+    env.process(tick(env, 1000, 20))
+    pacer = RealtimePacer(env)
+    start = time.perf_counter()
+    stats = asyncio.run(pacer.run_async(until=30000))
+    assert time.perf_counter() - start >= 0.03
+    assert env.now == 30000
+    assert stats.num_deadlines == 21
+
+
+def test_run__ends_when_no_more_events_are_scheduled(env):
+    env.process(tick(env, 1000, 5))
+    stats = RealtimePacer(env, speed=10).run()
+    assert env.now == 5000
+    assert stats.wall_time_s < 0.5
+
+
+def test_stats__count_deadline_misses(env):
+    env.process(tick(env, 1000, 10, busy_s=0.005))
+    stats = RealtimePacer(env, tolerance_s=0.002).run()
+    assert stats.num_deadlines == 11
+    # every tick is processed 4 ms late because of the previous one
+    assert stats.num_misses >= 8
+    assert stats.max_lag_s >= 0.004
+    assert stats.mean_lag_s > 0.002
+
+
+def test_bridge__exchanges_frames_with_the_external_program(env, network):
+    player, recorder, bridge, program_end = network
+
+    def external_program():
+        # The requests are received by the bridge one after the other, so
+        # they come in separate batches. Answer each batch of requests with
+        # a batch of replies.
+        for _ in range(2):
+            frames = json.loads(program_end.recv(65536).decode("utf-8"))
+            replies = [["bridge", "recorder", 100, "reply", data]
+                       for _, _, _, _, data in frames]
+            program_end.send(json.dumps(replies).encode("utf-8"))
+    program = threading.Thread(target=external_program)
+    program.start()
+    pacer = RealtimePacer(env, bridges=[bridge])
+    stats = pacer.run(until=20000)
+    program.join()
+    assert bridge.num_frames_sent == 2
+    assert bridge.num_frames_received == 2
+    replies = recorder.recorded_messages
+    assert [(reply.source, reply.message_type, reply.data)
+            for reply in replies] == [(bridge, "reply", 0),
+                                      (bridge, "reply", 1)]
+    # the replies are transmitted once they have been read, i.e., after the
+    # requests were received by the bridge
+    assert min(recorder.recorded_timestamps) > 1000
+    assert stats.num_deadlines > 0
+
+
+def test_run_async__exchanges_frames_with_a_task_of_the_loop(env, network):
+    player, recorder, bridge, program_end = network
+    program_end.setblocking(False)
+
+    async def external_program():
+        loop = asyncio.get_running_loop()
+        for _ in range(2):
+            datagram = await loop.sock_recv(program_end, 65536)
+            frames = json.loads(datagram.decode("utf-8"))
+            replies = [["bridge", "recorder", 100, "reply", data]
+                       for _, _, _, _, data in frames]
+            await loop.sock_sendall(
+                program_end, json.dumps(replies).encode("utf-8"))
+
+    async def main():
+        program = asyncio.ensure_future(external_program())
+        stats = await RealtimePacer(env, bridges=[bridge]).run_async(
+            until=20000)
+        await program
+        return stats
+    stats = asyncio.run(main())
+    assert bridge.num_frames_received == 2
+    assert [(reply.source, reply.message_type, reply.data)
+            for reply in recorder.recorded_messages] == [
+        (bridge, "reply", 0), (bridge, "reply", 1)]
+    assert min(recorder.recorded_timestamps) > 1000
+    assert stats.num_deadlines > 0
+
+
+def test_bridge__splits_batches_larger_than_a_datagram(env, network):
+    player, _, bridge, program_end = network
+    bridge.max_datagram_bytes = 50
+    bridge.send_messages([Message(env, player, bridge, 100, "request", i)
+                          for i in range(3)])
+    program_end.setblocking(False)
+    datagrams = []
+    while True:
+        try:
+            datagrams.append(program_end.recv(65536))
+        except BlockingIOError:
+            break
+    assert len(datagrams) == 3
+    assert all(len(datagram) <= 50 for datagram in datagrams)
+    assert bridge.num_frames_sent == 3
+
+
+def test_bridge__counts_datagrams_the_program_does_not_read(env, network):
+    _, _, bridge, program_end = network
+    program_end.close()
+    RealtimePacer(env, speed=100).run(until=2000)
+    assert bridge.num_datagrams_dropped == 2
+    assert bridge.num_frames_sent == 0
+
+
+def test_decode_messages__reverts_encode_messages(env):
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    devices_by_name = {"player": player, "recorder": recorder}
+    messages = [
+        Message(env, player, recorder, 100, "unicast", (1, "a")),
+        Message(env, player, MulticastGroup("group", [player, recorder]),
+                200, "multicast", None),
+        Message(env, player, [recorder], 300, "list", [1, 2]),
+        Message(env, player, "unknown", 64, MessageType.TRIGGER_MESSAGE,
+                TriggerMessageData(3, 0, 1, True, (7, 8))),
+    ]
+    decoded = decode_messages(env, encode_messages(messages),
+                              devices_by_name)
+    assert decoded[:3] == messages[:2] + [
+        Message(env, player, [recorder], 300, "list", (1, 2))]
+    assert decoded[3].destination == "unknown"
+    assert isinstance(decoded[3].data, TriggerMessageData)
+    assert decoded[3].data == messages[3].data
+
+
+def test_decode_messages__update_requests_can_be_applied_by_a_master(env):
+    bridge = MessageRecordingDevice(env, "bridge", 1)
+    master = Master(env, "master", 1, [bridge], ec_duration_us=1000)
+    config = SyncStreamConfig(transmission_time_ecs=1, deadline_ecs=2,
+                              period_ecs=2, offset_ecs=1, max_size_bytes=100)
+    request = Message(env, bridge, master, 64, MessageType.UPDATE_REQUEST,
+                      ("stream", config))
+    [decoded] = decode_messages(env, encode_messages([request]),
+                                {"bridge": bridge, "master": master})
+    master.process_received_messages([decoded])
+    master.apply_pending_update_requests()
+    assert master.sync_requirements == {"stream": config}
+    assert isinstance(master.sync_requirements["stream"], SyncStreamConfig)
+    master.ec_count = 2
+    assert master.compute_ec_schedule() == {"stream": config}
+
+
+def test_send_messages__data_that_cannot_be_encoded__raises_exception(
+        env, network):
+    player, _, bridge, _ = network
+    messages = [Message(env, player, bridge, 100, "request", 0),
+                Message(env, player, bridge, 100, "request", object())]
+    with pytest.raises(FT4FTTSimException) as error:
+        bridge.send_messages(messages)
+    assert messages[1].name in str(error.value)
+
+
+def test_decode_messages__invalid_datagram__raises_exception(env):
+    with pytest.raises(FT4FTTSimException):
+        decode_messages(env, b"[[\"a\", \"b\"]]", {})
+
+
+def test_pacer_constructor__raises_exception(env):
+    with pytest.raises(FT4FTTSimException):
+        RealtimePacer(env, speed=0)
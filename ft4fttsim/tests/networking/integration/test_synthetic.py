@@ -0,0 +1,152 @@
+# author: David Gessner <davidges@gmail.com>
+
+import gc
+import time
+
+import pytest
+import simpy
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import (
+    Message, MessagePlaybackAndRecordingDevice, MulticastGroup)
+from ft4fttsim.synthetic import (
+    dual_star, fat_tree, line, ring, star, tree)
+from ft4fttsim.tests.networking.networkhelper import hosts_of
+
+
+def send_to_all(network):
+    """
+    Make every host transmit a message to every other host at time 0, and
+    return the hosts.
+
+    """
+    hosts = hosts_of(network)
+    for host in hosts:
+        messages = [Message(host.env, host, other, 100, "hello", host.name)
+                    for other in hosts if other is not host]
+        host.load_transmission_commands({0: {host.ports[0]: messages}})
+    return hosts
+
+
+def received_data(host):
+    return sorted(message.data for messages in host.reception_records.values()
+                  for message in messages)
+
+
+@pytest.mark.parametrize("build_network", [
+    lambda env: line(env, 5, 2, make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: ring(env, 6, 1, make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: ring(env, 7, 2, make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: ring(env, 2, 2, make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: tree(env, 3, 3, 2,
+                     make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: tree(env, 3, 1, 2,
+                     make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: fat_tree(env, 3, 2, 2,
+                         make_host=MessagePlaybackAndRecordingDevice),
+    lambda env: star(env, 4, 3, make_host=MessagePlaybackAndRecordingDevice),
+], ids=["line", "even ring", "odd ring", "ring of 2", "tree", "tree of 1",
+        "fat tree", "star"])
+def test_every_host__receives_each_message_once(env, build_network):
+    hosts = send_to_all(build_network(env))
+    env.run()
+    names = [host.name for host in hosts]
+    for host in hosts:
+        assert received_data(host) == [name for name in names
+                                       if name != host.name]
+
+
+def test_ring__routes_along_the_shorter_side(env):
+    network = ring(env, 6, 1)
+    switch0 = network.devices["switch0"]
+    previous_port, next_port = switch0.ports[1], switch0.ports[2]
+    assert switch0.forwarding_table[network.devices["host2_0"]] == [next_port]
+    assert switch0.forwarding_table[network.devices["host4_0"]] == [
+        previous_port]
+
+
+def test_tree__routes_through_the_children_and_the_parent(env):
+    network = tree(env, 3, 2, 1)
+    # switch1 has children switch3 and switch4
+    switch1 = network.devices["switch1"]
+    table = switch1.forwarding_table
+    assert table[network.devices["host3_0"]] == [switch1.ports[0]]
+    assert table[network.devices["host4_0"]] == [switch1.ports[1]]
+    assert table[network.devices["host5_0"]] == [switch1.ports[2]]
+
+
+def test_tree__multicast_reaches_each_member_once(env):
+    network = tree(env, 3, 3, 2, make_host=MessagePlaybackAndRecordingDevice)
+    hosts = hosts_of(network)
+    group = MulticastGroup("group", hosts[1::3])
+    sender = hosts[0]
+    sender.load_transmission_commands({0: {sender.ports[0]: [
+        Message(env, sender, group, 100, "hello", "data")]}})
+    env.run()
+    for host in hosts:
+        assert received_data(host) == (["data"] if host in group else [])
+
+
+def test_fat_tree__links_get_faster_towards_the_root(env):
+    network = fat_tree(env, 3, 2, 4, megabits_per_second=10)
+    speeds = dict(
+        (str(link.sublink[0]), link.megabits_per_second)
+        for link in network.links)
+    assert speeds["switch3-port0->host3_0-port0"] == 10
+    assert speeds["switch1-port0->switch3-port4"] == 40
+    assert speeds["switch0-port0->switch1-port2"] == 80
+
+
+def test_unknown_destinations__are_not_flooded(env):
+    network = line(env, 3, 1)
+    stranger = MessagePlaybackAndRecordingDevice(env, "stranger", 1)
+    table = network.devices["switch1"].forwarding_table
+    assert table.get(stranger, "default") == "default"
+    with pytest.raises(KeyError):
+        table[stranger]
+
+
+def test_dual_star__slaves_receive_the_trigger_messages_of_both_masters(env):
+    network = dual_star(env, 5, ec_duration_us=1000, num_tms_per_ec=2)
+    env.run(until=2500)
+    for i in range(5):
+        slave = network.devices["slave{}".format(i)]
+        num_received = sum(len(messages)
+                           for messages in slave.reception_records.values())
+        # 2 masters * 2 trigger messages * 3 elementary cycles
+        assert num_received == 12
+        assert slave.ec_number == 3
+
+
+@pytest.mark.slow
+def test_large_networks__are_built_quickly():
+    env = kernel.Environment()
+    start = time.perf_counter()
+    network = tree(env, 3, 30, 10)
+    assert time.perf_counter() - start < 1
+    assert len(network.devices) == 9931
+    assert gc.isenabled()
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_large_dual_stars__are_built_quickly(environment):
+    env = environment()
+    start = time.perf_counter()
+    network = dual_star(env, 5000)
+    assert time.perf_counter() - start < 1
+    # 5000 slaves, 2 masters and 2 switches
+    assert len(network.devices) == 5004
+
+
+@pytest.mark.parametrize("build_network", [
+    lambda env: line(env, 0),
+    lambda env: tree(env, 0, 2),
+    lambda env: tree(env, 2, 0),
+    lambda env: dual_star(env, 0),
+])
+def test_generators__raise_exception(env, build_network):
+    with pytest.raises(FT4FTTSimException):
+        build_network(env)
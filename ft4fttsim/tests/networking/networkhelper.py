@@ -0,0 +1,98 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Networks and scenarios shared by several test modules.
+
+build_switched_network builds the following network:
+
++---------+       +---------+       +---------+       +-----------+
+| player1 0 ----> 0         |       |         1 ----> 0 recorder1 |
++---------+       | switch1 2 ----> 0 switch2 |       +-----------+
++---------+       |         |       |         |       +-----------+
+| player2 0 ----> 1         |       |         2 ----> 0 recorder2 |
++---------+       +---------+       +---------+       +-----------+
+
+build_ft4ftt_network builds the following network:
+
++-------+       +---------------+       +-------+
+| slave 0 ----- 0 FT4FTT switch 1 ----- 0 slave |
+|   0   |       | with embedded |       |   1   |
++-------+       |    master     |       +-------+
+                +---------------+
+
+player_recorder_scenario is a sweep scenario of the following network:
+
++--------+       +----------+
+| player 0 ----> 0 recorder |
++--------+       +----------+
+
+"""
+
+from ft4fttsim.ft4ftt import FT4FTTSwitch, Master, RecordingSlave
+from ft4fttsim.networking import Link, MessageRecordingDevice, Switch
+from ft4fttsim.tests.networking.fixturehelper import make_playback_device
+from ft4fttsim.tests.networking.fixturehelper import make_link
+
+
+def build_switched_network(env):
+    recorder1 = MessageRecordingDevice(env, "recorder1", 1)
+    recorder2 = MessageRecordingDevice(env, "recorder2", 1)
+    player1 = make_playback_device(
+        "8 messages", env, [recorder1, recorder2], name="player1")
+    player2 = make_playback_device(
+        "3 batches of 2 messages", env, recorder2, name="player2")
+    switch1 = Switch(env, "switch1", 3)
+    switch2 = Switch(env, "switch2", 3)
+    links = [
+        Link(env, player1.ports[0], switch1.ports[0], 100, 1),
+        Link(env, player2.ports[0], switch1.ports[1], 100, 1),
+        Link(env, switch1.ports[2], switch2.ports[0], 1000, 2),
+        Link(env, switch2.ports[1], recorder1.ports[0], 100, 3),
+        Link(env, switch2.ports[2], recorder2.ports[0], 10, 4),
+    ]
+    switch1.forwarding_table = {
+        recorder1: [switch1.ports[2]],
+        recorder2: [switch1.ports[2]],
+    }
+    switch2.forwarding_table = {
+        recorder1: [switch2.ports[1]],
+        recorder2: [switch2.ports[2]],
+    }
+    devices = [player1, player2, switch1, switch2, recorder1, recorder2]
+    return devices, links
+
+
+def build_ft4ftt_network(env):
+    slaves = [RecordingSlave(env, "slave0"), RecordingSlave(env, "slave1")]
+    master = Master(env, "master", 1, slaves, 1000, num_tms_per_ec=2)
+    switch = FT4FTTSwitch(env, "FT4FTT switch", 2, master)
+    links = [Link(env, switch.ports[i], slave.ports[0], 100, 5)
+             for i, slave in enumerate(slaves)]
+    return slaves + [master, switch], links
+
+
+def player_recorder_scenario(env, link_config, playback_config):
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    player = make_playback_device(playback_config, env, recorder)
+    make_link(link_config, env, player.ports[0], recorder.ports[0])
+
+    def summarize():
+        return {
+            "received": sum(len(messages) for messages in
+                            recorder.reception_records.values()),
+            "last reception": max(recorder.reception_records),
+        }
+    return summarize
+
+
+def failing_scenario(env):
+    raise ValueError("bad scenario")
+
+
+def hosts_of(network):
+    """
+    Return the hosts of a network built by ft4fttsim.synthetic, sorted by
+    name.
+
+    """
+    return [device for name, device in sorted(network.devices.items())
+            if name.startswith("host")]
@@ -0,0 +1,102 @@
+# author: David Gessner <davidges@gmail.com>
+
+import json
+
+import pytest
+import simpy
+
+from ft4fttsim.benchmark import (
+    PARALLEL_SCENARIOS, SCENARIOS, compare, ft4ftt_fan_out, main,
+    run_benchmark, run_parallel_benchmark, run_suite)
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+@pytest.mark.parametrize("name", sorted(SCENARIOS))
+def test_run_benchmark__counts_the_same_in_simpy_and_in_the_kernel(name):
+    results = [run_benchmark(name, environment, size=3, duration_us=3000,
+                             measure_memory=False)
+               for environment in ["simpy", "kernel"]]
+    assert results[0].num_frames > 0
+    assert results[0].num_events > results[0].num_frames
+    assert ((results[0].num_events, results[0].num_frames) ==
+            (results[1].num_events, results[1].num_frames))
+
+
+def test_ft4ftt_fan_out__slaves_record_and_follow_the_trigger_messages():
+    env = simpy.Environment()
+    slaves = ft4ftt_fan_out(env, 2, 2500)
+    env.run(until=2500)
+    for slave in slaves:
+        num_received = sum(len(messages)
+                           for messages in slave.reception_records.values())
+        # 2 trigger messages * 3 elementary cycles
+        assert num_received == 6
+        assert slave.ec_number == 3
+
+
+def test_run_benchmark__measures_peak_memory():
+    result = run_benchmark("player_to_recorder", size=2, duration_us=1000)
+    assert result.peak_memory_bytes > 0
+
+
+@pytest.mark.parametrize("name, environment", [
+    ("no such scenario", "simpy"),
+    ("player_to_recorder", "no such environment"),
+])
+def test_run_benchmark__raises_exception(name, environment):
+    with pytest.raises(FT4FTTSimException):
+        run_benchmark(name, environment)
+
+
+@pytest.mark.parametrize("name", sorted(PARALLEL_SCENARIOS))
+def test_run_parallel_benchmark__reports_the_speedup(name):
+    result = run_parallel_benchmark(name, 2, size=4, duration_us=2000)
+    assert result.num_frames > 0
+    assert result.num_windows > 0
+    assert result.speedup == pytest.approx(
+        result.sequential_wall_time_s / result.parallel_wall_time_s)
+
+
+def test_run_parallel_benchmark__raises_exception():
+    with pytest.raises(FT4FTTSimException):
+        run_parallel_benchmark("no such scenario", 2)
+
+
+def test_run_suite__gives_the_scaling_exponents():
+    results = run_suite(["switch_chain"], sizes=[1, 2],
+                        measure_memory=False)
+    assert [result["size"] for result in results["results"]] == [1, 2]
+    assert "switch_chain/simpy" in results["scaling"]
+    json.dumps(results)
+
+
+def test_compare__finds_regressions():
+    baseline = {"results": [
+        {"scenario": "a", "environment": "simpy", "size": 1,
+         "events_per_s": 1000.0, "peak_memory_bytes": 100},
+        {"scenario": "a", "environment": "simpy", "size": 2,
+         "events_per_s": 1000.0, "peak_memory_bytes": 100},
+    ]}
+    current = {"results": [
+        {"scenario": "a", "environment": "simpy", "size": 1,
+         "events_per_s": 950.0, "peak_memory_bytes": 105},
+        {"scenario": "a", "environment": "simpy", "size": 2,
+         "events_per_s": 500.0, "peak_memory_bytes": 200},
+    ]}
+    assert compare(baseline, current, tolerance=0.1) == [
+        ("a", "simpy", 2, "events_per_s", 1000.0, 500.0),
+        ("a", "simpy", 2, "peak_memory_bytes", 100, 200),
+    ]
+
+
+def test_main__writes_json_results(tmpdir):
+    output = str(tmpdir.join("benchmark.json"))
+    assert main(["--output", output, "--scenario", "player_to_recorder",
+                 "--size", "1", "--no-memory"]) == 0
+    with open(output) as output_file:
+        results = json.load(output_file)
+    assert results["results"][0]["scenario"] == "player_to_recorder"
+    assert "parallel" not in results
+    assert main(["--output", output, "--scenario", "player_to_recorder",
+                 "--size", "1", "--no-memory", "--compare", output,
+                 "--tolerance", "1"]) == 0
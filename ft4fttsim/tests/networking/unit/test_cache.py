@@ -0,0 +1,91 @@
+# author: David Gessner <davidges@gmail.com>
+
+import os
+
+import pytest
+
+import ft4fttsim
+from ft4fttsim.cache import ResultCache, CacheStats, scenario_key
+from ft4fttsim.cache import canonical_repr
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.ft4ftt import SyncStreamConfig
+from ft4fttsim.sweep import grid, run_sweep, SweepStatus
+from ft4fttsim.tests.networking.networkhelper import (
+    player_recorder_scenario, failing_scenario)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"))
+
+
+def test_canonical_repr__ignores_dictionary_order():
+    assert canonical_repr({"a": 1, "b": 2}) == canonical_repr({"b": 2, "a": 1})
+
+
+def test_canonical_repr__includes_sync_stream_config_fields():
+    config = SyncStreamConfig(1000, 0, 1, 2, 200)
+    assert canonical_repr(config) == (
+        "SyncStreamConfig(transmission_time_ecs=1000, deadline_ecs=0, "
+        "period_ecs=1, offset_ecs=2, max_size_bytes=200)")
+
+
+def test_canonical_repr__rejects_objects_identified_by_address():
+    with pytest.raises(FT4FTTSimException):
+        canonical_repr({"device": object()})
+
+
+def test_scenario_key__depends_on_params_until_and_version(monkeypatch):
+    params = {"link_config": (100, 0), "playback_config": "2 messages"}
+    key = scenario_key(player_recorder_scenario, params, 100)
+    assert key == scenario_key(player_recorder_scenario, dict(params), 100)
+    assert key != scenario_key(player_recorder_scenario, params, 200)
+    assert key != scenario_key(
+        player_recorder_scenario, dict(params, link_config=(10, 0)), 100)
+    monkeypatch.setattr(ft4fttsim, "__version__", "0.0.0")
+    assert key != scenario_key(player_recorder_scenario, params, 100)
+
+
+def test_get__counts_hits_and_misses(cache):
+    assert cache.get("key") is None
+    cache.put("key", {"received": 3})
+    assert "key" in cache
+    assert cache.get("key") == {"received": 3}
+    assert cache.stats == CacheStats(hits=1, misses=1, evictions=0)
+
+
+def test_put__evicts_least_recently_used_results(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for age, key in enumerate(["new", "old", "used"]):
+        cache.put(key, bytes(1000))
+        # make the result appear to have been used age hours ago
+        last_use = 1000000000 - 3600 * age
+        os.utime(os.path.join(str(tmp_path), key + ".pickle"),
+                 (last_use, last_use))
+    cache.max_size_bytes = 2500
+    cache.get("used")
+    cache.put("newest", bytes(1000))
+    assert [key in cache for key in ["newest", "new", "old", "used"]] == [
+        True, False, False, True]
+    assert cache.stats.evictions == 2
+    assert cache.size_bytes() <= 2500
+
+
+def test_run_sweep__reuses_cached_summaries(cache):
+    points = grid(link_config=[(10, 3), (1000, 9)],
+                  playback_config=["8 messages"])
+    first_results = run_sweep(player_recorder_scenario, points[:1],
+                              cache=cache)
+    assert cache.stats == CacheStats(hits=0, misses=1, evictions=0)
+    results = run_sweep(player_recorder_scenario, points, cache=cache)
+    assert cache.stats == CacheStats(hits=1, misses=2, evictions=0)
+    assert results[0] == first_results[0]._replace(wall_time_s=0.0)
+    assert results[1].status == SweepStatus.OK
+    assert results[1].wall_time_s > 0
+
+
+def test_run_sweep__does_not_cache_errors(cache):
+    run_sweep(failing_scenario, [{}], cache=cache)
+    results = run_sweep(failing_scenario, [{}], cache=cache)
+    assert results[0].status == SweepStatus.ERROR
+    assert cache.stats.hits == 0
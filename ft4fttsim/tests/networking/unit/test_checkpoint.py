@@ -0,0 +1,102 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pytest
+import simpy
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.checkpoint import take_checkpoint, restore_checkpoint
+from ft4fttsim.checkpoint import load_checkpoint
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.ft4ftt import Master
+from ft4fttsim.parallel import summarize_device
+from ft4fttsim.tests.networking.networkhelper import build_switched_network
+from ft4fttsim.tests.networking.networkhelper import build_ft4ftt_network
+
+
+def summarize(devices):
+    return dict((device.name, summarize_device(device))
+                for device in devices)
+
+
+def run_uninterrupted(build_network, until, make_env=simpy.Environment):
+    env = make_env()
+    devices, _ = build_network(env)
+    env.run(until=until)
+    return summarize(devices)
+
+
+def warm_up(build_network, until, make_env=simpy.Environment):
+    env = make_env()
+    devices, links = build_network(env)
+    env.run(until=until)
+    return take_checkpoint(env, devices, links)
+
+
+def restore(checkpoint, build_network, make_env=simpy.Environment):
+    env = make_env(initial_time=checkpoint.time)
+    devices, links = build_network(env)
+    restore_checkpoint(checkpoint, env, devices, links)
+    return env, devices
+
+
+@pytest.mark.parametrize("build_network, until, checkpoint_times", [
+    (build_switched_network, 1000, [1, 100, 122.08, 250, 400, 999]),
+    (build_ft4ftt_network, 5500, [1, 5, 999, 1000, 1017, 2500, 5000]),
+])
+@pytest.mark.parametrize("make_env", [simpy.Environment, kernel.Environment])
+def test_restored_simulation__continues_like_uninterrupted_one(
+        build_network, until, checkpoint_times, make_env):
+    expected = run_uninterrupted(build_network, until, make_env)
+    for time in checkpoint_times:
+        checkpoint = warm_up(build_network, time, make_env)
+        env, devices = restore(checkpoint, build_network, make_env)
+        env.run(until=until)
+        assert summarize(devices) == expected
+
+
+def test_checkpoint__can_be_saved_and_loaded(tmp_path):
+    checkpoint = warm_up(build_ft4ftt_network, 2500)
+    path = str(tmp_path / "checkpoint.pickle")
+    checkpoint.save(path)
+    assert load_checkpoint(path) == checkpoint
+
+
+def test_checkpoint__captures_master_state():
+    checkpoint = warm_up(build_ft4ftt_network, 2500)
+    env, devices = restore(checkpoint, build_ft4ftt_network)
+    master = [d for d in devices if isinstance(d, Master)][0]
+    assert master.ec_count == 3
+    assert master.ec_start_time == 2000
+    env.run(until=3001)
+    assert master.ec_count == 4
+
+
+def test_checkpoint__forks_are_independent():
+    checkpoint = warm_up(build_switched_network, 250)
+    env1, devices1 = restore(checkpoint, build_switched_network)
+    env2, devices2 = restore(checkpoint, build_switched_network)
+    # In the second fork, switch2 drops everything.
+    switch2 = [d for d in devices2 if d.name == "switch2"][0]
+    switch2.forwarding_table = dict(
+        (destination, []) for destination in switch2.forwarding_table)
+    env1.run(until=1000)
+    env2.run(until=1000)
+    assert summarize(devices1) == run_uninterrupted(
+        build_switched_network, 1000)
+    assert summarize(devices2) != summarize(devices1)
+
+
+def test_restore_checkpoint__wrong_start_time__raises_exception():
+    checkpoint = warm_up(build_switched_network, 250)
+    env = simpy.Environment()
+    devices, links = build_switched_network(env)
+    with pytest.raises(FT4FTTSimException):
+        restore_checkpoint(checkpoint, env, devices, links)
+
+
+def test_restore_checkpoint__other_network__raises_exception():
+    checkpoint = warm_up(build_switched_network, 250)
+    env = simpy.Environment(initial_time=checkpoint.time)
+    devices, links = build_ft4ftt_network(env)
+    with pytest.raises(FT4FTTSimException):
+        restore_checkpoint(checkpoint, env, devices, links)
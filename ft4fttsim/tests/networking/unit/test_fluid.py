@@ -0,0 +1,155 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pytest
+import simpy
+
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.fluid import FluidModel
+from ft4fttsim.networking import Message
+from ft4fttsim.parallel import summarize_device
+from ft4fttsim.tests.networking.networkhelper import build_switched_network
+from ft4fttsim.timebase import set_time_base, NANOSECONDS
+
+
+def by_name(devices):
+    return dict((device.name, device) for device in devices)
+
+
+@pytest.fixture
+def network(env):
+    devices, links = build_switched_network(env)
+    return by_name(devices), links
+
+
+def sublink_names(sublinks):
+    return sorted(str(sublink) for sublink in sublinks)
+
+
+def test_route__follows_forwarding_tables(env, network):
+    devices, links = network
+    fluid = FluidModel(env, devices.values(), links)
+    assert sublink_names(fluid.route(devices["player2"],
+                                     devices["recorder2"])) == [
+        "player2-port0->switch1-port1",
+        "switch1-port2->switch2-port0",
+        "switch2-port2->recorder2-port0",
+    ]
+    assert len(fluid.route(devices["player1"],
+                           [devices["recorder1"], devices["recorder2"]])) == 4
+
+
+def test_route__multiport_source__follows_the_source_ports_only(env, network):
+    devices, links = network
+    fluid = FluidModel(env, devices.values(), links)
+    switch2 = devices["switch2"]
+    with pytest.raises(FT4FTTSimException):
+        fluid.route(switch2, devices["recorder2"])
+    assert sublink_names(fluid.route(switch2, devices["recorder2"],
+                                     switch2.ports[2])) == [
+        "switch2-port2->recorder2-port0",
+    ]
+    flow = fluid.add_flow("flow", switch2, devices["recorder1"], 5,
+                          source_ports=[switch2.ports[1]])
+    assert flow.source_ports == (switch2.ports[1],)
+    assert sublink_names(flow.sublinks) == ["switch2-port1->recorder1-port0"]
+    with pytest.raises(FT4FTTSimException):
+        fluid.route(switch2, devices["recorder2"], devices["switch1"].ports)
+
+
+def test_waiting_time__is_that_of_an_md1_queue(env, network):
+    devices, links = network
+    fluid = FluidModel(env, devices.values(), links)
+    flow = fluid.add_flow("background", devices["player2"],
+                          devices["recorder2"], 5, frame_size_bytes=1480)
+    # On the 10 Mbps link, a frame of 1480 bytes takes 1200 us including
+    # preamble, start of frame delimiter and interframe gap.
+    last_sublink = flow.sublinks[-1]
+    utilization = 5 / (8 * 1480.0) * 1200
+    assert fluid.utilization(last_sublink) == pytest.approx(utilization)
+    assert fluid.waiting_time(last_sublink, None) == pytest.approx(
+        utilization * 1200 / (2 * (1 - utilization)))
+
+
+def test_waiting_time__adds_up_the_flows_of_a_sublink(env, network):
+    devices, links = network
+    fluid = FluidModel(env, devices.values(), links)
+    flow = fluid.add_flow("flow1", devices["player2"], devices["recorder2"],
+                          2, frame_size_bytes=1480)
+    fluid.add_flow("flow2", devices["player1"], devices["recorder2"], 2,
+                   frame_size_bytes=1480)
+    single_flow = FluidModel(env, devices.values(), links)
+    single_flow.add_flow("flow", devices["player2"], devices["recorder2"], 4,
+                         frame_size_bytes=1480)
+    last_sublink = flow.sublinks[-1]
+    assert fluid.waiting_time(last_sublink, None) == pytest.approx(
+        single_flow.waiting_time(last_sublink, None))
+
+
+def run_with_flows(rates, time_base=None):
+    """
+    Simulate the network with flows of the given rates from player1 to
+    recorder1, and return the summary of recorder1 and the fluid model.
+
+    """
+    env = simpy.Environment()
+    if time_base is not None:
+        set_time_base(env, time_base)
+    devices, links = build_switched_network(env)
+    devices = by_name(devices)
+    fluid = FluidModel(env, devices.values(), links)
+    for i, rate in enumerate(rates):
+        fluid.add_flow("flow{}".format(i), devices["player1"],
+                       devices["recorder1"], rate)
+    env.run()
+    return summarize_device(devices["recorder1"]), fluid
+
+
+def test_foreground_messages__wait_for_background_traffic():
+    without_background, _ = run_with_flows([])
+    with_background, fluid = run_with_flows([3])
+    assert len(with_background) == len(without_background)
+    first_delay = min(with_background) - min(without_background)
+    flow = fluid.flows["flow0"]
+    assert first_delay == pytest.approx(sum(
+        fluid.waiting_time(sublink, None) for sublink in flow.sublinks))
+
+
+def test_set_rate__zero__restores_original_timing(env, network):
+    devices, links = network
+    fluid = FluidModel(env, devices.values(), links)
+    fluid.add_flow("flow", devices["player1"], devices["recorder1"], 3)
+    fluid.set_rate("flow", 0)
+    env.run()
+    assert summarize_device(devices["recorder1"]) == run_with_flows([])[0]
+
+
+def test_waiting_time__integer_time_base__is_integer():
+    receptions, _ = run_with_flows([3], NANOSECONDS)
+    assert all(isinstance(time, int) for time in receptions)
+
+
+def test_add_flow__overload__raises_exception(env, network):
+    devices, links = network
+    fluid = FluidModel(env, devices.values(), links)
+    fluid.add_flow("flow1", devices["player2"], devices["recorder2"], 5)
+    with pytest.raises(FT4FTTSimException):
+        fluid.add_flow("flow2", devices["player1"], devices["recorder2"], 5)
+    assert list(fluid.flows) == ["flow1"]
+    # the first sublink of flow2 is the only one that flow1 does not cross
+    player1_sublink = fluid.route(devices["player1"], devices["recorder2"])[0]
+    assert player1_sublink.background_wait is None
+    assert all(sublink.background_wait is not None
+               for sublink in fluid.flows["flow1"].sublinks)
+    with pytest.raises(FT4FTTSimException):
+        fluid.set_rate("flow1", 10)
+    assert fluid.flows["flow1"].megabits_per_second == 5
+
+
+def test_remove_flow__removes_its_load(env, network):
+    devices, links = network
+    fluid = FluidModel(env, devices.values(), links)
+    flow = fluid.add_flow("flow", devices["player2"], devices["recorder2"], 5)
+    fluid.remove_flow("flow")
+    assert fluid.flows == {}
+    assert all(fluid.utilization(sublink) == 0 for sublink in flow.sublinks)
+    assert all(sublink.background_wait is None for sublink in flow.sublinks)
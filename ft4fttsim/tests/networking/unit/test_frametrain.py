@@ -0,0 +1,198 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pickle
+
+import pytest
+import simpy
+
+from ft4fttsim.checkpoint import take_checkpoint
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import (
+    FrameTrain, Link, Message, MessageRecordingDevice, NetworkDevice, Switch)
+from ft4fttsim.timebase import set_time_base, NANOSECONDS
+
+
+def build_network(env, link_configs):
+    """
+    Build a network in which the players are connected to a switch that is
+    connected to a recorder.
+
+    Arguments:
+        link_configs: The (megabits per second, propagation delay) of the
+            links of the players, followed by that of the link of the
+            recorder.
+
+    Returns:
+        The players, the recorder and the links.
+
+    """
+    num_players = len(link_configs) - 1
+    players = [NetworkDevice(env, "player{}".format(i), 1)
+               for i in range(num_players)]
+    switch = Switch(env, "switch", num_players + 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    links = [Link(env, player.ports[0], switch.ports[i], *link_configs[i])
+             for i, player in enumerate(players)]
+    links.append(Link(env, switch.ports[num_players], recorder.ports[0],
+                      *link_configs[-1]))
+    switch.forwarding_table[recorder] = [switch.ports[num_players]]
+    return players, recorder, links
+
+
+def transmit_bursts(env, player, recorder, bursts, as_trains):
+    """
+    Simpy process that transmits bursts of frames, given as (time, number of
+    frames, size, data) tuples, either as frame trains or frame by frame.
+
+    """
+    for time, num_frames, size_bytes, data in bursts:
+        yield env.timeout(time - env.now)
+        if as_trains:
+            messages = [FrameTrain(env, player, recorder, size_bytes, "bulk",
+                                   data, num_frames)]
+        else:
+            messages = [Message(env, player, recorder, size_bytes, "bulk",
+                                data)
+                        for _ in range(num_frames)]
+        for message in messages:
+            env.process(player.instruct_transmission(message, player.ports[0]))
+
+
+def reception_times(recorder):
+    """
+    Return a dictionary whose keys are the data of the received frames and
+    whose values are the sorted reception times of the frames.
+
+    """
+    times = {}
+    for time, messages in recorder.reception_records.items():
+        for message in messages:
+            if isinstance(message, FrameTrain):
+                frame_times = message.frame_times()
+            else:
+                frame_times = [time]
+            times.setdefault(message.data, []).extend(frame_times)
+    return dict((data, sorted(frame_times))
+                for data, frame_times in times.items())
+
+
+def simulate(env, link_configs, bursts_of_players, as_trains):
+    players, recorder, _ = build_network(env, link_configs)
+    for player, bursts in zip(players, bursts_of_players):
+        env.process(transmit_bursts(env, player, recorder, bursts, as_trains))
+    num_events = 0
+    while env.peek() < float("inf"):
+        env.step()
+        num_events += 1
+    return reception_times(recorder), num_events
+
+
+SCENARIOS = [
+    # a single burst over links of the same speed
+    ([(100, 1), (100, 1)], [[(0, 20, 1000, "a")]]),
+    # from a fast link to a slow link: the frames queue in the switch
+    ([(1000, 2), (10, 0.5)], [[(0, 10, 500, "a"), (30, 5, 80, "b")]]),
+    # from a slow link to a fast link: the frames are spaced out
+    ([(10, 0.5), (1000, 2)], [[(0, 10, 500, "a"), (300, 5, 1500, "b")]]),
+    # two players contending for the link of the recorder
+    ([(100, 1.4), (100, 1.25), (100, 0.02)],
+     [[(2562.4, 23, 594, "a"), (3276, 8, 84, "b"), (4165.8, 27, 750, "c")],
+      [(2000.1, 24, 1297, "d"), (2930.5, 26, 515, "e"), (5799, 9, 105, "f")]]),
+    ([(10, 1.8), (10, 1.1), (1000, 1.4)],
+     [[(1742.6, 20, 90, "a")], [(2726.5, 16, 595, "b")]]),
+]
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+@pytest.mark.parametrize("link_configs, bursts_of_players", SCENARIOS)
+def test_frame_trains__give_the_reception_times_of_individual_frames(
+        environment, link_configs, bursts_of_players):
+    frame_times, num_frame_events = simulate(
+        environment(), link_configs, bursts_of_players, as_trains=False)
+    train_times, num_train_events = simulate(
+        environment(), link_configs, bursts_of_players, as_trains=True)
+    assert train_times.keys() == frame_times.keys()
+    for data in frame_times:
+        assert train_times[data] == pytest.approx(frame_times[data])
+    assert num_train_events < num_frame_events
+
+
+def test_frame_trains__with_integer_time_base():
+    results = []
+    for as_trains in [False, True]:
+        env = kernel.Environment()
+        set_time_base(env, NANOSECONDS)
+        results.append(simulate(
+            env, [(100, 1), (1000, 2), (10, 0)],
+            [[(0, 30, 700, "a")], [(5000, 20, 64, "b")]], as_trains)[0])
+    assert results[0] == results[1]
+
+
+def test_cost_of_a_train__does_not_depend_on_its_number_of_frames():
+    num_events = [
+        simulate(kernel.Environment(), [(100, 1), (100, 1)],
+                 [[(0, num_frames, 1000, "a")]], as_trains=True)[1]
+        for num_frames in [2, 200]]
+    assert num_events[0] == num_events[1]
+
+
+def test_frame_times__of_a_received_train(env):
+    players, recorder, _ = build_network(env, [(100, 2), (100, 2)])
+    train = FrameTrain(env, players[0], recorder, 1242, "bulk", None, 3)
+    env.process(players[0].instruct_transmission(train, players[0].ports[0]))
+    env.run()
+    # a frame takes 100 us to transmit, 2 us to propagate and is followed
+    # by an interframe gap of 0.96 us
+    assert recorder.recorded_timestamps == [pytest.approx(204)]
+    [received] = recorder.recorded_messages
+    assert received.frame_times() == pytest.approx([204, 306.96, 409.92])
+
+
+def test_truncate__truncates_copies_and_remainders(env):
+    train = FrameTrain(env, None, None, 100, "bulk", None, 10)
+    copy = FrameTrain.from_message(train)
+    remainder = copy.split(6, 0, 0)
+    remainder_of_remainder = remainder.split(2, 0, 0)
+    assert (copy.num_frames, remainder.num_frames,
+            remainder_of_remainder.num_frames) == (6, 2, 2)
+    train.truncate(7)
+    assert (train.num_frames, copy.num_frames, remainder.num_frames,
+            remainder_of_remainder.num_frames) == (7, 6, 1, 0)
+
+
+def test_split__keeps_the_remainders_split_before(env):
+    train = FrameTrain(env, None, None, 100, "bulk", None, 10)
+    first_remainder = train.split(8, 0, 0)
+    second_remainder = train.split(3, 0, 0)
+    assert (train.num_frames, second_remainder.num_frames,
+            first_remainder.num_frames) == (3, 5, 2)
+
+
+def test_train__survives_a_state_round_trip(env):
+    devices = dict((name, NetworkDevice(env, name, 1))
+                   for name in ["player", "recorder"])
+    train = FrameTrain(env, devices["player"], devices["recorder"], 100,
+                       "bulk", "data", 5)
+    train.spacing = 12.5
+    state = pickle.loads(pickle.dumps(train.to_state()))
+    restored = Message.from_state(env, state, devices)
+    assert isinstance(restored, FrameTrain)
+    assert restored == train
+    assert restored.frame_times() == train.frame_times()
+
+
+@pytest.mark.parametrize("num_frames", [-1, 1.5])
+def test_train_constructor__raises_exception(env, num_frames):
+    with pytest.raises(FT4FTTSimException):
+        FrameTrain(env, None, None, 100, "bulk", None, num_frames)
+
+
+def test_checkpoint__raises_exception_with_trains_in_flight(env):
+    players, recorder, links = build_network(env, [(100, 1), (100, 1)])
+    train = FrameTrain(env, players[0], recorder, 1000, "bulk", None, 10)
+    env.process(players[0].instruct_transmission(train, players[0].ports[0]))
+    env.run(until=100)
+    with pytest.raises(FT4FTTSimException):
+        take_checkpoint(env, players + [recorder], links)
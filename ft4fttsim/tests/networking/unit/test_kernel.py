@@ -0,0 +1,108 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pytest
+import simpy
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.parallel import summarize_device
+from ft4fttsim.tests.networking.networkhelper import build_switched_network
+from ft4fttsim.tests.networking.networkhelper import build_ft4ftt_network
+
+
+def trace_processes(env):
+    """
+    Run processes that use timeouts, events and stores, and return the
+    sequence of (time, name, value) tuples they observe.
+
+    """
+    trace = []
+    store = kernel.store(env, capacity=1)
+
+    def producer(name, delays):
+        for delay in delays:
+            yield env.timeout(delay)
+            yield store.put((name, env.now))
+            trace.append((env.now, name, "put"))
+
+    def consumer():
+        while True:
+            item = yield store.get()
+            trace.append((env.now, "consumer", item))
+            yield env.timeout(0.5)
+
+    def waiter(event):
+        value = yield event
+        trace.append((env.now, "waiter", value))
+
+    env.process(producer("p1", [0, 1, 1, 0]))
+    env.process(producer("p2", [1, 0, 0, 2]))
+    env.process(consumer())
+    event = env.event()
+    env.process(waiter(event))
+    timeout = env.timeout(2)
+    timeout.callbacks.append(lambda _: event.succeed("done"))
+    env.run(until=10)
+    trace.append((env.now, "end", None))
+    return trace
+
+
+def test_kernel_schedules_events_like_simpy():
+    assert trace_processes(kernel.Environment()) == trace_processes(
+        simpy.Environment())
+
+
+def test_store__has_simpy_store_semantics():
+    env = kernel.Environment()
+    store = kernel.store(env, capacity=1)
+    assert isinstance(store, kernel.Store)
+    first_put, second_put = store.put(1), store.put(2)
+    get = store.get()
+    assert first_put.triggered and not second_put.triggered
+    env.run()
+    assert get.value == 1
+    assert second_put.processed
+    assert store.items == [2]
+
+
+def test_store__is_a_simpy_store_for_simpy_environments():
+    assert isinstance(kernel.store(simpy.Environment()), simpy.Store)
+
+
+def test_run__rejects_until_in_the_past():
+    env = kernel.Environment(initial_time=5)
+    with pytest.raises(ValueError):
+        env.run(until=5)
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_pending_events__do_not_include_the_event_that_stopped_a_run(
+        environment):
+    env = environment()
+    timeouts = [env.timeout(delay) for delay in [1, 3]]
+    env.run(until=2)
+    assert kernel.pending_events(env) == 1
+    kernel.skip_stop_event(env)
+    assert kernel.next_event(env) is timeouts[1]
+    assert not kernel.skip_stop_event(env)
+    env.step()
+    assert kernel.pending_events(env) == 0
+    assert kernel.next_event(env) is None
+    assert env.now == 3
+
+
+@pytest.mark.parametrize("build_network, until", [
+    (build_switched_network, None),
+    (build_switched_network, 500),
+    (build_ft4ftt_network, 5500),
+])
+def test_networks_have_same_receptions_with_kernel_and_simpy(
+        build_network, until):
+    summaries = []
+    for env in [kernel.Environment(), simpy.Environment()]:
+        devices, _ = build_network(env)
+        env.run(until=until)
+        summaries.append(dict((device.name, summarize_device(device))
+                              for device in devices))
+    assert summaries[0] == summaries[1]
+    assert any(summaries[0].values())
@@ -1,9 +1,12 @@
 # author: David Gessner <davidges@gmail.com>
 
 import pytest
+import simpy
 from unittest.mock import Mock
 
-from ft4fttsim.networking import Link, Port
+import ft4fttsim.kernel as kernel
+from ft4fttsim.networking import Link, Message, MessageRecordingDevice
+from ft4fttsim.networking import NetworkDevice, Port
 import ft4fttsim.ethernet as ethernet
 from ft4fttsim.exceptions import FT4FTTSimException
 
@@ -83,3 +86,29 @@ def test_sublink_have_correct_ports(env, port1, port2):
         link.sublink[0].transmitter_port == link.sublink[1].receiver_port
         and
         link.sublink[1].transmitter_port == link.sublink[0].receiver_port)
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_sublink__requeues_held_message_before_messages_queued_meanwhile(
+        environment):
+    env = environment()
+    player = NetworkDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    Link(env, player.ports[0], recorder.ports[0], 10, 0)
+    held = []
+
+    def gate(message, link):
+        # hold message 0 once, while message 1 is transmitted
+        if message.data == 0 and not held:
+            held.append(message)
+            return 100
+        return 0
+    player.ports[0].transmission_gate = gate
+    for i in range(3):
+        message = Message(env, player, recorder, 1000, "data", i)
+        env.process(player.instruct_transmission(message, player.ports[0]))
+    env.run()
+    # message 2 was queued when the hold time of message 0 elapsed
+    assert [message.data for message in recorder.recorded_messages] == [
+        1, 0, 2]
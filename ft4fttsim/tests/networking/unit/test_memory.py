@@ -0,0 +1,115 @@
+# author: David Gessner <davidges@gmail.com>
+
+import csv
+import tracemalloc
+
+import pytest
+import simpy
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.memory import MemoryMonitor
+from ft4fttsim.networking import MessageRecordingDevice
+from ft4fttsim.tests.networking.fixturehelper import make_playback_device
+from ft4fttsim.tests.networking.fixturehelper import make_link
+
+
+def wait_forever(env, store):
+    yield store.get()
+
+
+def leak_processes(env, store, period):
+    """
+    Simpy process that starts a process blocked forever every period.
+
+    """
+    while True:
+        env.process(wait_forever(env, store))
+        yield env.timeout(period)
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_samples__show_the_leaked_objects(environment):
+    env = environment()
+    store = kernel.store(env)
+    env.process(leak_processes(env, store, 10))
+    monitor = MemoryMonitor(env, 100, trace_allocations=False)
+    env.run(until=1000)
+    assert [sample.time for sample in monitor.samples] == list(
+        range(0, 1000, 100))
+    processes = [sample.counts["Process"] for sample in monitor.samples]
+    store_events = [sample.counts["Store event"]
+                    for sample in monitor.samples]
+    assert processes[-1] - processes[1] == 80
+    assert store_events[-1] - store_events[1] == 80
+
+
+def test_samples__count_the_messages(env):
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    player = make_playback_device("8 messages", env, recorder)
+    make_link((100, 0), env, player.ports[0], recorder.ports[0])
+    monitor = MemoryMonitor(env, 1000, trace_allocations=False)
+    env.run(until=2000)
+    assert monitor.samples[0].counts["Message"] == 8
+    assert monitor.samples[-1].counts["Message"] == 8
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_monitor__stops_when_no_other_events_are_scheduled(environment):
+    env = environment()
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    player = make_playback_device("8 messages", env, recorder)
+    make_link((100, 0), env, player.ports[0], recorder.ports[0])
+    # a previous run leaves a stale stop event in simpy
+    env.run(until=1)
+    monitor = MemoryMonitor(env, 1000, trace_allocations=False)
+    env.run()
+    last_time = monitor.samples[-1].time
+    assert last_time > 1
+    assert [sample.time for sample in monitor.samples] == list(
+        range(1, last_time + 1, 1000))
+    assert monitor.samples[-1].num_scheduled == 0
+
+
+def test_top_allocators__finds_the_growing_allocations(env):
+    was_tracing = tracemalloc.is_tracing()
+    retained = []
+
+    def allocate():
+        while True:
+            retained.append(bytearray(10000))
+            yield env.timeout(1)
+    env.process(allocate())
+    monitor = MemoryMonitor(env, 10)
+    env.run(until=100)
+    monitor.stop()
+    assert tracemalloc.is_tracing() == was_tracing
+    [top] = monitor.top_allocators(limit=1)
+    assert top.size_diff_bytes >= 80 * 10000
+    assert "test_memory.py" in top.location
+    assert "Top allocators" in monitor.report()
+
+
+def test_write_time_series__writes_a_row_per_sample(env, tmpdir):
+    monitor = MemoryMonitor(env, 10, trace_allocations=False)
+    env.run(until=35)
+    path = str(tmpdir.join("memory.csv"))
+    monitor.write_time_series(path)
+    with open(path) as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert [float(row["time"]) for row in rows] == [0, 10, 20, 30]
+    assert "Message" in rows[0]
+
+
+def test_top_allocators__raises_exception_without_tracing(env):
+    monitor = MemoryMonitor(env, 10, trace_allocations=False)
+    env.run(until=35)
+    with pytest.raises(FT4FTTSimException):
+        monitor.top_allocators()
+
+
+def test_monitor_constructor__raises_exception(env):
+    with pytest.raises(FT4FTTSimException):
+        MemoryMonitor(env, 0)
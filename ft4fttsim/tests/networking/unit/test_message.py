@@ -1,7 +1,9 @@
 # author: David Gessner <davidges@gmail.com>
 
+import pickle
+
 import pytest
-from ft4fttsim.networking import Message
+from ft4fttsim.networking import Message, MulticastGroup, NetworkDevice
 from ft4fttsim.exceptions import FT4FTTSimException
 from unittest.mock import sentinel
 
@@ -95,3 +97,26 @@ def test_creating_message_from_template_creates_equal_message(env):
         sentinel.dummy_data)
     new_message = Message.from_message(template_message)
     assert template_message == new_message
+
+
+def test_message_from_record_keeps_multicast_group(env):
+    devices = [NetworkDevice(env, "device{}".format(i), 1) for i in range(3)]
+    group = MulticastGroup("group", devices[1:])
+    message = Message(env, devices[0], group, 1234, sentinel.message_type)
+    record = pickle.loads(pickle.dumps(message.to_record()))
+    new_message = Message.from_record(
+        env, record, dict((device.name, device) for device in devices))
+    assert new_message == message
+    assert new_message.destination.name == "group"
+
+
+def test_multicast_groups__are_identified_by_name_and_members(env):
+    devices = [NetworkDevice(env, "device{}".format(i), 1) for i in range(3)]
+    group = MulticastGroup("group", devices[1:])
+    assert group == MulticastGroup("group", devices[1:])
+    assert group != MulticastGroup("other group", devices[1:])
+    assert group != MulticastGroup("group", devices)
+    assert group != frozenset(devices[1:])
+    assert frozenset(devices[1:]) != group
+    table = {group: [1], MulticastGroup("other group", devices[1:]): [2]}
+    assert table[MulticastGroup("group", devices[1:])] == [1]
@@ -1,7 +1,10 @@
 # author: David Gessner <davidges@gmail.com>
 
 import pytest
-from ft4fttsim.networking import NetworkDevice
+import simpy
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.networking import NetworkDevice, Link, Message, process_owner
 
 
 @pytest.fixture
@@ -22,3 +25,79 @@ def test_instruct_transmission_through_non_existing_port__raise_exception(
 def test_repr_of_last_port(env, num_ports):
     device = NetworkDevice(env, "foo", num_ports)
     assert str(device.ports[-1]) == "foo-port{}".format(num_ports - 1)
+
+
+def test_ports_without_link_have_no_queues(env):
+    device = NetworkDevice(env, "switch", 48)
+    other_device = NetworkDevice(env, "other", 1)
+    Link(env, device.ports[5], other_device.ports[0], 100, 0)
+    env.run(until=1)
+    assert [port for port in device.ports
+            if port._in_queue is not None or
+            port._out_queue is not None] == [device.ports[5]]
+    assert device.connected_ports == [device.ports[5]]
+
+
+def test_listen_for_messages__listens_on_ports_linked_later(env):
+    device = NetworkDevice(env, "switch", 48)
+    other_device = NetworkDevice(env, "other", 1)
+    received = []
+    device.listen_for_messages(received.extend)
+    Link(env, device.ports[5], other_device.ports[0], 100, 0)
+    message = Message(env, other_device, device, 64, "some message")
+    env.process(other_device.instruct_transmission(
+        message, other_device.ports[0]))
+    env.run()
+    assert received == [message]
+
+
+def test_listen_for_messages__twice__raises_exception(env):
+    from ft4fttsim.networking import FT4FTTSimException
+    device = NetworkDevice(env, "device", 2)
+    device.listen_for_messages(list)
+    with pytest.raises(FT4FTTSimException):
+        device.listen_for_messages(list)
+
+
+def test_listen_for_messages__batches_messages_received_at_same_time(env):
+    device = NetworkDevice(env, "device", 2)
+    other_devices = [NetworkDevice(env, "other{}".format(i), 1)
+                     for i in range(2)]
+    batches = []
+    device.listen_for_messages(batches.append, with_ports=True)
+    messages = []
+    for port, other_device in zip(device.ports, other_devices):
+        Link(env, port, other_device.ports[0], 100, 0)
+        messages.append(Message(env, other_device, device, 64, "message"))
+        env.process(other_device.instruct_transmission(
+            messages[-1], other_device.ports[0]))
+    env.run()
+    assert batches == [list(zip(device.ports, messages))]
+
+
+def test_listen_for_messages__receives_messages_queued_before(env):
+    device = NetworkDevice(env, "device", 1)
+    other_device = NetworkDevice(env, "other", 1)
+    Link(env, device.ports[0], other_device.ports[0], 100, 0)
+    message = Message(env, other_device, device, 64, "message")
+    device.ports[0].deliver(message)
+    received = []
+    device.listen_for_messages(received.extend)
+    env.run()
+    assert received == [message]
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_start_process__records_the_device_as_owner(environment):
+    env = environment()
+    device = NetworkDevice(env, "device", 1)
+    other_device = NetworkDevice(env, "other", 1)
+    Link(env, device.ports[0], other_device.ports[0], 100, 0)
+    message = Message(env, device, other_device, 64, "message")
+    process = device.start_process(
+        device.instruct_transmission(message, device.ports[0]))
+    assert process_owner(process) is device
+    other_process = env.process(
+        other_device.instruct_transmission(message, other_device.ports[0]))
+    assert process_owner(other_process) is None
@@ -0,0 +1,156 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Profile simulations of the following network:
+
++---------+       +---------+       +---------+       +-----------+
+| player1 0 ----> 0         |       |         1 ----> 0 recorder1 |
++---------+       | switch1 2 ----> 0 switch2 |       +-----------+
++---------+       |         |       |         |       +-----------+
+| player2 0 ----> 1         |       |         2 ----> 0 recorder2 |
++---------+       +---------+       +---------+       +-----------+
+
+"""
+
+import pytest
+import simpy
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import Link, MessageRecordingDevice, Switch
+from ft4fttsim.profiling import Profiler
+from ft4fttsim.tests.networking.fixturehelper import make_playback_device
+
+
+def build_network(env):
+    recorder1 = MessageRecordingDevice(env, "recorder1", 1)
+    recorder2 = MessageRecordingDevice(env, "recorder2", 1)
+    player1 = make_playback_device(
+        "8 messages", env, [recorder1, recorder2], name="player1")
+    player2 = make_playback_device(
+        "3 batches of 2 messages", env, recorder2, name="player2")
+    switch1 = Switch(env, "switch1", 3)
+    switch2 = Switch(env, "switch2", 3)
+    Link(env, player1.ports[0], switch1.ports[0], 100, 1)
+    Link(env, player2.ports[0], switch1.ports[1], 100, 1)
+    Link(env, switch1.ports[2], switch2.ports[0], 1000, 2)
+    Link(env, switch2.ports[1], recorder1.ports[0], 100, 3)
+    Link(env, switch2.ports[2], recorder2.ports[0], 10, 4)
+    switch1.forwarding_table = {
+        recorder1: [switch1.ports[2]],
+        recorder2: [switch1.ports[2]],
+    }
+    switch2.forwarding_table = {
+        recorder1: [switch2.ports[1]],
+        recorder2: [switch2.ports[2]],
+    }
+    return [player1, player2, switch1, switch2, recorder1, recorder2]
+
+
+def receptions(devices):
+    return [sorted((time, [message.message_type for message in messages])
+                   for time, messages in device.reception_records.items())
+            for device in devices[-2:]]
+
+
+ENVIRONMENTS = [simpy.Environment, kernel.Environment]
+
+
+@pytest.mark.parametrize("environment", ENVIRONMENTS)
+def test_profiled_run__simulates_like_a_run(environment):
+    env = environment()
+    devices = build_network(env)
+    num_events = 0
+    while env.peek() < float("inf"):
+        env.step()
+        num_events += 1
+    profiled_env = environment()
+    profiled_devices = build_network(profiled_env)
+    profiler = Profiler(profiled_env, profiled_devices)
+    profiler.run()
+    assert receptions(profiled_devices) == receptions(devices)
+    assert profiler.num_events == num_events
+
+
+@pytest.mark.parametrize("environment", ENVIRONMENTS)
+def test_profiled_run__advances_the_time_to_until(environment):
+    env = environment()
+    profiler = Profiler(env, build_network(env))
+    profiler.run(until=50)
+    assert env.now == 50
+    profiler.run(until=10000)
+    assert env.now == 10000
+
+
+@pytest.mark.parametrize("environment", ENVIRONMENTS)
+def test_components__are_the_devices_and_sublinks(environment):
+    env = environment()
+    profiler = Profiler(env, build_network(env))
+    profiler.run()
+    components = set((profile.kind, profile.name)
+                     for profile in profiler.components())
+    assert ("Switch", "switch1") in components
+    assert ("MessageRecordingDevice", "recorder2") in components
+    assert ("MessagePlaybackDevice", "player1") in components
+    assert ("_Sublink", "switch1-port2->switch2-port0") in components
+    assert ("other", "other") not in components
+
+
+def test_collapsed_stacks__name_components_and_functions(env, tmpdir):
+    profiler = Profiler(env, build_network(env))
+    profiler.run()
+    path = str(tmpdir.join("profile.folded"))
+    profiler.write_collapsed_stacks(path)
+    with open(path) as stacks_file:
+        lines = stacks_file.read().splitlines()
+    stacks = [line.rsplit(" ", 1)[0] for line in lines]
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert ("Switch;switch2;listen_for_messages;forward_received_messages"
+            in stacks)
+    assert "MessagePlaybackDevice;player2;run" in stacks
+
+
+def test_sampling__estimates_the_event_counts(env):
+    exact = Profiler(env, build_network(env))
+    exact.run()
+    sampling_env = simpy.Environment()
+    sampling = Profiler(sampling_env, build_network(sampling_env),
+                        sample_every=2)
+    sampling.run()
+    assert sampling.num_events == exact.num_events
+    num_callbacks = sum(profile.num_events for profile in exact.components())
+    estimate = sum(profile.num_events for profile in sampling.components())
+    assert estimate % 2 == 0
+    assert estimate == pytest.approx(num_callbacks, rel=0.5)
+
+
+def tick(env, period, offset):
+    yield env.timeout(offset)
+    while True:
+        yield env.timeout(period)
+
+
+def tock(env, period, offset):
+    yield from tick(env, period, offset)
+
+
+def test_sampling__does_not_alias_with_periodic_events(env):
+    # the resumptions of tick and tock alternate
+    env.process(tick(env, 10, 0))
+    env.process(tock(env, 10, 5))
+    profiler = Profiler(env, sample_every=2, seed=1)
+    profiler.run(until=10000)
+    stacks = [line.rsplit(" ", 1)[0] for line in profiler.collapsed_stacks()]
+    assert sorted(stacks) == ["other;other;tick", "other;other;tock;tick"]
+
+
+def test_report__lists_the_components(env):
+    profiler = Profiler(env, build_network(env))
+    profiler.run()
+    report = profiler.report()
+    assert "switch1-port2->switch2-port0" in report
+    assert "{} events".format(profiler.num_events) in report
+
+
+def test_profiler_constructor__raises_exception(env):
+    with pytest.raises(FT4FTTSimException):
+        Profiler(env, sample_every=0)
@@ -0,0 +1,142 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Run the following network until the latency of the messages received by the
+recorder and the length of the output queue of port 1 of the switch have
+converged:
+
++--------+   100 Mbps   +--------+   10 Mbps   +----------+
+| source 0 ----------> 0 switch 1 ----------> 0 recorder |
++--------+              +--------+             +----------+
+
+"""
+
+import random
+
+import pytest
+import simpy
+
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import NetworkDevice, Link, Message, Switch
+from ft4fttsim.networking import MessageRecordingDevice
+from ft4fttsim.networking import MessagePlaybackDevice
+from ft4fttsim.runcontrol import RunController, ReceptionLatency, QueueLength
+from ft4fttsim.runcontrol import mser_truncation, batch_means
+
+
+class RandomSource(NetworkDevice):
+    """
+    Transmits messages of random sizes at random intervals forever.
+
+    """
+
+    def __init__(self, env, name, destination, seed):
+        NetworkDevice.__init__(self, env, name, 1)
+        self.destination = destination
+        self.random = random.Random(seed)
+        env.process(self.run())
+
+    def run(self):
+        while True:
+            yield self.env.timeout(self.random.expovariate(1 / 2000.0))
+            message = Message(self.env, self, self.destination,
+                              self.random.randint(64, 1518), "message")
+            self.env.process(
+                self.instruct_transmission(message, self.ports[0]))
+
+
+@pytest.fixture
+def network(env):
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    source = RandomSource(env, "source", recorder, seed=1)
+    switch = Switch(env, "switch", 2)
+    Link(env, source.ports[0], switch.ports[0], 100, 1)
+    Link(env, switch.ports[1], recorder.ports[0], 10, 1)
+    return source, switch, recorder
+
+
+def test_run__stops_once_metrics_have_converged(env, network):
+    _, switch, recorder = network
+    controller = RunController(
+        env, {"latency": ReceptionLatency(recorder),
+              "queue length": QueueLength(env, switch.ports[1], 100)},
+        check_interval=50000, until=10 ** 8, relative_precision=0.1,
+        absolute_precision=0.01)
+    result = controller.run()
+    assert result.converged
+    assert result.time < 10 ** 8
+    assert result.time == env.now
+    latency = result.estimates["latency"]
+    assert latency.half_width <= 0.1 * latency.mean
+    # Messages take at least the time to cross both links.
+    assert latency.mean > (8 + 64 + 12) * 8 / 10.0
+    assert latency.num_observations == len(
+        controller.observations["latency"]) - latency.warm_up
+
+
+def test_run__stops_at_until_if_metrics_have_not_converged(env, network):
+    _, _, recorder = network
+    controller = RunController(
+        env, {"latency": ReceptionLatency(recorder)},
+        check_interval=3000, until=10000)
+    result = controller.run()
+    assert not result.converged
+    assert result.time == 10000
+    assert result.estimates["latency"] is None
+
+
+def test_reception_latency__observes_each_message_once(env, network):
+    _, _, recorder = network
+    metric = ReceptionLatency(recorder)
+    observations = []
+    for until in range(10000, 200001, 10000):
+        env.run(until=until)
+        observations.extend(metric.new_observations())
+    assert len(observations) == len(recorder.recorded_messages)
+    assert observations == [
+        time - message.origin_time
+        for time in recorder.recorded_timestamps
+        for message in recorder.reception_records[time]]
+
+
+def test_reception_latency__excludes_the_wait_for_playback(env):
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    player = MessagePlaybackDevice(env, "player", 1)
+    Link(env, player.ports[0], recorder.ports[0], 100, 1)
+    # the message is built at time 0 but only played back at time 5000
+    player.load_transmission_commands({5000: {player.ports[0]: [
+        Message(env, player, recorder, 100, "message")]}})
+    metric = ReceptionLatency(recorder)
+    env.run(until=10000)
+    [latency] = metric.new_observations()
+    link_latency = (8 + 100) * 8 / 100.0 + 1
+    assert latency == pytest.approx(link_latency)
+
+
+def test_mser_truncation__removes_initial_transient():
+    rng = random.Random(2)
+    transient = [50.0 - i for i in range(50)]
+    steady_state = [rng.gauss(0, 1) for _ in range(500)]
+    warm_up = mser_truncation(transient + steady_state)
+    assert 40 <= warm_up <= 60
+
+
+def test_mser_truncation__keeps_stationary_observations():
+    rng = random.Random(3)
+    assert mser_truncation([rng.gauss(0, 1) for _ in range(500)]) < 100
+
+
+def test_batch_means__confidence_interval_covers_mean():
+    rng = random.Random(4)
+    observations = [rng.gauss(10, 2) for _ in range(2000)]
+    mean, half_width = batch_means(observations)
+    assert abs(mean - 10) <= half_width
+    assert half_width < 0.5
+
+
+def test_batch_means__too_few_observations__returns_none():
+    assert batch_means([1.0] * 19, num_batches=20) is None
+
+
+def test_run_controller__invalid_check_interval__raises_exception(env):
+    with pytest.raises(FT4FTTSimException):
+        RunController(env, {}, check_interval=0, until=10)
@@ -0,0 +1,186 @@
+# author: David Gessner <davidges@gmail.com>
+
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+import simpy
+
+import ft4fttsim.kernel as kernel
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.supervisor import RunStatus, RunSupervisor
+
+
+def tick(env, num_ticks=float("inf")):
+    """
+    Simpy process that waits for one unit of time num_ticks times.
+
+    """
+    i = 0
+    while i < num_ticks:
+        yield env.timeout(1)
+        i += 1
+
+
+def fail_at(env, time):
+    yield env.timeout(time)
+    raise ValueError("failure")
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_run__reports_progress_after_each_slice(environment):
+    env = environment()
+    env.process(tick(env))
+    reports = []
+    supervisor = RunSupervisor(env, until=100, slice_duration=25,
+                               on_progress=reports.append)
+    progress = supervisor.run()
+    assert [report.time for report in reports] == [25, 50, 75, 100, 100]
+    assert [report.status for report in reports] == [
+        RunStatus.RUNNING] * 4 + [RunStatus.FINISHED]
+    assert progress is reports[-1]
+    # the initialization of the process and the timeouts until time 99
+    assert progress.num_events == 100
+    assert [report.num_events for report in reports[:4]] == [
+        25, 50, 75, 100]
+    assert all(report.eta_s >= 0 for report in reports)
+    assert progress.eta_s == 0
+    assert progress.wall_time_s > 0
+    assert progress.events_per_s > 0
+
+
+def test_run__ends_when_no_more_events_are_scheduled(env):
+    env.process(tick(env, num_ticks=30))
+    supervisor = RunSupervisor(env, until=float("inf"), slice_duration=20)
+    progress = supervisor.run()
+    assert progress.status == RunStatus.FINISHED
+    # the time of the last timeout rather than the end of the last slice
+    assert progress.time == 30 == env.now
+    # the initialization of the process, its 30 timeouts and its end
+    assert progress.num_events == 32
+
+
+@pytest.mark.parametrize("environment", [simpy.Environment,
+                                         kernel.Environment])
+def test_run_slice__does_not_count_the_events_that_stop_runs(environment):
+    env = environment()
+    env.process(tick(env))
+    env.run(until=5)
+    progress = RunSupervisor(env, until=10, slice_duration=2).run()
+    # the timeouts from time 5 to 9
+    assert progress.num_events == 5
+    assert env.now == 10
+    assert kernel.pending_events(env) == 1
+
+
+def test_run__writes_the_status_file(env, tmpdir):
+    env.process(tick(env))
+    path = str(tmpdir.join("status.json"))
+    statuses = []
+
+    def read_status(progress):
+        with open(path) as status_file:
+            statuses.append(json.load(status_file))
+    supervisor = RunSupervisor(env, until=20, slice_duration=10,
+                               status_path=path, on_progress=read_status)
+    supervisor.run()
+    assert [status["time"] for status in statuses] == [10, 20, 20]
+    assert statuses[-1]["status"] == RunStatus.FINISHED
+    assert statuses[-1]["num_events"] == 20
+    assert os.listdir(str(tmpdir)) == ["status.json"]
+
+
+def test_stop__ends_the_run_and_flushes_the_results(env):
+    env.process(tick(env))
+    flushed_at = []
+
+    def stop_at_30(progress):
+        if progress.time == 30:
+            supervisor.stop()
+    supervisor = RunSupervisor(
+        env, until=100, slice_duration=10, on_progress=stop_at_30,
+        flush=lambda: flushed_at.append(env.now))
+    progress = supervisor.run()
+    assert progress.status == RunStatus.STOPPED
+    assert progress.time == 30 == env.now
+    assert flushed_at == [30]
+
+
+def test_pause__waits_until_resumed(env):
+    env.process(tick(env))
+    flushed_at = []
+    statuses = []
+
+    def pause_at_20(progress):
+        statuses.append((progress.status, progress.time))
+        if progress.status == RunStatus.RUNNING and progress.time == 20:
+            supervisor.pause()
+            threading.Timer(0.05, supervisor.resume).start()
+    supervisor = RunSupervisor(
+        env, until=40, slice_duration=10, on_progress=pause_at_20,
+        flush=lambda: flushed_at.append(env.now), poll_interval_s=0.01)
+    start = time.perf_counter()
+    progress = supervisor.run()
+    elapsed_s = time.perf_counter() - start
+    assert progress.status == RunStatus.FINISHED
+    assert statuses == [
+        (RunStatus.RUNNING, 10), (RunStatus.RUNNING, 20),
+        (RunStatus.PAUSED, 20), (RunStatus.RUNNING, 30),
+        (RunStatus.RUNNING, 40), (RunStatus.FINISHED, 40)]
+    assert flushed_at == [20, 40]
+    # the pause, of at least 0.05 s, is not counted as time spent
+    # simulating
+    assert elapsed_s - progress.wall_time_s >= 0.05
+
+
+def test_stop__ends_a_paused_run(env):
+    env.process(tick(env))
+
+    def pause(progress):
+        if progress.status == RunStatus.RUNNING:
+            supervisor.pause()
+            threading.Timer(0.05, supervisor.stop).start()
+    supervisor = RunSupervisor(env, until=100, slice_duration=10,
+                               on_progress=pause, poll_interval_s=0.01)
+    progress = supervisor.run()
+    assert progress.status == RunStatus.STOPPED
+    assert progress.time == 10
+
+
+def test_sigterm__stops_the_run(env):
+    env.process(tick(env))
+    previous_handler = signal.getsignal(signal.SIGTERM)
+
+    def terminate(progress):
+        if progress.status == RunStatus.RUNNING:
+            os.kill(os.getpid(), signal.SIGTERM)
+    supervisor = RunSupervisor(env, until=100, slice_duration=10,
+                               on_progress=terminate, handle_signals=True)
+    progress = supervisor.run()
+    assert progress.status == RunStatus.STOPPED
+    assert progress.time == 10
+    assert signal.getsignal(signal.SIGTERM) is previous_handler
+
+
+def test_run__flushes_the_results_on_errors(env, tmpdir):
+    env.process(tick(env))
+    env.process(fail_at(env, 15))
+    flushed_at = []
+    path = str(tmpdir.join("status.json"))
+    supervisor = RunSupervisor(
+        env, until=100, slice_duration=10, status_path=path,
+        flush=lambda: flushed_at.append(env.now))
+    with pytest.raises(ValueError):
+        supervisor.run()
+    assert flushed_at == [15]
+    with open(path) as status_file:
+        assert json.load(status_file)["status"] == RunStatus.ERROR
+
+
+def test_supervisor_constructor__raises_exception(env):
+    with pytest.raises(FT4FTTSimException):
+        RunSupervisor(env, until=100, slice_duration=0)
@@ -0,0 +1,77 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Sweep the following network over link configurations and playback
+configurations:
+
++--------+       +----------+
+| player 0 ----> 0 recorder |
++--------+       +----------+
+
+"""
+
+import pytest
+
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.sweep import grid, run_point, run_sweep, results_table
+from ft4fttsim.sweep import SweepStatus
+from ft4fttsim.tests.networking.fixturehelper import LINK_CONFIGS
+from ft4fttsim.tests.networking.fixturehelper import PLAYBACK_CONFIGS
+from ft4fttsim.tests.networking.networkhelper import (
+    player_recorder_scenario, failing_scenario)
+
+
+def endless_scenario(env):
+    def loop():
+        while True:
+            yield env.timeout(1)
+    env.process(loop())
+    return lambda: None
+
+
+def test_grid__returns_all_combinations():
+    points = grid(link_config=LINK_CONFIGS, playback_config=PLAYBACK_CONFIGS)
+    assert len(points) == len(LINK_CONFIGS) * len(PLAYBACK_CONFIGS)
+    assert {"link_config": (100, 0), "playback_config": "2 messages"} in (
+        points)
+
+
+def test_run_sweep__results_match_run_point():
+    points = grid(link_config=LINK_CONFIGS,
+                  playback_config=["2 messages", "8 messages"])
+    results = run_sweep(player_recorder_scenario, points, max_workers=2)
+    assert [result.params for result in results] == points
+    for result in results:
+        assert result.status == SweepStatus.OK
+        assert result.summary == run_point(
+            player_recorder_scenario, result.params, float("inf"))
+
+
+def test_run_sweep__reports_errors():
+    results = run_sweep(failing_scenario, [{}])
+    assert results[0].status == SweepStatus.ERROR
+    assert "bad scenario" in results[0].summary
+
+
+def test_run_sweep__kills_points_that_time_out():
+    points = [{}, {}, {}]
+    results = run_sweep(endless_scenario, points, max_workers=2,
+                        timeout_s=0.2)
+    assert [result.status for result in results] == [SweepStatus.TIMEOUT] * 3
+
+
+def test_run_sweep__needs_a_worker():
+    with pytest.raises(FT4FTTSimException):
+        run_sweep(endless_scenario, [{}], max_workers=0)
+
+
+def test_results_table__merges_params_and_summaries():
+    points = grid(link_config=[(100, 0)], playback_config=["8 messages"])
+    results = run_sweep(player_recorder_scenario, points) + run_sweep(
+        failing_scenario, [{}])
+    columns, rows = results_table(results)
+    assert columns == ["link_config", "playback_config", "status",
+                       "wall_time_s", "last reception", "received"]
+    assert rows[0][:3] == [(100, 0), "8 messages", SweepStatus.OK]
+    assert rows[0][5] == 8
+    assert rows[1][:3] + rows[1][4:] == [None, None, SweepStatus.ERROR,
+                                         None, None]
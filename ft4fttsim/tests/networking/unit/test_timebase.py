@@ -0,0 +1,111 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pytest
+import simpy
+
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.ft4ftt import ECLayout, Master, MessageType
+from ft4fttsim.networking import Link, Message, NetworkDevice, Switch
+from ft4fttsim.networking import MessagePlaybackDevice, MessageRecordingDevice
+from ft4fttsim.parallel import summarize_device
+from ft4fttsim.tests.networking.networkhelper import build_ft4ftt_network
+from ft4fttsim.timebase import TimeBase, NANOSECONDS, MICROSECONDS
+from ft4fttsim.timebase import bit_times, set_time_base, get_time_base
+
+
+def build_multirate_network(env):
+    """
+    Build a player that sends messages of different sizes at time 0 through
+    a switch to recorders behind links of different rates.
+
+    """
+    player = MessagePlaybackDevice(env, "player", 1)
+    switch = Switch(env, "switch", 3)
+    recorders = [MessageRecordingDevice(env, "recorder{}".format(i), 1)
+                 for i in range(2)]
+    links = [
+        Link(env, player.ports[0], switch.ports[0], 1000, 0.5),
+        Link(env, switch.ports[1], recorders[0].ports[0], 100, 3),
+        Link(env, switch.ports[2], recorders[1].ports[0], 10, 1.25),
+    ]
+    player.load_transmission_commands({0: {player.ports[0]: [
+        Message(env, player, recorders, size_bytes, "message")
+        for size_bytes in [1234, 64, 958, 1518, 90]]}})
+    return [player, switch] + recorders, links
+
+
+def reception_times(build_network, time_base, until):
+    env = simpy.Environment()
+    set_time_base(env, time_base)
+    devices, _ = build_network(env)
+    env.run(until=until)
+    return dict((device.name, sorted(summarize_device(device)))
+                for device in devices
+                if summarize_device(device) is not None)
+
+
+@pytest.mark.parametrize("build_network, until_us", [
+    (build_multirate_network, 500),
+    (build_ft4ftt_network, 5500),
+])
+def test_nanoseconds__times_are_exact_integers(build_network, until_us):
+    float_times = reception_times(build_network, MICROSECONDS, until_us)
+    integer_times = reception_times(build_network, NANOSECONDS,
+                                    until_us * 1000)
+    assert any(float_times.values())
+    for name, times in integer_times.items():
+        assert all(isinstance(time, int) for time in times)
+        assert times == [round(time * 1000) for time in float_times[name]]
+
+
+def test_get_time_base__defaults_to_microseconds(env):
+    assert get_time_base(env) is MICROSECONDS
+    assert not get_time_base(env).is_integer
+
+
+def test_master__starts_elementary_cycles_at_integer_instants(env):
+    set_time_base(env, NANOSECONDS)
+    master = Master(env, "master", 1, [], 1000.5)
+    env.run(until=3 * 1000500 + 1)
+    assert master.ec_start_time == 3 * 1000500
+    assert master.ec_count == 4
+
+
+def test_master__window_hold_time_is_integer(env):
+    set_time_base(env, NANOSECONDS)
+    master = Master(env, "master", 1, [], 1000, ec_layout=ECLayout(
+        tm_window_us=100, sync_window_us=600, async_window_us=300))
+    link = Link(env, NetworkDevice(env, "d1", 1).ports[0],
+                NetworkDevice(env, "d2", 1).ports[0], 100, 0)
+    env.run(until=1)
+    message = Message(env, None, None, 992, MessageType.UPDATE_REQUEST)
+    assert master.window_hold_time(message, link) == 700000 - 1
+
+
+@pytest.mark.parametrize("time_base, megabits_per_second", [
+    (TimeBase(1), 3),
+    (NANOSECONDS, 3),
+])
+def test_link__inexact_byte_time__raises_exception(
+        env, time_base, megabits_per_second):
+    set_time_base(env, time_base)
+    with pytest.raises(FT4FTTSimException):
+        Link(env, NetworkDevice(env, "d1", 1).ports[0],
+             NetworkDevice(env, "d2", 1).ports[0], megabits_per_second, 0)
+
+
+def test_from_us__inexact_time__raises_exception():
+    with pytest.raises(FT4FTTSimException):
+        NANOSECONDS.from_us(0.0005)
+
+
+def test_bit_times__tick_is_a_bit_time_of_the_link():
+    time_base = bit_times(100)
+    assert time_base.byte_time(100) == 8
+    assert time_base.from_us(1) == 100
+
+
+@pytest.mark.parametrize("ticks_per_us", [0, -1, 1.5])
+def test_time_base__invalid_ticks__raises_exception(ticks_per_us):
+    with pytest.raises(FT4FTTSimException):
+        TimeBase(ticks_per_us)
@@ -0,0 +1,137 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Compile topology descriptions such as the following ring of switches:
+
+              +-----------+       +-----------+
+ player ----- 0 switch0 1 ------- 0 switch1 1 ----- recorder1
+              |     2     |       |     2     |
+              +-----------+       +-----------+
+                    |                   |
+              +-----------+       +-----------+
+              |     2     |       |     2     |
+ recorder3 -- 0 switch3 1 ------- 0 switch2 1 ----- recorder2
+              +-----------+       +-----------+
+
+"""
+
+import json
+
+import pytest
+
+from ft4fttsim.cache import ResultCache
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import Message
+from ft4fttsim.topology import compile_topology, load_topology
+
+
+def link(device1, port1, device2, port2):
+    return {"ends": [[device1, port1], [device2, port2]],
+            "megabits_per_second": 100, "propagation_delay_us": 1}
+
+
+RING = {
+    "devices": (
+        [{"name": "switch{}".format(i), "type": "switch", "ports": 3}
+         for i in range(4)] +
+        [{"name": "player", "type": "player"}] +
+        [{"name": "recorder{}".format(i), "type": "recorder"}
+         for i in range(1, 4)]),
+    "links": [
+        link("switch0", 1, "switch1", 0),
+        link("switch1", 2, "switch2", 2),
+        link("switch2", 0, "switch3", 1),
+        link("switch3", 2, "switch0", 2),
+        link("player", 0, "switch0", 0),
+        link("switch1", 1, "recorder1", 0),
+        link("switch2", 1, "recorder2", 0),
+        link("switch3", 0, "recorder3", 0),
+    ],
+    "multicast_groups": {"recorders": ["recorder1", "recorder2",
+                                       "recorder3"]},
+}
+
+
+def test_compile_topology__forwarding_tables_follow_shortest_paths():
+    tables = compile_topology(RING).forwarding_tables
+    assert tables["switch0"]["recorder1"] == (1,)
+    assert tables["switch0"]["recorder3"] == (2,)
+    assert tables["switch0"]["recorder2"] in [(1,), (2,)]
+    assert tables["switch2"]["player"] in [(0,), (2,)]
+    assert tables["switch2"]["recorder2"] == (1,)
+
+
+def test_compile_topology__multicast_groups_follow_a_spanning_tree():
+    tables = compile_topology(RING).forwarding_tables
+    # The spanning tree does not include the link between switch2 and
+    # switch3.
+    assert [tables["switch{}".format(i)]["recorders"] for i in range(4)] == [
+        (1, 2), (0, 1, 2), (1, 2), (0, 2)]
+
+
+@pytest.mark.parametrize("destination, expected_recorders", [
+    ("recorders", ["recorder1", "recorder2", "recorder3"]),
+    ("recorder2", ["recorder2"]),
+])
+def test_instantiate__messages_reach_destinations_exactly_once(
+        env, destination, expected_recorders):
+    network = compile_topology(RING).instantiate(env)
+    devices = network.devices
+    player = devices["player"]
+    destination = dict(devices, **network.multicast_groups)[destination]
+    message = Message(env, player, destination, 100, "some message")
+    player.load_transmission_commands({0: {player.ports[0]: [message]}})
+    env.run(until=1000)
+    for i in range(1, 4):
+        recorder = devices["recorder{}".format(i)]
+        expected = 1 if recorder.name in expected_recorders else 0
+        assert len(recorder.recorded_messages) == expected
+
+
+def test_instantiate__builds_links(env):
+    network = compile_topology(RING).instantiate(env)
+    assert len(network.links) == 8
+    assert all(not port.is_free
+               for port in network.devices["switch0"].ports)
+
+
+@pytest.mark.parametrize("change", [
+    lambda topology: topology["devices"].append(topology["devices"][0]),
+    lambda topology: topology["links"].append(link("player", 0, "switch1", 1)),
+    lambda topology: topology["links"].append(link("player", 1, "switch1", 1)),
+    lambda topology: topology["links"].append(link("nobody", 0, "switch1", 1)),
+    lambda topology: topology["multicast_groups"].update(group=["nobody"]),
+    lambda topology: topology["multicast_groups"].update(switch0=[]),
+])
+def test_compile_topology__rejects_invalid_descriptions(change):
+    topology = json.loads(json.dumps(RING))
+    change(topology)
+    with pytest.raises(FT4FTTSimException):
+        compile_topology(topology)
+
+
+def test_instantiate__rejects_unknown_device_types(env):
+    topology = {"devices": [{"name": "d", "type": "router"}]}
+    compiled = compile_topology(topology)
+    with pytest.raises(FT4FTTSimException):
+        compiled.instantiate(env)
+
+
+def test_load_topology__reads_json_and_toml(tmp_path):
+    json_path = tmp_path / "ring.json"
+    json_path.write_text(json.dumps(RING))
+    toml_path = tmp_path / "line.toml"
+    toml_path.write_text(
+        '[[devices]]\nname = "switch"\ntype = "switch"\nports = 2\n'
+        '[[devices]]\nname = "recorder"\ntype = "recorder"\n'
+        '[[links]]\nends = [["switch", 1], ["recorder", 0]]\n'
+        'megabits_per_second = 10\n')
+    assert load_topology(str(json_path)) == RING
+    compiled = compile_topology(load_topology(str(toml_path)))
+    assert compiled.forwarding_tables == {"switch": {"recorder": (1,)}}
+
+
+def test_compile_topology__loads_cached_compilation(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    compiled = compile_topology(RING, cache=cache)
+    assert compile_topology(RING, cache=cache) == compiled
+    assert cache.stats.hits == 1
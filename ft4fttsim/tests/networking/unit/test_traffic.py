@@ -0,0 +1,168 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pytest
+import simpy
+
+from ft4fttsim.checkpoint import take_checkpoint, restore_checkpoint
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import Link, MessageRecordingDevice
+from ft4fttsim.parallel import summarize_device
+from ft4fttsim.timebase import set_time_base, NANOSECONDS
+from ft4fttsim.traffic import ConstantSize, UniformSize, EmpiricalSize
+from ft4fttsim.traffic import PeriodicGenerator, PoissonGenerator
+from ft4fttsim.traffic import OnOffGenerator, TrafficGenerator
+
+# The traffic generators require NumPy.
+pytest.importorskip("numpy")
+
+
+def connect(env, generator):
+    recorder = generator.destination
+    Link(env, generator.ports[0], recorder.ports[0], 1000, 0)
+    return recorder
+
+
+def instruction_times(env, generator, until):
+    """
+    Return the instants of time when generator instructed the transmission
+    of its messages.
+
+    """
+    times = []
+    instruct_transmission = generator.instruct_transmission
+
+    def record_time(message, port):
+        times.append(env.now)
+        return instruct_transmission(message, port)
+
+    generator.instruct_transmission = record_time
+    connect(env, generator)
+    env.run(until=until)
+    return times
+
+
+@pytest.fixture
+def recorder(env):
+    return MessageRecordingDevice(env, "recorder", 1)
+
+
+def test_periodic_generator__transmits_every_period(env, recorder):
+    generator = PeriodicGenerator(env, "periodic", recorder, 100,
+                                  ConstantSize(64), start_time=50,
+                                  stop_time=460)
+    assert instruction_times(env, generator, 1000) == [
+        50, 150, 250, 350, 450]
+    assert [m.data for m in recorder.recorded_messages] == list(range(5))
+
+
+def test_poisson_generator__has_the_requested_rate(env, recorder):
+    generator = PoissonGenerator(env, "poisson", recorder, 10,
+                                 ConstantSize(64))
+    times = instruction_times(env, generator, 100000)
+    mean_interarrival_time = times[-1] / len(times)
+    assert mean_interarrival_time == pytest.approx(10, rel=0.05)
+
+
+def test_generators__same_seed_and_name__are_reproducible():
+    times = []
+    for name in ["poisson", "poisson", "other"]:
+        env = simpy.Environment()
+        recorder = MessageRecordingDevice(env, "recorder", 1)
+        generator = PoissonGenerator(env, name, recorder, 10,
+                                     UniformSize(64, 1518), seed=7)
+        times.append(instruction_times(env, generator, 1000))
+    assert times[0] == times[1]
+    assert times[0] != times[2]
+
+
+def test_generators__sizes_do_not_change_arrival_times():
+    times = []
+    for sizes in [ConstantSize(64), UniformSize(64, 1518)]:
+        env = simpy.Environment()
+        recorder = MessageRecordingDevice(env, "recorder", 1)
+        generator = PoissonGenerator(env, "poisson", recorder, 100, sizes)
+        times.append(instruction_times(env, generator, 10000))
+    assert times[0] == times[1]
+
+
+def test_on_off_generator__transmits_periodic_bursts(env, recorder):
+    generator = OnOffGenerator(env, "bursty", recorder, 10, 100, 1000,
+                               ConstantSize(64))
+    times = instruction_times(env, generator, 100000)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    # gaps between the last message of a burst and the first of the next
+    bursts = [gap for gap in gaps if gap != pytest.approx(10)]
+    assert bursts
+    # about (100 / 10 + 1) messages per burst of every 1100 us
+    assert len(times) / len(bursts) == pytest.approx(11, rel=0.2)
+
+
+def test_empirical_size__draws_sizes_of_the_trace(env, recorder):
+    generator = PeriodicGenerator(
+        env, "trace", recorder, 100,
+        EmpiricalSize([64, 1000, 1518], weights=[0, 1, 3]))
+    connect(env, generator)
+    env.run(until=100000)
+    sizes = [m.size_bytes for m in recorder.recorded_messages]
+    assert set(sizes) == {1000, 1518}
+    assert sizes.count(1518) / len(sizes) == pytest.approx(0.75, abs=0.05)
+
+
+@pytest.mark.parametrize("make_sizes", [
+    lambda: ConstantSize(10),
+    lambda: UniformSize(64, 2000),
+    lambda: UniformSize(100, 64),
+    lambda: EmpiricalSize([]),
+    lambda: EmpiricalSize([64, 128], weights=[1]),
+])
+def test_sizes__invalid_arguments__raise_exception(make_sizes):
+    with pytest.raises(FT4FTTSimException):
+        make_sizes()
+
+
+def test_traffic_generator__without_interarrival_times__raises_exception(
+        env, recorder):
+    with pytest.raises(FT4FTTSimException):
+        TrafficGenerator(env, "generator", recorder, ConstantSize(64))
+
+
+def test_generators__can_have_many_independent_streams(env, recorder):
+    generator = PoissonGenerator(env, "generator", recorder, 10,
+                                 ConstantSize(64), block_size=4)
+    streams = [generator.add_stream(i, UniformSize(64, 1518))
+               for i in range(20)]
+    values = [tuple(stream.next() for _ in range(4)) for stream in streams]
+    assert len(set(values)) == 20
+
+
+def test_poisson_generator__integer_time_base__has_integer_times(
+        env, recorder):
+    set_time_base(env, NANOSECONDS)
+    generator = PoissonGenerator(env, "poisson", recorder, 10.5,
+                                 ConstantSize(64))
+    times = instruction_times(env, generator, 10 ** 5)
+    assert times and all(isinstance(time, int) for time in times)
+
+
+def build_network(env):
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    generator = OnOffGenerator(env, "bursty", recorder, 10, 100, 100,
+                               UniformSize(64, 1518), block_size=16)
+    links = [Link(env, generator.ports[0], recorder.ports[0], 100, 1)]
+    return [recorder, generator], links
+
+
+def test_generators__are_restored_from_checkpoints():
+    env = simpy.Environment()
+    devices, _ = build_network(env)
+    env.run(until=5000)
+    expected = summarize_device(devices[0])
+    env = simpy.Environment()
+    devices, links = build_network(env)
+    env.run(until=1234)
+    checkpoint = take_checkpoint(env, devices, links)
+    env = simpy.Environment(initial_time=checkpoint.time)
+    devices, links = build_network(env)
+    restore_checkpoint(checkpoint, env, devices, links)
+    env.run(until=5000)
+    assert summarize_device(devices[0]) == expected
@@ -0,0 +1,163 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Units of simulated time.
+
+By default, simulated time is measured in floating-point microseconds. An
+environment can instead be given an integer time base, e.g., nanoseconds or
+the bit-time of the fastest link, before the network is built:
+
+>>> import simpy
+>>> from ft4fttsim.networking import NetworkDevice, Link
+>>> env = simpy.Environment()
+>>> set_time_base(env, NANOSECONDS)
+>>> d = NetworkDevice(env, "some device", 1)
+>>> d2 = NetworkDevice(env, "another device", 1)
+>>> link = Link(env, d.ports[0], d2.ports[0], 100, 3)
+>>> link.transmission_time(1526), link.propagation_delay
+(122080, 3000)
+
+With an integer time base, links precompute the number of ticks needed to
+transmit a byte and all the times scheduled by links, masters and slaves are
+integers, so that simulations are exactly reproducible and events of the
+same instant of time are never misordered by rounding errors. Times given in
+microseconds, e.g., propagation delays or elementary cycle durations, have
+to be integer multiples of a tick. Instants of time that are given directly,
+e.g., the keys of the transmission commands of playback devices or the until
+argument of env.run(), are in the time base of env.
+
+"""
+
+from fractions import Fraction
+import weakref
+
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+class TimeBase(object):
+    """
+    Unit of the simulated time of an environment.
+
+    """
+
+    def __init__(self, ticks_per_us=None):
+        """
+        Create a new instance of class TimeBase.
+
+        Arguments:
+            ticks_per_us: The number of integer ticks in a microsecond, or
+                None for floating-point microseconds.
+
+        """
+        if ticks_per_us is not None and (
+                int(ticks_per_us) != ticks_per_us or ticks_per_us <= 0):
+            raise FT4FTTSimException(
+                "The number of ticks per microsecond must be a positive "
+                "integer.")
+        self.ticks_per_us = (
+            None if ticks_per_us is None else int(ticks_per_us))
+
+    @property
+    def is_integer(self):
+        return self.ticks_per_us is not None
+
+    def from_us(self, time_us):
+        """
+        Convert a time in microseconds to the time base.
+
+        Raises:
+            FT4FTTSimException: If the time is not an integer number of ticks.
+
+        >>> TimeBase(1000).from_us(5.76)
+        5760
+        >>> TimeBase().from_us(5)
+        5.0
+
+        """
+        if not self.is_integer:
+            return float(time_us)
+        if isinstance(time_us, float):
+            # the decimal value written by the user, not its binary
+            # approximation
+            time_us = Fraction(repr(time_us))
+        ticks = Fraction(time_us) * self.ticks_per_us
+        if ticks.denominator != 1:
+            raise FT4FTTSimException(
+                "{} us is not an integer number of ticks of {}".format(
+                    time_us, self))
+        return int(ticks)
+
+    def to_us(self, time):
+        """
+        Convert a time of the time base to microseconds.
+
+        """
+        if not self.is_integer:
+            return time
+        return time / self.ticks_per_us
+
+    def byte_time(self, megabits_per_second):
+        """
+        Return the number of ticks needed to transmit a byte at the given
+        rate, or None if the time base is not an integer time base.
+
+        Raises:
+            FT4FTTSimException: If the byte time is not an integer number of
+                ticks.
+
+        >>> TimeBase(1000).byte_time(100)
+        80
+
+        """
+        if not self.is_integer:
+            return None
+        ticks = Fraction(8 * self.ticks_per_us) / Fraction(
+            repr(megabits_per_second) if isinstance(
+                megabits_per_second, float) else megabits_per_second)
+        if ticks.denominator != 1:
+            raise FT4FTTSimException(
+                "A byte at {} Mbps is not an integer number of ticks of {}; "
+                "use a finer time base, e.g., bit_times() of the fastest "
+                "link.".format(megabits_per_second, self))
+        return int(ticks)
+
+    def __repr__(self):
+        if not self.is_integer:
+            return "TimeBase(microseconds)"
+        return "TimeBase({} ticks per us)".format(self.ticks_per_us)
+
+
+MICROSECONDS = TimeBase()
+NANOSECONDS = TimeBase(1000)
+
+
+def bit_times(megabits_per_second):
+    """
+    Return the integer time base whose tick is the time needed to transmit
+    a bit at the given rate.
+
+    >>> bit_times(1000).byte_time(100)
+    80
+
+    """
+    return TimeBase(megabits_per_second)
+
+
+# time bases of the environments that do not use MICROSECONDS
+_time_bases = weakref.WeakKeyDictionary()
+
+
+def set_time_base(env, time_base):
+    """
+    Set the time base of env. This has to be done before any link or
+    network device is created in env.
+
+    """
+    _time_bases[env] = time_base
+
+
+def get_time_base(env):
+    """
+    Return the time base of env.
+
+    """
+    return _time_bases.get(env, MICROSECONDS)
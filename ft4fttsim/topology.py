@@ -0,0 +1,375 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Declarative description of network topologies.
+
+A topology is described by a dictionary, usually loaded from a JSON or TOML
+file with load_topology(), such as:
+
+    {
+        "devices": [
+            {"name": "player", "type": "player", "ports": 1},
+            {"name": "switch", "type": "switch", "ports": 3},
+            {"name": "recorder1", "type": "recorder", "ports": 1},
+            {"name": "recorder2", "type": "recorder", "ports": 1}
+        ],
+        "links": [
+            {"ends": [["player", 0], ["switch", 0]],
+             "megabits_per_second": 100, "propagation_delay_us": 1},
+            {"ends": [["switch", 1], ["recorder1", 0]],
+             "megabits_per_second": 100, "propagation_delay_us": 1},
+            {"ends": [["switch", 2], ["recorder2", 0]],
+             "megabits_per_second": 100, "propagation_delay_us": 1}
+        ],
+        "multicast_groups": {"recorders": ["recorder1", "recorder2"]}
+    }
+
+compile_topology() checks the description and computes the forwarding
+table of every switch: unicast destinations are reached along shortest
+paths and multicast groups along a spanning tree of the network, so that
+multicast messages are neither duplicated nor looped. The resulting
+CompiledTopology is picklable and instantiates the network in a simpy
+environment.
+
+"""
+
+from collections import namedtuple, deque
+import json
+
+from ft4fttsim.cache import content_key
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import NetworkDevice, Link, Switch, EchoDevice
+from ft4fttsim.networking import MessageRecordingDevice
+from ft4fttsim.networking import MessagePlaybackDevice
+from ft4fttsim.networking import MessagePlaybackAndRecordingDevice
+from ft4fttsim.networking import MulticastGroup
+
+
+def _make_echo_device(env, name, num_ports):
+    if num_ports != 1:
+        raise FT4FTTSimException("Echo devices have exactly one port.")
+    return EchoDevice(env, name)
+
+
+# Dictionary whose keys are the device types of topology descriptions and
+# whose values are functions called with an environment, a device name and a
+# number of ports to create a device of that type.
+DEVICE_TYPES = {
+    "device": NetworkDevice,
+    "switch": Switch,
+    "echo": _make_echo_device,
+    "recorder": MessageRecordingDevice,
+    "player": MessagePlaybackDevice,
+    "player and recorder": MessagePlaybackAndRecordingDevice,
+}
+
+
+# Device type whose devices forward messages according to a forwarding table.
+SWITCH_TYPE = "switch"
+
+
+DeviceSpec = namedtuple("DeviceSpec", "name, type, num_ports")
+
+
+LinkSpec = namedtuple(
+    "LinkSpec",
+    "device1, port1, device2, port2, megabits_per_second, "
+    "propagation_delay_us")
+
+
+# The devices of a network instantiated from a CompiledTopology. devices and
+# multicast_groups are dictionaries whose keys are the names of the devices
+# and groups.
+Network = namedtuple("Network", "devices, links, multicast_groups")
+
+
+def load_topology(path):
+    """
+    Load the description of a topology from a JSON or TOML file.
+
+    Raises:
+        FT4FTTSimException: If the file is a TOML file but no TOML parser is
+            available (i.e., Python is older than 3.11).
+
+    """
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise FT4FTTSimException(
+                "Loading TOML topologies requires Python 3.11 or later.")
+        with open(path, "rb") as topology_file:
+            return tomllib.load(topology_file)
+    with open(path) as topology_file:
+        return json.load(topology_file)
+
+
+class CompiledTopology(namedtuple(
+        "CompiledTopology",
+        "devices, links, multicast_groups, forwarding_tables")):
+    """
+    A checked topology with the forwarding tables of its switches.
+
+    devices is a tuple of DeviceSpecs, links a tuple of LinkSpecs and
+    multicast_groups a tuple of (group name, member names) tuples.
+    forwarding_tables is a dictionary whose keys are the names of the
+    switches and whose values are dictionaries mapping the names of
+    destination devices and multicast groups to tuples of port numbers.
+
+    """
+
+    def instantiate(self, env, device_types=DEVICE_TYPES):
+        """
+        Create the devices and links of the topology in env.
+
+        Arguments:
+            env: A simpy.Environment instance.
+            device_types: Dictionary like DEVICE_TYPES that tells how to
+                create the devices of each type.
+
+        Returns:
+            A Network instance.
+
+        """
+        devices = {}
+        for spec in self.devices:
+            if spec.type not in device_types:
+                raise FT4FTTSimException(
+                    "Unknown device type {!r} of {}".format(
+                        spec.type, spec.name))
+            devices[spec.name] = device_types[spec.type](
+                env, spec.name, spec.num_ports)
+        links = [
+            Link(env, devices[spec.device1].ports[spec.port1],
+                 devices[spec.device2].ports[spec.port2],
+                 spec.megabits_per_second, spec.propagation_delay_us)
+            for spec in self.links]
+        multicast_groups = dict(
+            (name, MulticastGroup(name, [devices[m] for m in members]))
+            for name, members in self.multicast_groups)
+        destinations = dict(devices, **multicast_groups)
+        for switch_name, table in self.forwarding_tables.items():
+            switch = devices[switch_name]
+            switch.forwarding_table = dict(
+                (destinations[destination],
+                 [switch.ports[i] for i in port_numbers])
+                for destination, port_numbers in table.items())
+        return Network(devices, links, multicast_groups)
+
+    def build_network(self, env):
+        """
+        Instantiate the topology and return a (devices, links) tuple of
+        lists, as required by ft4fttsim.parallel.ParallelSimulation.
+
+        """
+        network = self.instantiate(env)
+        return list(network.devices.values()), network.links
+
+
+def _parse(description):
+    """
+    Check a topology description and turn it into specs.
+
+    Returns:
+        A (devices, links, multicast_groups) tuple as in CompiledTopology.
+
+    """
+    devices = []
+    names = set()
+    for device in description.get("devices", []):
+        spec = DeviceSpec(device["name"], device.get("type", "device"),
+                          int(device.get("ports", 1)))
+        if spec.name in names:
+            raise FT4FTTSimException(
+                "Duplicate device name {}".format(spec.name))
+        names.add(spec.name)
+        devices.append(spec)
+    num_ports = dict((spec.name, spec.num_ports) for spec in devices)
+    used_ports = set()
+    links = []
+    for link in description.get("links", []):
+        (device1, port1), (device2, port2) = link["ends"]
+        for device, port in [(device1, port1), (device2, port2)]:
+            if device not in num_ports:
+                raise FT4FTTSimException(
+                    "Link to unknown device {}".format(device))
+            if not 0 <= port < num_ports[device]:
+                raise FT4FTTSimException(
+                    "{} has no port {}".format(device, port))
+            if (device, port) in used_ports:
+                raise FT4FTTSimException(
+                    "Port {} of {} is connected to more than one link".format(
+                        port, device))
+            used_ports.add((device, port))
+        links.append(LinkSpec(
+            device1, port1, device2, port2, link["megabits_per_second"],
+            link.get("propagation_delay_us", 0)))
+    multicast_groups = []
+    for name, members in sorted(
+            description.get("multicast_groups", {}).items()):
+        if name in names:
+            raise FT4FTTSimException(
+                "Multicast group {} has the name of a device".format(name))
+        for member in members:
+            if member not in num_ports:
+                raise FT4FTTSimException(
+                    "Unknown member {} of multicast group {}".format(
+                        member, name))
+        multicast_groups.append((name, tuple(members)))
+    return tuple(devices), tuple(links), tuple(multicast_groups)
+
+
+def _neighbors(devices, links):
+    """
+    Return a dictionary whose keys are device names and whose values are
+    lists of (port number, neighbor name, neighbor port number) tuples.
+
+    """
+    neighbors = dict((spec.name, []) for spec in devices)
+    for spec in links:
+        neighbors[spec.device1].append((spec.port1, spec.device2, spec.port2))
+        neighbors[spec.device2].append((spec.port2, spec.device1, spec.port1))
+    return neighbors
+
+
+def _shortest_path_ports(switch, neighbors, is_switch):
+    """
+    Return a dictionary whose keys are the names of the devices reachable
+    from switch and whose values are the ports of switch on a shortest path
+    to them. Only switches forward messages on a path.
+
+    """
+    first_ports = {}
+    queue = deque()
+    for port, neighbor, _ in neighbors[switch]:
+        if neighbor != switch and neighbor not in first_ports:
+            first_ports[neighbor] = port
+            queue.append(neighbor)
+    while queue:
+        device = queue.popleft()
+        if not is_switch[device]:
+            continue
+        for _, neighbor, _ in neighbors[device]:
+            if neighbor != switch and neighbor not in first_ports:
+                first_ports[neighbor] = first_ports[device]
+                queue.append(neighbor)
+    return first_ports
+
+
+def _spanning_forest(devices, neighbors, is_switch):
+    """
+    Return a spanning forest of the network through which only switches
+    forward messages. The forest has a tree rooted at a switch for every
+    connected part of the network that contains switches.
+
+    Returns:
+        A (parents, roots, order) tuple. parents is a dictionary whose keys
+        are the names of the devices in the forest that are not roots and
+        whose values are (parent name, port number of the parent, port
+        number of the device) tuples. roots is a dictionary mapping the
+        names of the devices in the forest to the names of their roots.
+        order is a list of the names of the devices in the forest in
+        breadth-first order.
+
+    """
+    parents = {}
+    roots = {}
+    order = []
+    for root in [spec.name for spec in devices if is_switch[spec.name]]:
+        if root in roots:
+            continue
+        roots[root] = root
+        queue = deque([root])
+        while queue:
+            device = queue.popleft()
+            order.append(device)
+            if not is_switch[device]:
+                continue
+            for port, neighbor, neighbor_port in neighbors[device]:
+                if neighbor not in roots:
+                    roots[neighbor] = root
+                    parents[neighbor] = (device, port, neighbor_port)
+                    queue.append(neighbor)
+    return parents, roots, order
+
+
+def _multicast_ports(devices, neighbors, is_switch, multicast_groups):
+    """
+    Return a dictionary whose keys are (switch name, group name) tuples and
+    whose values are the ports of the switch on the spanning forest that
+    lead to members of the group.
+
+    """
+    parents, roots, order = _spanning_forest(devices, neighbors, is_switch)
+    multicast_ports = {}
+    for group, members in multicast_groups:
+        members = set(members)
+        # number of members of the group in the subtree of each device
+        in_subtree = dict(
+            (device, int(device in members)) for device in order)
+        for device in reversed(order):
+            if device in parents:
+                in_subtree[parents[device][0]] += in_subtree[device]
+        ports = dict((device, []) for device in order)
+        for device in order:
+            if device not in parents:
+                continue
+            parent, parent_port, port = parents[device]
+            if in_subtree[device]:
+                ports[parent].append(parent_port)
+            if in_subtree[roots[device]] > in_subtree[device]:
+                ports[device].append(port)
+        for device in order:
+            if is_switch[device]:
+                multicast_ports[(device, group)] = tuple(
+                    sorted(ports[device]))
+    return multicast_ports
+
+
+def compile_topology(description, cache=None):
+    """
+    Check a topology description and compute the forwarding tables of its
+    switches.
+
+    Arguments:
+        description: A dictionary describing the topology.
+        cache: An optional ft4fttsim.cache.ResultCache where compiled
+            topologies are stored, so that compiling the same description
+            again just loads it.
+
+    Returns:
+        A CompiledTopology instance.
+
+    Raises:
+        FT4FTTSimException: If the description is not valid.
+
+    """
+    if cache is not None:
+        key = content_key({"topology": description})
+        compiled = cache.get(key)
+        if compiled is not None:
+            return compiled
+    devices, links, multicast_groups = _parse(description)
+    neighbors = _neighbors(devices, links)
+    is_switch = dict(
+        (spec.name, spec.type == SWITCH_TYPE) for spec in devices)
+    multicast_ports = _multicast_ports(
+        devices, neighbors, is_switch, multicast_groups)
+    forwarding_tables = {}
+    for spec in devices:
+        if not is_switch[spec.name]:
+            continue
+        first_ports = _shortest_path_ports(spec.name, neighbors, is_switch)
+        table = dict((destination, (port,))
+                     for destination, port in first_ports.items())
+        for other in devices:
+            if other.name not in first_ports and other.name != spec.name:
+                # unreachable destinations are dropped instead of flooded
+                table[other.name] = ()
+        for group, _ in multicast_groups:
+            table[group] = multicast_ports[(spec.name, group)]
+        forwarding_tables[spec.name] = table
+    compiled = CompiledTopology(
+        devices, links, multicast_groups, forwarding_tables)
+    if cache is not None:
+        cache.put(key, compiled)
+    return compiled
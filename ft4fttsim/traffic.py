@@ -0,0 +1,395 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Network devices that generate stochastic background traffic.
+
+Unlike MessagePlaybackDevice, traffic generators do not need a dictionary of
+transmission commands: they draw the time until their next message and its
+size from random distributions and create each message only when it is
+transmitted, so they can run at realistic rates for as long as needed:
+
+    sizes = EmpiricalSize([64, 576, 1518], weights=[0.5, 0.2, 0.3])
+    PoissonGenerator(env, "background", recorder, 50, sizes, seed=1)
+
+Each generator has its own random streams, derived from its seed and its
+name, so that generators with the same seed but different names are
+independent, and so that changing the size distribution of a generator does
+not change the instants of time of its messages. The random numbers are
+drawn with NumPy in blocks of block_size values rather than one at a time.
+
+Traffic generators require NumPy.
+
+"""
+
+import zlib
+
+import ft4fttsim.ethernet as ethernet
+import ft4fttsim.timebase as timebase
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import NetworkDevice, Message
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise FT4FTTSimException("Traffic generators require NumPy.")
+    return numpy
+
+
+def _check_size(size_bytes):
+    if not (ethernet.MIN_FRAME_SIZE_BYTES <= size_bytes <=
+            ethernet.MAX_FRAME_SIZE_BYTES):
+        raise FT4FTTSimException(
+            "Message size must be between {} and {}, but is {}".format(
+                ethernet.MIN_FRAME_SIZE_BYTES, ethernet.MAX_FRAME_SIZE_BYTES,
+                size_bytes))
+
+
+class ConstantSize(object):
+    """
+    Distribution of message sizes that always gives the same size.
+
+    """
+
+    def __init__(self, size_bytes):
+        _check_size(size_bytes)
+        self.size_bytes = size_bytes
+
+    def __call__(self, generator, n):
+        return _import_numpy().full(n, self.size_bytes)
+
+
+class UniformSize(object):
+    """
+    Distribution of message sizes uniformly distributed between min_bytes
+    and max_bytes, both included.
+
+    """
+
+    def __init__(self, min_bytes, max_bytes):
+        _check_size(min_bytes)
+        _check_size(max_bytes)
+        if min_bytes > max_bytes:
+            raise FT4FTTSimException(
+                "The minimum size is larger than the maximum size.")
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+
+    def __call__(self, generator, n):
+        return generator.integers(self.min_bytes, self.max_bytes,
+                                  size=n, endpoint=True)
+
+
+class EmpiricalSize(object):
+    """
+    Distribution of message sizes given by the sizes of a trace, e.g., the
+    frame sizes captured on a real network. Sizes are drawn from the trace
+    with replacement, optionally with weights, i.e., the trace is resampled
+    rather than replayed in order: the generated sizes follow the
+    distribution of the trace, but not its sequence. To replay a trace in
+    order, use a MessagePlaybackDevice instead.
+
+    """
+
+    def __init__(self, sizes_bytes, weights=None):
+        """
+        Arguments:
+            sizes_bytes: A sequence of message sizes.
+            weights: An optional sequence with the relative frequency of
+                each size.
+
+        """
+        if not sizes_bytes:
+            raise FT4FTTSimException("The trace of sizes is empty.")
+        for size_bytes in sizes_bytes:
+            _check_size(size_bytes)
+        if weights is not None and len(weights) != len(sizes_bytes):
+            raise FT4FTTSimException(
+                "There must be one weight for each size.")
+        numpy = _import_numpy()
+        self.sizes_bytes = numpy.array(sizes_bytes)
+        self.probabilities = None
+        if weights is not None:
+            weights = numpy.array(weights, dtype=float)
+            self.probabilities = weights / weights.sum()
+
+    def __call__(self, generator, n):
+        return generator.choice(self.sizes_bytes, size=n,
+                                p=self.probabilities)
+
+
+class _Stream(object):
+    """
+    Stream of values of a random variable drawn in blocks.
+
+    """
+
+    def __init__(self, generator, draw, block_size):
+        """
+        Arguments:
+            generator: The numpy.random.Generator of the stream.
+            draw: A function called with generator and a number n that
+                returns a NumPy array of n values.
+            block_size: The number of values drawn at a time.
+
+        """
+        self.generator = generator
+        self.draw = draw
+        self.block_size = block_size
+        self._values = []
+        self._index = 0
+
+    def next(self):
+        if self._index == len(self._values):
+            self._values = self.draw(self.generator, self.block_size).tolist()
+            self._index = 0
+        value = self._values[self._index]
+        self._index += 1
+        return value
+
+    def get_state(self):
+        return (self.generator.bit_generator.state,
+                self._values[self._index:])
+
+    def set_state(self, state):
+        self.generator.bit_generator.state, values = state
+        self._values = list(values)
+        self._index = 0
+
+
+class TrafficGenerator(NetworkDevice):
+    """
+    Base class of network devices with one port that transmit messages to a
+    destination at random instants of time.
+
+    TrafficGenerator is abstract: subclasses define the time between
+    consecutive messages by implementing next_interarrival_time(), and the
+    constructor raises an exception otherwise. The data of each message is
+    its sequence number.
+
+    """
+
+    def __init__(self, env, name, destination, sizes, seed=0,
+                 message_type="background", start_time=0,
+                 stop_time=float("inf"), block_size=1024):
+        """
+        Arguments:
+            env: A simpy.Environment instance.
+            name: A string used to identify the generator.
+            destination: The destination of the generated messages.
+            sizes: The distribution of the message sizes, e.g., a
+                ConstantSize, UniformSize or EmpiricalSize instance.
+            seed: The seed of the random streams of the generator.
+            message_type: The message type of the generated messages.
+            start_time: The instant of time when the generator starts.
+            stop_time: The instant of time when the generator stops.
+            block_size: The number of random values drawn at a time.
+
+        Raises:
+            FT4FTTSimException: If NumPy is not available, or if the class of
+                the generator does not implement next_interarrival_time().
+
+        """
+        if (type(self).next_interarrival_time is
+                TrafficGenerator.next_interarrival_time):
+            raise FT4FTTSimException(
+                "{} does not implement next_interarrival_time()".format(
+                    type(self).__name__))
+        numpy = _import_numpy()
+        NetworkDevice.__init__(self, env, name, 1)
+        self.destination = destination
+        self.message_type = message_type
+        self.start_time = start_time
+        self.stop_time = stop_time
+        self.block_size = block_size
+        self.time_base = timebase.get_time_base(env)
+        seed_sequence = numpy.random.SeedSequence(
+            seed, spawn_key=(zlib.crc32(name.encode()),))
+        # The seed sequences of the random streams are spawned from it one
+        # at a time, in the order in which the streams are added.
+        self._seed_sequence = seed_sequence
+        # Dictionary whose keys name the random streams of the generator and
+        # whose values are _Stream instances.
+        self._streams = {}
+        self._sizes = self.add_stream("sizes", sizes)
+        # Instant of time of the next message, or None before the first one
+        # has been scheduled.
+        self.next_time = None
+        self.num_generated = 0
+        self.start_process(self.run())
+
+    def add_stream(self, name, draw):
+        """
+        Create a new random stream of the generator, independent of its other
+        streams.
+
+        Arguments:
+            name: A string used to identify the stream.
+            draw: A function called with a numpy.random.Generator and a
+                number n that returns a NumPy array of n values.
+
+        Returns:
+            An object whose next() method returns the next value.
+
+        """
+        numpy = _import_numpy()
+        stream = _Stream(
+            numpy.random.default_rng(self._seed_sequence.spawn(1)[0]), draw,
+            self.block_size)
+        self._streams[name] = stream
+        return stream
+
+    def exponential_us(self, mean_us):
+        """
+        Return a function that draws exponentially distributed times with a
+        mean of mean_us microseconds, converted to the time base of the
+        environment (and rounded to ticks for integer time bases).
+
+        """
+        if mean_us <= 0:
+            raise FT4FTTSimException("Mean times must be positive.")
+        ticks_per_us = self.time_base.ticks_per_us
+
+        def draw(generator, n):
+            times = generator.exponential(mean_us, size=n)
+            if ticks_per_us is None:
+                return times
+            return _import_numpy().rint(times * ticks_per_us).astype(int)
+        return draw
+
+    def first_arrival_delay(self):
+        """
+        Return the time from start_time until the first message.
+
+        """
+        return self.next_interarrival_time()
+
+    def next_interarrival_time(self):
+        """
+        Return the time until the next message. Subclasses must implement
+        this method.
+
+        """
+
+    def run(self):
+        """
+        Simpy process that transmits the generated messages.
+
+        """
+        if self.next_time is None:
+            self.next_time = self.start_time + self.first_arrival_delay()
+        while self.next_time < self.stop_time:
+            delay = self.next_time - self.env.now
+            if delay > 0:
+                yield self.env.timeout(delay)
+            message = Message(self.env, self, self.destination,
+                              self._sizes.next(), self.message_type,
+                              self.num_generated)
+            self.num_generated += 1
+            self.start_process(
+                self.instruct_transmission(message, self.ports[0]))
+            self.next_time += self.next_interarrival_time()
+
+    def get_state(self):
+        state = super().get_state()
+        state.update(
+            next_time=self.next_time,
+            num_generated=self.num_generated,
+            streams=dict((name, stream.get_state())
+                         for name, stream in self._streams.items()))
+        return state
+
+    def set_state(self, state, devices_by_name):
+        super().set_state(state, devices_by_name)
+        self.next_time = state["next_time"]
+        self.num_generated = state["num_generated"]
+        for name, stream_state in state["streams"].items():
+            self._streams[name].set_state(stream_state)
+
+
+class PeriodicGenerator(TrafficGenerator):
+    """
+    Transmits a message every period_us microseconds, starting at
+    start_time.
+
+    """
+
+    def __init__(self, env, name, destination, period_us, sizes, **kwargs):
+        if period_us <= 0:
+            raise FT4FTTSimException("The period must be positive.")
+        self.period = timebase.get_time_base(env).from_us(period_us)
+        TrafficGenerator.__init__(
+            self, env, name, destination, sizes, **kwargs)
+
+    def first_arrival_delay(self):
+        return 0
+
+    def next_interarrival_time(self):
+        return self.period
+
+
+class PoissonGenerator(TrafficGenerator):
+    """
+    Transmits messages as a Poisson process, i.e., with exponentially
+    distributed times between messages with a mean of
+    mean_interarrival_us microseconds.
+
+    """
+
+    def __init__(self, env, name, destination, mean_interarrival_us, sizes,
+                 **kwargs):
+        TrafficGenerator.__init__(
+            self, env, name, destination, sizes, **kwargs)
+        self._interarrival_times = self.add_stream(
+            "interarrival times", self.exponential_us(mean_interarrival_us))
+
+    def next_interarrival_time(self):
+        return self._interarrival_times.next()
+
+
+class OnOffGenerator(TrafficGenerator):
+    """
+    Transmits bursts of messages: during on periods, a message is
+    transmitted every period_us microseconds, starting at the beginning of
+    the on period, and no messages are transmitted during off periods. The
+    durations of the on and off periods are exponentially distributed with
+    means of mean_on_us and mean_off_us microseconds.
+
+    """
+
+    def __init__(self, env, name, destination, period_us, mean_on_us,
+                 mean_off_us, sizes, **kwargs):
+        if period_us <= 0:
+            raise FT4FTTSimException("The period must be positive.")
+        self.period = timebase.get_time_base(env).from_us(period_us)
+        TrafficGenerator.__init__(
+            self, env, name, destination, sizes, **kwargs)
+        self._on_durations = self.add_stream(
+            "on durations", self.exponential_us(mean_on_us))
+        self._off_durations = self.add_stream(
+            "off durations", self.exponential_us(mean_off_us))
+        # time left in the current on period after the last message
+        self._on_time_left = None
+
+    def first_arrival_delay(self):
+        self._on_time_left = self._on_durations.next()
+        return 0
+
+    def next_interarrival_time(self):
+        if self.period <= self._on_time_left:
+            self._on_time_left -= self.period
+            return self.period
+        # the next message starts the next on period
+        time_until_next_on = (self._on_time_left +
+                              self._off_durations.next())
+        self._on_time_left = self._on_durations.next()
+        return time_until_next_on
+
+    def get_state(self):
+        state = super().get_state()
+        state["on_time_left"] = self._on_time_left
+        return state
+
+    def set_state(self, state, devices_by_name):
+        super().set_state(state, devices_by_name)
+        self._on_time_left = state["on_time_left"]